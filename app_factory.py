@@ -8,6 +8,7 @@ from flask import Flask, send_from_directory
 from constants import AppConstants, CommonConstants
 from extensions import limiter
 from handlers import register_error_handlers
+from imaging.font_cache import preload_fonts
 from logging_utils import get_logger
 from routes.download import bp as download_bp
 from routes.download_file import bp as download_file_bp
@@ -93,11 +94,17 @@ def create_app(config_overrides=None):
 
     app.config.from_mapping(
         UPLOAD_FOLDER=os.environ.get("UPLOAD_FOLDER", AppConstants.UPLOAD_FOLDER),
-        STATE_DB_PATH=None,
+        STATE_DB_PATH=os.environ.get("STATE_DB_PATH"),
         ALLOWED_EXTENSIONS=AppConstants.ALLOWED_EXTENSIONS,
         MAX_CONTENT_LENGTH=AppConstants.MAX_CONTENT_LENGTH,
         START_BACKGROUND_CLEANER=True,
         WATERMARK_STYLE_CONFIG_PATH=CommonConstants.WATERMARK_STYLE_CONFIG_PATH,
+        EXECUTOR_BACKEND=os.environ.get("EXECUTOR_BACKEND", AppConstants.EXECUTOR_BACKEND),
+        VIDEO_ENCODING_PROFILE=os.environ.get("VIDEO_ENCODING_PROFILE", AppConstants.VIDEO_ENCODING_PROFILE),
+        TASK_QUEUE_BACKEND=os.environ.get("TASK_QUEUE_BACKEND", AppConstants.TASK_QUEUE_BACKEND),
+        TASK_QUEUE_MAX_DEPTH=int(os.environ.get("TASK_QUEUE_MAX_DEPTH", AppConstants.TASK_QUEUE_MAX_DEPTH)),
+        TASK_MAX_INFLIGHT_PIXELS=int(os.environ.get("TASK_MAX_INFLIGHT_PIXELS", AppConstants.TASK_MAX_INFLIGHT_PIXELS)),
+        SSE_MAX_STREAMS=int(os.environ.get("SSE_MAX_STREAMS", AppConstants.SSE_MAX_STREAMS)),
     )
 
     if config_overrides:
@@ -110,10 +117,25 @@ def create_app(config_overrides=None):
     limiter.init_app(app)
 
     watermark_styles = load_cached_watermark_styles(app.config["WATERMARK_STYLE_CONFIG_PATH"])
+    preload_fonts()
     app.extensions["watermark_styles"] = watermark_styles
-    app.extensions["state"] = AppState(app.config["STATE_DB_PATH"])
+    shared_queue = app.config["TASK_QUEUE_BACKEND"] == "sqlite"
+    app.extensions["state"] = AppState(
+        app.config["STATE_DB_PATH"],
+        # 任务交给独立 worker 进程时 Web 进程不渲染，不启动渲染子进程池
+        executor_backend="thread" if shared_queue else app.config["EXECUTOR_BACKEND"],
+        style_config_path=app.config["WATERMARK_STYLE_CONFIG_PATH"],
+        video_profile=app.config["VIDEO_ENCODING_PROFILE"],
+        task_queue=app.config["TASK_QUEUE_BACKEND"],
+        max_queue_depth=app.config["TASK_QUEUE_MAX_DEPTH"],
+        max_inflight_pixels=app.config["TASK_MAX_INFLIGHT_PIXELS"],
+        max_event_streams=app.config["SSE_MAX_STREAMS"],
+    )
 
     state = app.extensions["state"]
+    if shared_queue:
+        # worker 进程写入的进度与结果需同步到本进程的内存与 SSE 事件
+        state.start_task_sync()
     atexit.register(state.shutdown)
     signal.signal(signal.SIGTERM, lambda signum, frame: state.shutdown())
 
@@ -125,6 +147,12 @@ def create_app(config_overrides=None):
             "limits will not be shared across workers",
             gunicorn_workers,
         )
+        if not shared_queue:
+            logger.warning(
+                "GUNICORN_WORKERS=%d > 1 with TASK_QUEUE_BACKEND=local: each worker runs its own tasks; "
+                "set TASK_QUEUE_BACKEND=sqlite and run python -m services.worker to share them",
+                gunicorn_workers,
+            )
 
     register_error_handlers(app)
 
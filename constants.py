@@ -18,6 +18,16 @@ class CommonConstants:
     GLOBAL_FONT_PATH_LIGHT = str(_ROOT / "fonts" / "AlibabaPuHuiTi-2-45-Light.otf")
     GLOBAL_FONT_PATH_MONO = str(_ROOT / "fonts" / "RobotoMono-Regular.ttf")
 
+    # 常驻 exiftool 进程池
+    EXIFTOOL_POOL_SIZE = 2
+    EXIFTOOL_TIMEOUT_SECONDS = 10
+    EXIFTOOL_HEALTHCHECK_INTERVAL_SECONDS = 60
+    EXIFTOOL_ACQUIRE_TIMEOUT_SECONDS = 30
+
+    # motion photo 视频流信息（按视频内容摘要缓存）
+    FFPROBE_TIMEOUT_SECONDS = 30
+    VIDEO_INFO_CACHE_MAX_ENTRIES = 64
+
     BRAND_ALIASES = {
         "sonycamera": "sony",
         "sonycorporation": "sony",
@@ -48,7 +58,62 @@ class AppConstants:
     ZIP_MAX_FILES = 50
 
     EXECUTOR_MAX_WORKERS = 4
+    # 渲染后端："thread"（进程内执行）或 "process"（常驻子进程池，绕开 GIL）；可用环境变量 EXECUTOR_BACKEND 覆盖
+    EXECUTOR_BACKEND = "thread"
+    # 子进程 worker 执行满多少个任务或常驻内存超过多少后替换，抑制 Pillow 堆碎片
+    PROCESS_WORKER_MAX_TASKS = 50
+    PROCESS_WORKER_MAX_RSS_BYTES = 1536 * 1024 * 1024
+    # Web 进程里有多个线程，fork 不安全，默认用 spawn 启动 worker
+    PROCESS_WORKER_START_METHOD = "spawn"
+    # 任务调度："local"（Web 进程内线程池执行）或 "sqlite"（Web 只入队，由 python -m services.worker 进程领取）；
+    # 可用环境变量 TASK_QUEUE_BACKEND 覆盖
+    TASK_QUEUE_BACKEND = "local"
+    # 队列租约：worker 每 JOB_HEARTBEAT_SECONDS 续约一次，超过 JOB_LEASE_SECONDS 未续约的任务可被其他 worker 重新领取
+    JOB_LEASE_SECONDS = 60
+    JOB_HEARTBEAT_SECONDS = 10
+    JOB_MAX_ATTEMPTS = 3
+    # 队列为空时 worker 的轮询间隔
+    JOB_POLL_INTERVAL_SECONDS = 0.5
+    # 多进程写同一数据库时等待写锁的上限
+    JOB_DB_BUSY_TIMEOUT_SECONDS = 30
+    # sqlite 模式下 Web 进程从数据库同步 worker 写入的任务变化的间隔；回看窗口需覆盖进度写回的延迟
+    TASK_SYNC_INTERVAL_SECONDS = 0.5
+    TASK_SYNC_LOOKBACK_SECONDS = 2.0
+    # 准入控制：排队 + 处理中的任务数、这些任务的总像素达到上限时返回 503（0 表示不限制）；
+    # 可用环境变量 TASK_QUEUE_MAX_DEPTH / TASK_MAX_INFLIGHT_PIXELS 覆盖
+    TASK_QUEUE_MAX_DEPTH = 32
+    TASK_MAX_INFLIGHT_PIXELS = 1_600_000_000
+    # Retry-After 按该窗口内的任务完成速度估算，并限制在 [MIN, MAX] 秒
+    ADMISSION_DRAIN_WINDOW_SECONDS = 120
+    RETRY_AFTER_MIN_SECONDS = 1
+    RETRY_AFTER_MAX_SECONDS = 120
+
+    # motion photo 视频的 x264 编码档位；threads=0 表示由 x264 自动决定，max_dimension 限制输出画布长边
+    VIDEO_ENCODING_PROFILES = {
+        "fast": {"preset": "veryfast", "crf": 26, "tune": "zerolatency", "threads": 2,
+                 "max_dimension": 1280, "timeout_seconds": 60},
+        "balanced": {"preset": "medium", "crf": 23, "tune": None, "threads": 0,
+                     "max_dimension": None, "timeout_seconds": 120},
+        "archival": {"preset": "slow", "crf": 18, "tune": "film", "threads": 0,
+                     "max_dimension": None, "timeout_seconds": 300},
+    }
+    # 默认档位，可用环境变量 VIDEO_ENCODING_PROFILE 覆盖
+    VIDEO_ENCODING_PROFILE = "balanced"
+    # 排队任务数达到该值时 motion photo 自动改用 fast 档（0 表示不自动切换）
+    VIDEO_FAST_PROFILE_QUEUE_DEPTH = 4
     TASK_RETENTION_SECONDS = 3600
+    # 任务进度 / 阶段的写回间隔：期间的多次更新合并为一次批量事务
+    TASK_PROGRESS_FLUSH_SECONDS = 0.5
+    # /api/events：保留的事件条数（断线重连按 Last-Event-ID 补发）、心跳间隔、单条连接最长时长、单次订阅的任务数上限
+    TASK_EVENT_HISTORY = 4096
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_STREAM_SECONDS = 300
+    SSE_MAX_TASK_IDS = 100
+    # 每个进程同时打开的 SSE 连接上限（每条占一个 gthread 线程），需明显小于 GUNICORN_THREADS，
+    # 超出时返回 503，前端改用 /api/status?ids= 轮询；可用环境变量 SSE_MAX_STREAMS 覆盖
+    SSE_MAX_STREAMS = 8
+    # 浏览器断线后的重连等待（EventSource retry 字段）
+    SSE_RETRY_MS = 2000
 
     CLEANER_INTERVAL_SECONDS = 10
     BURN_TTL_SECONDS = 120
@@ -71,6 +136,12 @@ def format_pixel_limit(limit: int, lang: str = "zh") -> str:
 
 class ImageConstants:
     MAX_IMAGE_PIXELS = 200_000_000
+    # 预览默认的长边上限（JPEG 通过 DCT 缩放解码）
+    PREVIEW_MAX_DIMENSION = 2048
+    # 进程内所有任务的像素缓冲预算：100MP 任务峰值约 0.6~0.8GB，4 个并发任务可同时运行
+    PROCESS_MEMORY_BUDGET_BYTES = 4 * 1024 * 1024 * 1024
+    # 纯底部页脚样式在 MCU 对齐的 JPEG 上用 jpegtran 压缩域追加页脚（需要 IJG jpegtran 9+）
+    LOSSLESS_FOOTER_ENABLED = True
 
     # split_lr 布局中右侧 Logo 高度占底栏的比例
     LOGO_HEIGHT_RATIO = 0.5
@@ -82,3 +153,18 @@ class ImageConstants:
     WATERMARK_GLASS_COLOR = 180
     WATERMARK_GLASS_OFFSET = 0.025
     WATERMARK_GLASS_BG_THRESHOLD = 130
+    # 磨砂背景按行切块渲染（Pillow 的缩放/粘贴在 C 层释放 GIL，可多线程并行）
+    WATERMARK_GLASS_TILE_ROWS = 256
+    WATERMARK_GLASS_TILE_WORKERS = 4
+
+    # 进程级字体缓存（按 路径/字号/排版引擎 区分）
+    FONT_CACHE_MAX_ENTRIES = 128
+    FONT_PRELOAD_SIZE = 64
+
+    # 缩放后 logo 缓存的字节上限（只缓存缩放结果，单个条目通常不到 2 MB）
+    LOGO_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    # 已栅格化文字块缓存的字节上限
+    TEXT_BLOCK_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # 亮度统计的采样图长边上限，以及按源图缓存的条数
+    LUMINANCE_SAMPLE_MAX_DIMENSION = 512
+    LUMINANCE_CACHE_MAX_ENTRIES = 256
@@ -36,6 +36,10 @@ class WatermarkError(Exception):
         self.detail = detail
         self._message_kwargs = message_kwargs
 
+    def __reduce__(self):
+        # 进程池把异常传回父进程时需要按构造参数重建
+        return (self.__class__, (self.error_code, self.detail), {"_message_kwargs": self._message_kwargs})
+
     @property
     def message_key(self) -> str:
         return self.error_code.message_key
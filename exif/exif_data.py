@@ -1,15 +1,14 @@
 """EXIF 数据提取和格式化。"""
 
-import json
+import os
 import re
-import shutil
-import subprocess
-from pathlib import Path
+from functools import lru_cache
 from typing import Optional, Tuple
 
 from PIL import Image
 import piexif
 
+from exif.exiftool_pool import read_tags
 from logging_utils import get_logger
 
 logger = get_logger("autowatermark.exif_utils")
@@ -49,53 +48,56 @@ def _format_exiftool_date(value) -> str:
     return date_taken
 
 
-def _find_exiftool():
-    executable = shutil.which("exiftool")
-    if executable:
-        return executable
+# 一次批量查询覆盖 fallback 元数据与镜头补查所需的全部标签；
+# 带 # 后缀的标签取数值，其余保留打印转换（LensType 转换后才是镜头名，很多 Canon/Pentax/Sony 机身只有它）
+_EXIFTOOL_TAGS = (
+    "Make",
+    "Model",
+    "XiaomiModel",
+    "LensModel",
+    "Lens",
+    "LensType",
+    "FocalLengthIn35mmFormat#",
+    "FocalLength#",
+    "FNumber#",
+    "ExposureTime#",
+    "ISO#",
+    "DateTimeOriginal",
+)
 
-    project_root = Path(__file__).resolve().parents[1]
-    local_exiftool = project_root / "3rdparty" / "exiftool" / "exiftool"
-    if local_exiftool.exists():
-        return str(local_exiftool)
-    return None
 
+@lru_cache(maxsize=32)
+def _query_exiftool_tags_cached(image_path: str, _mtime_ns: int, _size: int) -> Optional[dict]:
+    return read_tags(image_path, _EXIFTOOL_TAGS)
 
-def get_exif_data_with_exiftool(image_path: str) -> Optional[dict]:
-    """Fallback metadata extraction for files that piexif cannot parse."""
-    exiftool = _find_exiftool()
-    if not exiftool:
-        return None
 
-    tags = [
-        "-Make",
-        "-Model",
-        "-XiaomiModel",
-        "-LensModel",
-        "-Lens",
-        "-LensType",
-        "-FocalLengthIn35mmFormat",
-        "-FocalLength",
-        "-FNumber",
-        "-ExposureTime",
-        "-ISO",
-        "-DateTimeOriginal",
-    ]
+def _query_exiftool_tags(image_path: str) -> Optional[dict]:
+    """同一文件（按 mtime/size 区分版本）只向 exiftool 查询一次。"""
     try:
-        output = subprocess.check_output(
-            [exiftool, "-j", "-n", *tags, image_path],
-            stderr=subprocess.STDOUT,
-            timeout=10,
-        )
-        rows = json.loads(output.decode(errors="ignore"))
+        stat = os.stat(image_path)
+        return _query_exiftool_tags_cached(os.path.realpath(image_path), stat.st_mtime_ns, stat.st_size)
     except Exception as exc:
-        logger.info("exiftool fallback failed for %s: %s", image_path, exc)
+        logger.info("exiftool query failed for %s: %s", image_path, exc)
         return None
 
-    if not rows:
+
+def _exiftool_lens_info(payload: Optional[dict]) -> Optional[str]:
+    if not payload:
+        return None
+    for key in ("LensModel", "Lens", "LensType"):
+        value = payload.get(key)
+        # 无法识别的 LensType 会以数值 ID 返回，不能作为镜头名
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+def get_exif_data_with_exiftool(image_path: str) -> Optional[dict]:
+    """Fallback metadata extraction for files that piexif cannot parse."""
+    payload = _query_exiftool_tags(image_path)
+    if not payload:
         return None
 
-    payload = rows[0]
     manufacturer = _sanitize_make(payload.get("Make"))
     camera_model = _sanitize_model(payload.get("Model"))
     xiaomi_model = _sanitize_model(payload.get("XiaomiModel"))
@@ -107,7 +109,7 @@ def get_exif_data_with_exiftool(image_path: str) -> Optional[dict]:
     if not manufacturer:
         return None
 
-    lens_info = payload.get("LensModel") or payload.get("Lens") or payload.get("LensType") or "Unknown Lens"
+    lens_info = _exiftool_lens_info(payload) or "Unknown Lens"
     lens_info = round_floats_in_string(str(lens_info).replace("f", "\u0192"))
 
     focal_length = payload.get("FocalLengthIn35mmFormat") or payload.get("FocalLength")
@@ -278,22 +280,7 @@ def get_exif_data(image_path: str, exif_dict: Optional[dict] = None) -> Tuple[Op
         date_taken = _format_exiftool_date(date_taken)
 
         if str(lens_info) == "Unknown Lens":
-            exif_ids = ["-LensModel", "-Lens", "-LensType"]
-            lens_info = "Unknown Lens"
-            exif_tool_path = Path("./3rdparty/exiftool/exiftool")
-            if exif_tool_path.exists():
-                for exif_id in exif_ids:
-                    try:
-                        output = subprocess.check_output(
-                            [str(exif_tool_path), exif_id, image_path],
-                            stderr=subprocess.STDOUT,
-                        )
-                    except Exception:
-                        continue
-                    output = output.decode(errors='ignore').strip().split(":")
-                    if len(output) > 1:
-                        lens_info = output[1].strip()
-                        break
+            lens_info = _exiftool_lens_info(_query_exiftool_tags(image_path)) or "Unknown Lens"
 
         if 'f' in str(lens_info):
             lens_info = str(lens_info).replace('f', '\u0192')  # \u0192 resembles the aperture symbol seen on iOS.
@@ -0,0 +1,301 @@
+"""常驻 exiftool 进程池：以 -stay_open 模式复用 Perl 进程，避免每次调用都重新启动。"""
+
+import atexit
+import itertools
+import json
+import os
+import re
+import select
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from queue import Empty, LifoQueue
+from typing import Optional, Sequence, Tuple
+
+from constants import CommonConstants
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.exiftool_pool")
+
+_READ_CHUNK = 65536
+_STATUS_PATTERN = re.compile(rb"=(\d*)=\{post\d+\}\s*$")
+
+
+class ExifToolError(RuntimeError):
+    """exiftool 进程启动失败、超时或输出不完整。"""
+
+
+def find_exiftool() -> Optional[str]:
+    executable = shutil.which("exiftool")
+    if executable:
+        return executable
+
+    project_root = Path(__file__).resolve().parents[1]
+    local_exiftool = project_root / "3rdparty" / "exiftool" / "exiftool"
+    if local_exiftool.exists():
+        return str(local_exiftool)
+    return None
+
+
+class _ExifToolProcess:
+    """单个 `exiftool -stay_open True -@ -` 进程，负责请求/响应分帧。
+
+    每条命令以 `-execute{N}` 结尾，stdout 以 `{readyN}` 收尾；
+    通过 `-echo4` 在 stderr 末尾写出 `={status}={postN}`，用于取回退出码并确认 stderr 已读完。
+    """
+
+    def __init__(self, executable: str):
+        self._seq = itertools.count(1)
+        self.proc = subprocess.Popen(
+            [executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True,
+        )
+        self.last_used = time.monotonic()
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def execute(self, args: Sequence[str], timeout: float) -> Tuple[int, bytes, bytes]:
+        for arg in args:
+            if "\n" in arg or "\r" in arg:
+                raise ExifToolError(f"exiftool argument contains a newline: {arg!r}")
+
+        seq = next(self._seq)
+        ready = b"{ready%d}" % seq
+        post = b"{post%d}" % seq
+        lines = [*args, "-echo4", f"=${{status}}={{post{seq}}}", f"-execute{seq}"]
+        deadline = time.monotonic() + timeout
+        try:
+            self.proc.stdin.write(("\n".join(lines) + "\n").encode("utf-8"))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as exc:
+            raise ExifToolError(f"exiftool process {self.pid} is not accepting commands") from exc
+
+        stdout, stderr = self._read_response(ready, post, deadline)
+        self.last_used = time.monotonic()
+
+        stdout = stdout.rstrip()[:-len(ready)]
+        status = 0
+        match = _STATUS_PATTERN.search(stderr)
+        if match:
+            if match.group(1):
+                status = int(match.group(1))
+            stderr = stderr[:match.start()]
+        return status, stdout, stderr
+
+    def _read_response(self, ready: bytes, post: bytes, deadline: float) -> Tuple[bytes, bytes]:
+        out_fd = self.proc.stdout.fileno()
+        err_fd = self.proc.stderr.fileno()
+        buffers = {out_fd: bytearray(), err_fd: bytearray()}
+        markers = {out_fd: ready, err_fd: post}
+        pending = {out_fd, err_fd}
+
+        # 同时读取 stdout / stderr，避免任一管道写满导致 exiftool 阻塞
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"exiftool process {self.pid} did not respond in time")
+            readable, _, _ = select.select(list(pending), [], [], remaining)
+            if not readable:
+                raise TimeoutError(f"exiftool process {self.pid} did not respond in time")
+            for fd in readable:
+                chunk = os.read(fd, _READ_CHUNK)
+                if not chunk:
+                    raise ExifToolError(f"exiftool process {self.pid} exited unexpectedly")
+                buffers[fd].extend(chunk)
+                if bytes(buffers[fd][-len(markers[fd]) - 8:]).rstrip().endswith(markers[fd]):
+                    pending.discard(fd)
+
+        return bytes(buffers[out_fd]), bytes(buffers[err_fd])
+
+    def close(self, timeout: float = 2.0) -> None:
+        if self.alive():
+            try:
+                self.proc.stdin.write(b"-stay_open\nFalse\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=timeout)
+            except Exception:
+                pass
+        self.kill()
+
+    def kill(self) -> None:
+        if self.alive():
+            try:
+                self.proc.kill()
+                self.proc.wait(timeout=5)
+            except Exception:
+                pass
+        for stream in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class ExifToolPool:
+    """按需启动、最多 size 个常驻 exiftool 进程；同时执行的命令数不超过 size。
+
+    - 空闲超过 healthcheck_interval 的进程在复用前先执行 `-ver` 探活；
+    - 命令超时或进程崩溃时直接杀掉该进程，下一次调用会重新拉起。
+    """
+
+    def __init__(
+        self,
+        executable: str,
+        size: int = CommonConstants.EXIFTOOL_POOL_SIZE,
+        timeout: float = CommonConstants.EXIFTOOL_TIMEOUT_SECONDS,
+        healthcheck_interval: float = CommonConstants.EXIFTOOL_HEALTHCHECK_INTERVAL_SECONDS,
+        acquire_timeout: float = CommonConstants.EXIFTOOL_ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        self.executable = executable
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle: "LifoQueue[_ExifToolProcess]" = LifoQueue()
+        self._lock = threading.Lock()
+        self._processes: set[_ExifToolProcess] = set()
+        self._closed = False
+        self.restarts = 0
+
+    def execute(self, *args: str, timeout: Optional[float] = None) -> Tuple[int, bytes, bytes]:
+        """执行一条 exiftool 命令，返回 (status, stdout, stderr)。"""
+        if self._closed:
+            raise ExifToolError("exiftool pool is closed")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ExifToolError("Timed out waiting for an idle exiftool process")
+        try:
+            worker = self._checkout()
+            try:
+                result = worker.execute(args, timeout or self.timeout)
+            except Exception:
+                self._discard(worker, restart=True)
+                raise
+            self._idle.put(worker)
+            return result
+        finally:
+            self._slots.release()
+
+    def execute_json(self, *args: str, timeout: Optional[float] = None) -> list:
+        status, stdout, stderr = self.execute("-j", *args, timeout=timeout)
+        if not stdout.strip():
+            detail = stderr.decode(errors="ignore").strip() or f"status {status}"
+            raise ExifToolError(f"exiftool returned no JSON: {detail}")
+        return json.loads(stdout.decode(errors="ignore"))
+
+    def _checkout(self) -> _ExifToolProcess:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except Empty:
+                return self._spawn()
+            if self._is_healthy(worker):
+                return worker
+            self._discard(worker, restart=True)
+
+    def _is_healthy(self, worker: _ExifToolProcess) -> bool:
+        if not worker.alive():
+            return False
+        if time.monotonic() - worker.last_used < self.healthcheck_interval:
+            return True
+        try:
+            _, stdout, _ = worker.execute(["-ver"], self.timeout)
+            return bool(stdout.strip())
+        except Exception:
+            logger.warning("exiftool process %s failed health check", worker.pid)
+            return False
+
+    def _spawn(self) -> _ExifToolProcess:
+        try:
+            worker = _ExifToolProcess(self.executable)
+        except OSError as exc:
+            raise ExifToolError(f"Failed to start exiftool: {exc}") from exc
+        with self._lock:
+            self._processes.add(worker)
+        logger.info("Started exiftool process %s (pool size %d)", worker.pid, self.size)
+        return worker
+
+    def _discard(self, worker: _ExifToolProcess, restart: bool = False) -> None:
+        with self._lock:
+            self._processes.discard(worker)
+            if restart:
+                self.restarts += 1
+        logger.warning("Discarding exiftool process %s", worker.pid)
+        worker.kill()
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._processes)
+            self._processes.clear()
+        for worker in workers:
+            worker.close()
+
+
+_pool: Optional[ExifToolPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_exiftool_pool() -> Optional[ExifToolPool]:
+    """返回进程级共享的 exiftool 池；找不到 exiftool 时返回 None。"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            executable = find_exiftool()
+            if not executable:
+                return None
+            _pool = ExifToolPool(executable)
+            atexit.register(shutdown_exiftool_pool)
+    return _pool
+
+
+def shutdown_exiftool_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def read_tags(image_path: str, tags: Sequence[str], timeout: Optional[float] = None) -> Optional[dict]:
+    """一次批量查询多个标签，返回 exiftool JSON 的首行。
+
+    标签按 exiftool 的写法传入：带 # 后缀（如 "FocalLength#"）时返回数值，否则返回打印转换后的值。
+    """
+    pool = get_exiftool_pool()
+    if pool is None:
+        return None
+    rows = pool.execute_json(*[f"-{tag}" for tag in tags], str(image_path), timeout=timeout)
+    return rows[0] if rows else None
+
+
+def copy_all_metadata(src_path: str, dst_path: str, timeout: Optional[float] = None) -> bool:
+    """把 src 的全部元数据（含 MakerNote）复制到 dst；exiftool 不可用或失败时返回 False。"""
+    pool = get_exiftool_pool()
+    if pool is None:
+        return False
+    status, _, stderr = pool.execute(
+        "-overwrite_original",
+        "-TagsFromFile",
+        str(src_path),
+        "-all:all",
+        "-unsafe",
+        str(dst_path),
+        timeout=timeout,
+    )
+    if status != 0:
+        logger.info("exiftool metadata copy returned %s: %s", status, stderr.decode(errors="ignore").strip())
+    return status == 0
@@ -9,12 +9,25 @@ http.interceptors.response.use(
     if (data?.error) {
       const e = new Error(data.error)
       e.code = err.response.status
+      e.retryAfter = Number(err.response.headers?.['retry-after']) || null
       throw e
     }
     throw err
   },
 )
 
+// 服务器排队已满（503）时按 Retry-After 等待后重试
+async function retryWhenBusy(request, attempts = 3) {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await request()
+    } catch (e) {
+      if (e.code !== 503 || !e.retryAfter || attempt >= attempts) throw e
+      await new Promise(resolve => setTimeout(resolve, e.retryAfter * 1000))
+    }
+  }
+}
+
 export async function getStyles() {
   const { data } = await http.get('/styles')
   return data
@@ -31,7 +44,7 @@ export async function uploadFile(file, options) {
   }
 
   const lang = localStorage.getItem('lang') || 'zh'
-  const { data } = await http.post(`/upload?lang=${lang}`, form)
+  const { data } = await retryWhenBusy(() => http.post(`/upload?lang=${lang}`, form))
   return data
 }
 
@@ -40,20 +53,31 @@ export async function getTaskStatus(taskId) {
   return data
 }
 
+// 批量查询多个任务状态（SSE 不可用时的轮询回退）
+export async function getTaskStatuses(taskIds) {
+  const { data } = await http.get('/status', { params: { ids: taskIds.join(',') } })
+  return data.tasks
+}
+
+// 订阅任务进度推送；断线后浏览器自动带 Last-Event-ID 重连
+export function openTaskEvents(taskIds) {
+  return new EventSource(`/api/events?ids=${encodeURIComponent(taskIds.join(','))}`)
+}
+
 export async function confirmLogoChoice(taskId, logoPreference) {
-  const { data } = await http.post('/upload/confirm_logo', {
+  const { data } = await retryWhenBusy(() => http.post('/upload/confirm_logo', {
     task_id: taskId,
     logo_preference: logoPreference,
-  })
+  }))
   return data
 }
 
 export async function confirmOptions(taskId, options) {
-  const { data } = await http.post('/upload/confirm_options', {
+  const { data } = await retryWhenBusy(() => http.post('/upload/confirm_options', {
     task_id: taskId,
     preserve_hdr: options.preserve_hdr,
     preserve_motion: options.preserve_motion,
-  })
+  }))
   return data
 }
 
@@ -223,50 +223,140 @@ export const useAppStore = defineStore('app', () => {
     }
   }
 
-  async function pollTask(task) {
-    const baseInterval = tasks.value.length > 1 ? 1000 : 200
-    const maxRetries = 3
-    const maxDuration = 300000 // 5 分钟超时
-    const startTime = Date.now()
-    let retries = 0
+  // 任务进度订阅：所有处理中的任务共用一条 SSE 连接（/api/events），
+  // 浏览器不支持或连接被拒绝时退回批量轮询（/api/status?ids=...）
+  const MAX_WATCHED_IDS = 100
+  const watchers = new Map() // task.id -> { task, resolve, timer }
+  let eventSource = null
+  let reopenTimer = null
+  let pollTimer = null
+  let pollFailures = 0
 
-    while (Date.now() - startTime < maxDuration) {
-      try {
-        const data = await api.getTaskStatus(task.id)
-        retries = 0 // 成功则重置重试计数
-        task.progress = Math.max(task.progress, data.progress || 0)
-        task.status = data.status
+  function applyTaskUpdate(task, data) {
+    if (data.status === 'unknown') {
+      task.status = 'failed'
+      task.progress = 1
+      task.error = 'Task not found'
+      return true
+    }
+    task.progress = Math.max(task.progress, data.progress || 0)
+    task.status = data.status
 
-        if (data.status === 'succeeded') {
-          task.progress = 1
-          task.result = data.result
-          if (!currentPreview.value || currentPreview.value.status !== 'succeeded') {
-            currentPreview.value = task
-          }
-          return
-        }
-        if (data.status === 'failed') {
-          task.progress = 1
-          task.error = data.error
-          return
-        }
-      } catch {
-        retries++
-        if (retries >= maxRetries) {
+    if (data.status === 'succeeded') {
+      task.progress = 1
+      task.result = data.result
+      if (!currentPreview.value || currentPreview.value.status !== 'succeeded') {
+        currentPreview.value = task
+      }
+      return true
+    }
+    if (data.status === 'failed') {
+      task.progress = 1
+      task.error = data.error
+      return true
+    }
+    return false
+  }
+
+  function finishWatch(id) {
+    const watcher = watchers.get(id)
+    if (!watcher) return
+    watchers.delete(id)
+    clearTimeout(watcher.timer)
+    watcher.resolve()
+    if (watchers.size === 0) stopWatching()
+  }
+
+  function handleTaskData(id, data) {
+    const watcher = watchers.get(id)
+    if (watcher && applyTaskUpdate(watcher.task, data)) finishWatch(id)
+  }
+
+  function watchedIds() {
+    return [...watchers.keys()].slice(0, MAX_WATCHED_IDS)
+  }
+
+  function stopWatching() {
+    if (eventSource) {
+      eventSource.close()
+      eventSource = null
+    }
+    clearTimeout(reopenTimer)
+    clearTimeout(pollTimer)
+    reopenTimer = null
+    pollTimer = null
+  }
+
+  function openEventStream() {
+    reopenTimer = null
+    if (eventSource) eventSource.close()
+    eventSource = null
+    if (watchers.size === 0 || pollTimer) return
+    if (typeof EventSource === 'undefined') {
+      pollStatuses()
+      return
+    }
+    const source = api.openTaskEvents(watchedIds())
+    eventSource = source
+    source.addEventListener('task', event => {
+      const data = JSON.parse(event.data)
+      handleTaskData(data.task_id, data)
+    })
+    source.addEventListener('end', () => {
+      source.close()
+      if (eventSource === source) {
+        eventSource = null
+        if (watchers.size) openEventStream()
+      }
+    })
+    source.onerror = () => {
+      // CONNECTING 表示浏览器正在按 Last-Event-ID 自动重连；CLOSED 才改用轮询
+      if (source.readyState === EventSource.CLOSED && eventSource === source) {
+        eventSource = null
+        pollStatuses()
+      }
+    }
+  }
+
+  async function pollStatuses() {
+    pollTimer = null
+    if (watchers.size === 0) return
+    try {
+      const statuses = await api.getTaskStatuses(watchedIds())
+      pollFailures = 0
+      for (const [id, data] of Object.entries(statuses)) handleTaskData(id, data)
+    } catch {
+      pollFailures++
+      if (pollFailures >= 3) {
+        for (const { task } of watchers.values()) {
           task.status = 'failed'
           task.progress = 1
           task.error = 'Connection lost'
-          return
         }
+        ;[...watchers.keys()].forEach(finishWatch)
+        pollFailures = 0
+        return
       }
-      // 指数退避：baseInterval, baseInterval*2, baseInterval*4...
-      const delay = baseInterval * Math.pow(2, retries - 1)
-      await new Promise(r => setTimeout(r, delay))
     }
-    // 超时
-    task.status = 'failed'
-    task.progress = 1
-    task.error = 'Processing timeout'
+    if (watchers.size) {
+      // 指数退避：1s, 2s, 4s...
+      pollTimer = setTimeout(pollStatuses, 1000 * Math.pow(2, pollFailures))
+    }
+  }
+
+  function pollTask(task) {
+    const maxDuration = 300000 // 5 分钟超时
+    return new Promise(resolve => {
+      const timer = setTimeout(() => {
+        task.status = 'failed'
+        task.progress = 1
+        task.error = 'Processing timeout'
+        finishWatch(task.id)
+      }, maxDuration)
+      watchers.set(task.id, { task, resolve, timer })
+      // 同一时刻加入的任务合并为一次重连
+      if (!pollTimer && !reopenTimer) reopenTimer = setTimeout(openEventStream, 50)
+    })
   }
 
   async function downloadZip() {
@@ -3,6 +3,7 @@ from flask_limiter.errors import RateLimitExceeded
 from werkzeug.exceptions import HTTPException
 
 from routes._utils import is_browser_request
+from services.admission import QueueFullError
 from services.i18n import get_error_message, normalize_lang
 
 
@@ -12,6 +13,14 @@ def register_error_handlers(app):
         lang = normalize_lang(request.args.get("lang", "zh"))
         return jsonify(error=get_error_message("rate_limit_exceeded", lang)), 429
 
+    @app.errorhandler(QueueFullError)
+    def handle_queue_full(e):
+        lang = normalize_lang(request.args.get("lang", "zh"))
+        response = jsonify(error=get_error_message("server_busy", lang, seconds=e.retry_after), reason=e.reason)
+        response.status_code = 503
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
+
     @app.errorhandler(404)
     def not_found_error(error):
         if is_browser_request():
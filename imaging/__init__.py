@@ -13,6 +13,9 @@ from imaging.text_rendering import (
     create_text_block,
     create_right_block,
 )
+from imaging.font_cache import get_font, font_cache_info, preload_fonts
+from imaging.logo_cache import get_logo, logo_cache_stats
+from imaging.luminance import LuminanceStats, get_luminance_stats, luminance_cache_stats
 from imaging.frosted_glass import create_frosted_glass_effect
 from imaging.watermark import generate_watermark_image
 from imaging.renderer_base import LayoutRenderer, RenderContext
@@ -0,0 +1,73 @@
+"""合成规划：解码原图之前确定成品画布尺寸，并估算单个任务各阶段的像素缓冲峰值。"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image
+
+# 成品画布与叠加层的模式
+_CANVAS_BANDS = 3
+_OVERLAY_BANDS = 3
+
+
+@dataclass(frozen=True)
+class CompositionPlan:
+    """一次水印合成的内存规划。
+
+    阶段与同时存活的缓冲：
+    1. 解码 + 方向转置：原图（需要转置时短暂存在两份）
+    2. 合成：原图 + 画布 + 渲染临时缓冲（原图粘贴后立即释放）
+    3. 叠加层：画布 + 边框条带（motion photo / Ultra HDR 需要）；retain_source 时再加上原图
+    """
+
+    decode_size: Tuple[int, int]
+    bands: int
+    canvas_size: Tuple[int, int]
+    transpose: Optional[Image.Transpose] = None
+    needs_overlay: bool = False
+    scratch_bytes: int = 0
+    # 画布中原图内容区的尺寸；叠加层只包含其外的边框
+    content_size: Optional[Tuple[int, int]] = None
+    # 同一原图要渲染多个样式时，原图在合成后不释放，叠加层阶段仍然存活
+    retain_source: bool = False
+
+    @property
+    def source_bytes(self) -> int:
+        return self.decode_size[0] * self.decode_size[1] * self.bands
+
+    @property
+    def canvas_bytes(self) -> int:
+        return self.canvas_size[0] * self.canvas_size[1] * _CANVAS_BANDS
+
+    @property
+    def overlay_bytes(self) -> int:
+        if not self.needs_overlay:
+            return 0
+        content_w, content_h = self.content_size or (0, 0)
+        border_pixels = self.canvas_size[0] * self.canvas_size[1] - content_w * content_h
+        return max(0, border_pixels) * _OVERLAY_BANDS
+
+    @property
+    def peak_bytes(self) -> int:
+        decode_peak = self.source_bytes * (2 if self.transpose is not None else 1)
+        compose_peak = self.source_bytes + self.canvas_bytes + self.scratch_bytes
+        overlay_peak = self.canvas_bytes + self.overlay_bytes
+        if self.retain_source:
+            overlay_peak += self.source_bytes
+        return max(decode_peak, compose_peak, overlay_peak)
+
+
+def oriented_size(size: Tuple[int, int], transpose: Optional[Image.Transpose]) -> Tuple[int, int]:
+    """转置后的尺寸（90°/270° 交换宽高）。"""
+    if transpose in (Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270):
+        return size[1], size[0]
+    return tuple(size)
+
+
+def reduced_size(size: Tuple[int, int], max_dimension: Optional[int]) -> Tuple[int, int]:
+    """按长边上限等比缩小后的尺寸（与 Image.thumbnail 的结果误差不超过 1 像素）。"""
+    width, height = size
+    if not max_dimension or max(width, height) <= max_dimension:
+        return width, height
+    scale = max_dimension / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
@@ -0,0 +1,59 @@
+"""进程级字体缓存：所有文字渲染路径共享同一批 FreeTypeFont 对象。"""
+
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from PIL import ImageFont
+
+from constants import CommonConstants, ImageConstants
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.font_cache")
+
+
+@lru_cache(maxsize=ImageConstants.FONT_CACHE_MAX_ENTRIES)
+def _load_font(font_path: str, font_size: int, layout_engine: Optional[int]) -> ImageFont.FreeTypeFont:
+    # lru_cache 自带锁与命中统计；加载失败抛出的异常不会被缓存
+    return ImageFont.truetype(font_path, font_size, layout_engine=layout_engine)
+
+
+def get_font(font_path, font_size, layout_engine: Optional[int] = None) -> ImageFont.FreeTypeFont:
+    """按 (路径, 字号, 排版引擎) 返回共享的字体对象，加载失败时抛出异常。"""
+    return _load_font(str(font_path), int(font_size), layout_engine)
+
+
+def get_font_or_default(font_path, font_size, layout_engine: Optional[int] = None):
+    """同 get_font，但字体不可用时回退到 Pillow 内置字体。"""
+    try:
+        return get_font(font_path, font_size, layout_engine)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def font_cache_info():
+    """返回 (hits, misses, maxsize, currsize)。"""
+    return _load_font.cache_info()
+
+
+def clear_font_cache() -> None:
+    _load_font.cache_clear()
+
+
+def preload_fonts(font_paths: Optional[Iterable[str]] = None,
+                  font_size: int = ImageConstants.FONT_PRELOAD_SIZE) -> int:
+    """启动时预加载全局字体，提前暴露缺失的字体文件；返回成功加载的数量。"""
+    if font_paths is None:
+        font_paths = (
+            CommonConstants.GLOBAL_FONT_PATH_BOLD,
+            CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+            CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+            CommonConstants.GLOBAL_FONT_PATH_MONO,
+        )
+    loaded = 0
+    for font_path in font_paths:
+        try:
+            get_font(font_path, font_size)
+            loaded += 1
+        except Exception as exc:
+            logger.warning("Failed to preload font %s: %s", font_path, exc)
+    return loaded
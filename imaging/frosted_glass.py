@@ -1,120 +1,263 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+
 from PIL import Image, ImageDraw, ImageFilter
 from constants import ImageConstants
-from imaging.image_ops import is_landscape, _darken_rgb_inplace
+from imaging.image_ops import _darken_rgb_inplace
 
 # 磨砂玻璃效果常量
 SHADOW_OFFSET_Y_LANDSCAPE = 0.03
 SHADOW_OFFSET_Y_PORTRAIT = 0.05
 BLUR_DOWNSAMPLE_RADIUS = 8
+# 阴影精灵图在低分辨率下的模糊半径下限；阴影本身已经是大半径模糊，低分辨率绘制后线性放大即可
+SHADOW_SPRITE_MIN_BLUR = 4
 
+Box = Tuple[int, int, int, int]
 
-def create_frosted_glass_effect(origin_image):
-    ori_w, ori_h = origin_image.size
-    min_dim = min(ori_w, ori_h)
-
-    bg_scale = ImageConstants.WATERMARK_GLASS_BG_SCALE
-    shadow_scale_factor = ImageConstants.WATERMARK_GLASS_SHADOW_SCALE
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
 
-    landscape = is_landscape(origin_image)
 
-    corner_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_CORNER_RADIUS_FACTOR)
-    shadow_blur_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_BLUR_RADIUS)
+@dataclass(frozen=True)
+class _FrostedGeometry:
+    """磨砂背景的几何布局（全部为画布坐标，不含偶数化补齐）。"""
 
-    shadow_offset_y = int(min_dim * (SHADOW_OFFSET_Y_LANDSCAPE if landscape else SHADOW_OFFSET_Y_PORTRAIT))
-    shadow_color = (0, 0, 0, ImageConstants.WATERMARK_GLASS_COLOR)
+    canvas_size: Tuple[int, int]
+    content_box: Box
+    shadow_box: Box
+    shadow_patch_box: Box
+    corner_radius: int
+    shadow_blur_radius: int
 
-    canvas_w = int(ori_w * bg_scale * (0.95 if landscape else 1.0))
-    canvas_h = int(ori_h * bg_scale)
-    canvas_size = (canvas_w, canvas_h)
 
-    ds_w = max(1, canvas_w // 10)
-    ds_h = max(1, canvas_h // 10)
+def frosted_canvas_size(origin_size):
+    """磨砂背景画布的布局尺寸（不含偶数化补齐）。"""
+    ori_w, ori_h = origin_size
+    bg_scale = ImageConstants.WATERMARK_GLASS_BG_SCALE
+    landscape = ori_w >= ori_h
+    return int(ori_w * bg_scale * (0.95 if landscape else 1.0)), int(ori_h * bg_scale)
 
-    if origin_image.mode != "RGB":
-        small_bg_source = origin_image.convert("RGB")
-    else:
-        small_bg_source = origin_image
-    small_bg = small_bg_source.resize((ds_w, ds_h), Image.Resampling.BOX)
 
-    blurred_bg = small_bg.filter(ImageFilter.GaussianBlur(BLUR_DOWNSAMPLE_RADIUS))
-    # 放大铺满
-    final_bg = blurred_bg.resize(canvas_size, Image.Resampling.LANCZOS)
-    del small_bg
-
-    final_bg = _darken_rgb_inplace(final_bg, dim_alpha_0_255=20)
+def _frosted_geometry(origin_size) -> _FrostedGeometry:
+    ori_w, ori_h = origin_size
+    min_dim = min(ori_w, ori_h)
+    landscape = ori_w >= ori_h
+    canvas_w, canvas_h = frosted_canvas_size(origin_size)
 
-    if origin_image.mode != "RGB":
-        foreground_rgb = origin_image.convert("RGB")
-    else:
-        foreground_rgb = origin_image
+    corner_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_CORNER_RADIUS_FACTOR)
+    shadow_blur_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_BLUR_RADIUS)
+    shadow_offset_y = int(min_dim * (SHADOW_OFFSET_Y_LANDSCAPE if landscape else SHADOW_OFFSET_Y_PORTRAIT))
 
     pos_x = (canvas_w - ori_w) // 2
     pos_y = (canvas_h - ori_h) // 2
 
+    shadow_scale_factor = ImageConstants.WATERMARK_GLASS_SHADOW_SCALE
     shadow_w = int(ori_w * shadow_scale_factor)
     shadow_h = int(ori_h * shadow_scale_factor)
     shadow_x = pos_x + (ori_w - shadow_w) // 2
     shadow_y = pos_y + (ori_h - shadow_h) // 2 - shadow_offset_y
 
     pad = int(shadow_blur_radius * 1.2)
+    patch_box = (
+        max(0, shadow_x - pad),
+        max(0, shadow_y - pad),
+        min(canvas_w, shadow_x + shadow_w + pad),
+        min(canvas_h, shadow_y + shadow_h + pad),
+    )
 
-    x0 = max(0, shadow_x - pad)
-    y0 = max(0, shadow_y - pad)
-    x1 = min(canvas_w, shadow_x + shadow_w + pad)
-    y1 = min(canvas_h, shadow_y + shadow_h + pad)
+    fg_x = pos_x
+    fg_y = pos_y - shadow_offset_y
+    return _FrostedGeometry(
+        canvas_size=(canvas_w, canvas_h),
+        content_box=(fg_x, fg_y, fg_x + ori_w, fg_y + ori_h),
+        shadow_box=(shadow_x, shadow_y, shadow_x + shadow_w, shadow_y + shadow_h),
+        shadow_patch_box=patch_box,
+        corner_radius=corner_radius,
+        shadow_blur_radius=shadow_blur_radius,
+    )
 
-    patch_w = max(1, x1 - x0)
-    patch_h = max(1, y1 - y0)
 
-    shadow_patch = Image.new("RGBA", (patch_w, patch_h), (0, 0, 0, 0))
-    d = ImageDraw.Draw(shadow_patch)
+def frosted_scratch_bytes(origin_size):
+    """渲染期间的临时缓冲估算：可见背景区域（内容区之外 + 四个圆角）的 RGB 分块。"""
+    geometry = _frosted_geometry(origin_size)
+    canvas_w, canvas_h = geometry.canvas_size
+    ori_w, ori_h = origin_size
+    radius = geometry.corner_radius
+    return 3 * (canvas_w * canvas_h - ori_w * ori_h + 4 * radius * radius)
 
-    rx0 = shadow_x - x0
-    ry0 = shadow_y - y0
-    rx1 = rx0 + shadow_w
-    ry1 = ry0 + shadow_h
-    d.rounded_rectangle((rx0, ry0, rx1, ry1), radius=corner_radius, fill=shadow_color)
 
-    if shadow_blur_radius > 0:
-        shadow_patch = shadow_patch.filter(ImageFilter.BoxBlur(shadow_blur_radius))
+@lru_cache(maxsize=8)
+def _shadow_sprite(patch_size, shadow_rect, corner_radius, blur_radius, alpha):
+    """在低分辨率下绘制并模糊阴影蒙版（L 模式），返回 (蒙版, 缩小倍数)。
 
-    final_image = final_bg
-    del final_bg
+    同一机型/尺寸的照片阴影几何完全相同，按参数缓存；缓存中的图像只读。
+    """
+    factor = max(1, blur_radius // SHADOW_SPRITE_MIN_BLUR)
+    patch_w, patch_h = patch_size
+    sprite = Image.new("L", (math.ceil(patch_w / factor), math.ceil(patch_h / factor)), 0)
+    draw = ImageDraw.Draw(sprite)
+    # 矩形终点是闭区间，且模糊窗口宽 2r+1：都按全分辨率的像素宽度换算，阴影边缘才与全尺寸绘制对齐
+    x0, y0, x1, y1 = shadow_rect
+    draw.rounded_rectangle(
+        (x0 / factor, y0 / factor, (x1 + 1) / factor - 1, (y1 + 1) / factor - 1),
+        radius=corner_radius / factor,
+        fill=alpha,
+    )
+    if blur_radius > 0:
+        sprite = sprite.filter(ImageFilter.BoxBlur(((2 * blur_radius + 1) / factor - 1) / 2))
+    return sprite, factor
 
-    final_image.paste(shadow_patch, (x0, y0), shadow_patch)
-    del shadow_patch
 
-    fg_x = pos_x
-    fg_y = pos_y - shadow_offset_y
-    corner_radius = max(0, min(corner_radius, ori_w // 2, ori_h // 2))
-    if corner_radius > 0:
-        bg_tl = final_image.crop((fg_x, fg_y, fg_x + corner_radius, fg_y + corner_radius))
-        bg_tr = final_image.crop((fg_x + ori_w - corner_radius, fg_y, fg_x + ori_w, fg_y + corner_radius))
-        bg_bl = final_image.crop((fg_x, fg_y + ori_h - corner_radius, fg_x + corner_radius, fg_y + ori_h))
-        bg_br = final_image.crop((fg_x + ori_w - corner_radius, fg_y + ori_h - corner_radius, fg_x + ori_w, fg_y + ori_h))
-
-        corner_mask = Image.new("L", (corner_radius, corner_radius), 255)
-        corner_draw = ImageDraw.Draw(corner_mask)
-        corner_draw.pieslice((0, 0, corner_radius * 2, corner_radius * 2), 180, 270, fill=0)
-        corner_mask_tr = corner_mask.transpose(Image.FLIP_LEFT_RIGHT)
-        corner_mask_bl = corner_mask.transpose(Image.FLIP_TOP_BOTTOM)
-        corner_mask_br = corner_mask.transpose(Image.ROTATE_180)
+@lru_cache(maxsize=8)
+def _corner_masks(radius):
+    """四个圆角的遮罩（255 表示露出背景），顺序为 左上、右上、左下、右下。"""
+    corner_mask = Image.new("L", (radius, radius), 255)
+    ImageDraw.Draw(corner_mask).pieslice((0, 0, radius * 2, radius * 2), 180, 270, fill=0)
+    return (
+        corner_mask,
+        corner_mask.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+        corner_mask.transpose(Image.Transpose.FLIP_TOP_BOTTOM),
+        corner_mask.transpose(Image.Transpose.ROTATE_180),
+    )
+
+
+def _get_tile_pool():
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            _tile_pool = ThreadPoolExecutor(
+                max_workers=ImageConstants.WATERMARK_GLASS_TILE_WORKERS,
+                thread_name_prefix="frosted-tile",
+            )
+        return _tile_pool
+
+
+def _split_rows(box: Box, rows: int) -> List[Box]:
+    left, top, right, bottom = box
+    if right <= left or bottom <= top:
+        return []
+    return [(left, y, right, min(bottom, y + rows)) for y in range(top, bottom, rows)]
+
+
+def _visible_regions(geometry: _FrostedGeometry, radius: int) -> Tuple[List[Box], List[Box]]:
+    """返回 (内容区之外的背景块, 四个圆角块)；被原图覆盖的部分不需要渲染背景。"""
+    canvas_w, canvas_h = geometry.canvas_size
+    left, top, right, bottom = geometry.content_box
+    top = max(0, top)
+    bottom = min(canvas_h, bottom)
+    rows = ImageConstants.WATERMARK_GLASS_TILE_ROWS
+    tiles = []
+    for box in (
+        (0, 0, canvas_w, top),
+        (0, top, left, bottom),
+        (right, top, canvas_w, bottom),
+        (0, bottom, canvas_w, canvas_h),
+    ):
+        tiles.extend(_split_rows(box, rows))
+
+    corners = []
+    if radius > 0:
+        x0, y0, x1, y1 = geometry.content_box
+        corners = [
+            (x0, y0, x0 + radius, y0 + radius),
+            (x1 - radius, y0, x1, y0 + radius),
+            (x0, y1 - radius, x0 + radius, y1),
+            (x1 - radius, y1 - radius, x1, y1),
+        ]
+    return tiles, corners
+
+
+def _render_tile(background, geometry: _FrostedGeometry, shadow, box: Box) -> Image.Image:
+    """渲染画布上 box 区域的背景：从模糊缩略图线性放大，再叠加阴影蒙版。"""
+    left, top, right, bottom = box
+    canvas_w, canvas_h = geometry.canvas_size
+    sx = background.width / canvas_w
+    sy = background.height / canvas_h
+    # 缩略图已经过大半径模糊，双线性放大与 LANCZOS 肉眼无差别，开销却小得多
+    tile = background.resize(
+        (right - left, bottom - top),
+        Image.Resampling.BILINEAR,
+        box=(left * sx, top * sy, right * sx, bottom * sy),
+    )
+
+    sprite, factor = shadow
+    px0, py0, px1, py1 = geometry.shadow_patch_box
+    ix0, iy0 = max(left, px0), max(top, py0)
+    ix1, iy1 = min(right, px1), min(bottom, py1)
+    if ix1 > ix0 and iy1 > iy0:
+        mask = sprite.resize(
+            (ix1 - ix0, iy1 - iy0),
+            Image.Resampling.BILINEAR,
+            box=((ix0 - px0) / factor, (iy0 - py0) / factor, (ix1 - px0) / factor, (iy1 - py0) / factor),
+        )
+        tile.paste((0, 0, 0), (ix0 - left, iy0 - top), mask)
+    return tile
+
+
+def _render_tiles(background, geometry, shadow, boxes: List[Box]):
+    if len(boxes) > 1 and ImageConstants.WATERMARK_GLASS_TILE_WORKERS > 1:
+        return _get_tile_pool().map(lambda box: _render_tile(background, geometry, shadow, box), boxes)
+    return (_render_tile(background, geometry, shadow, box) for box in boxes)
+
+
+def create_frosted_glass_effect(origin_image, pad_to_even=False):
+    """生成磨砂玻璃背景并把原图贴在中央。
+
+    只渲染原图覆盖不到的背景区域（内容区四周 + 四个圆角），按行切块并行；
+    阴影蒙版与圆角遮罩按尺寸缓存。
+    pad_to_even=True 时直接按偶数尺寸分配画布并把补齐的行/列填白，省去事后再扩边复制一次整图。
+    """
+    geometry = _frosted_geometry(origin_image.size)
+    canvas_w, canvas_h = geometry.canvas_size
+    canvas_size = (canvas_w, canvas_h)
+    if pad_to_even:
+        canvas_size = (canvas_w + canvas_w % 2, canvas_h + canvas_h % 2)
+
+    ds_w = max(1, canvas_w // 10)
+    ds_h = max(1, canvas_h // 10)
+
+    if origin_image.mode != "RGB":
+        foreground_rgb = origin_image.convert("RGB")
+    else:
+        foreground_rgb = origin_image
+    small_bg = foreground_rgb.resize((ds_w, ds_h), Image.Resampling.BOX)
+
+    blurred_bg = small_bg.filter(ImageFilter.GaussianBlur(BLUR_DOWNSAMPLE_RADIUS))
+    del small_bg
+    # 在缩小图上变暗（线性变换与缩放可交换），避免对全尺寸背景再复制一次
+    blurred_bg = _darken_rgb_inplace(blurred_bg, dim_alpha_0_255=20)
+
+    px0, py0, px1, py1 = geometry.shadow_patch_box
+    sx0, sy0, sx1, sy1 = geometry.shadow_box
+    shadow = _shadow_sprite(
+        (max(1, px1 - px0), max(1, py1 - py0)),
+        (sx0 - px0, sy0 - py0, sx1 - px0, sy1 - py0),
+        geometry.corner_radius,
+        geometry.shadow_blur_radius,
+        ImageConstants.WATERMARK_GLASS_COLOR,
+    )
+
+    ori_w, ori_h = origin_image.size
+    corner_radius = max(0, min(geometry.corner_radius, ori_w // 2, ori_h // 2))
+    tiles, corners = _visible_regions(geometry, corner_radius)
+
+    final_image = Image.new("RGB", canvas_size, "white")
+    for box, tile in zip(tiles, _render_tiles(blurred_bg, geometry, shadow, tiles)):
+        final_image.paste(tile, box[:2])
+        tile.close()
 
+    fg_x, fg_y = geometry.content_box[:2]
     final_image.paste(foreground_rgb, (fg_x, fg_y))
     del foreground_rgb
 
-    if corner_radius > 0:
-        final_image.paste(bg_tl, (fg_x, fg_y), corner_mask)
-        final_image.paste(bg_tr, (fg_x + ori_w - corner_radius, fg_y), corner_mask_tr)
-        final_image.paste(bg_bl, (fg_x, fg_y + ori_h - corner_radius), corner_mask_bl)
-        final_image.paste(bg_br, (fg_x + ori_w - corner_radius, fg_y + ori_h - corner_radius), corner_mask_br)
-        del bg_tl
-        del bg_tr
-        del bg_bl
-        del bg_br
-        del corner_mask
-        del corner_mask_tr
-        del corner_mask_bl
-        del corner_mask_br
+    if corners:
+        corner_tiles = _render_tiles(blurred_bg, geometry, shadow, corners)
+        for box, tile, mask in zip(corners, corner_tiles, _corner_masks(corner_radius)):
+            final_image.paste(tile, box[:2], mask)
+            tile.close()
 
     return final_image
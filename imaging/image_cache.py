@@ -0,0 +1,81 @@
+"""按字节预算淘汰的线程安全 LRU 图像缓存，供 logo、文字块等渲染资源复用。"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from PIL import Image
+
+
+def image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageLRUCache:
+    """键 -> PIL.Image 的 LRU 缓存，总字节数不超过 max_bytes。
+
+    单个条目超过预算的 max_entry_ratio 时只返回不缓存，避免一个大图挤掉全部条目。
+    缓存中的图像是共享对象：调用方只能把它当作 paste 的源图，不得原地修改。
+    """
+
+    def __init__(self, max_bytes: int, max_entry_ratio: float = 0.25):
+        self.max_bytes = max_bytes
+        self.max_entry_ratio = max_entry_ratio
+        self._entries: "OrderedDict[Hashable, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Image.Image]:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return image
+
+    def put(self, key: Hashable, image: Image.Image) -> Image.Image:
+        size = image_nbytes(image)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # 并发 miss 时以先写入者为准
+                self._entries.move_to_end(key)
+                return existing
+            self.misses += 1
+            if size > self.max_bytes * self.max_entry_ratio:
+                return image
+            self._entries[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= image_nbytes(evicted)
+                self.evictions += 1
+            return image
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Image.Image]) -> Image.Image:
+        image = self.get(key)
+        if image is not None:
+            return image
+        return self.put(key, factory())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,7 +1,8 @@
 from functools import lru_cache
 import piexif
-from PIL import Image, ImageDraw, ImageStat
+from PIL import Image, ImageDraw
 from constants import ImageConstants
+from imaging.luminance import compute_luminance_stats
 from logging_utils import get_logger
 
 logger = get_logger("autowatermark.image_ops")
@@ -16,43 +17,36 @@ def is_image_bright(image, threshold=ImageConstants.WATERMARK_GLASS_BG_THRESHOLD
     判断图片是否为浅色背景
     :param threshold: 亮度阈值 (0-255)，默认 130。大于此值认为背景是亮的，需要用深色字。
     :return: True (亮背景) / False (暗背景)
-    为了避免误判，同时判断图片下半部分的亮度
+    为了避免误判，同时判断图片下半部分的亮度；统计在缩小后的采样图上完成
     """
-    gray_img = image.convert("L")
-    try:
-        stat = ImageStat.Stat(gray_img)
-        avg_brightness = stat.mean[0]
-        logger.info("Current image avg brightness: %s", str(avg_brightness))
-    finally:
-        gray_img.close()
-
-    w, h = image.size
-    bottom_half = image.crop((0, h // 2, w, h))
-    try:
-        gray_half = bottom_half.convert("L")
-        try:
-            stat = ImageStat.Stat(gray_half)
-            avg_brightness_half = stat.mean[0]
-            logger.info("Bottom-half avg brightness: %s", str(avg_brightness_half))
-        finally:
-            gray_half.close()
-    finally:
-        bottom_half.close()
+    return compute_luminance_stats(image).is_bright(threshold)
 
-    return avg_brightness > threshold and avg_brightness_half > threshold
 
+# EXIF Orientation -> 对应的无损转置（只处理旋转类方向）
+_ORIENTATION_TRANSPOSE = {
+    3: Image.Transpose.ROTATE_180,
+    6: Image.Transpose.ROTATE_270,
+    8: Image.Transpose.ROTATE_90,
+}
 
-def reset_image_orientation(image):
+
+def orientation_transpose(image):
+    """读取 EXIF 方向（只读文件头，不触发解码），返回需要的 Image.Transpose 或 None。"""
     try:
         exif = image._getexif()
         if exif:
-            orientation = exif.get(piexif.ImageIFD.Orientation)
-            if orientation == 3:
-                image = image.rotate(180, expand=True)
-            elif orientation == 6:
-                image = image.rotate(270, expand=True)
-            elif orientation == 8:
-                image = image.rotate(90, expand=True)
+            return _ORIENTATION_TRANSPOSE.get(exif.get(piexif.ImageIFD.Orientation))
+    except Exception as e:
+        logger.warning("Error reading orientation: %s", e)
+    return None
+
+
+def reset_image_orientation(image):
+    method = orientation_transpose(image)
+    if method is None:
+        return image
+    try:
+        return image.transpose(method)
     except Exception as e:
         logger.warning("Error resetting orientation: %s", e)
     return image
@@ -0,0 +1,54 @@
+"""品牌 logo 缓存：按 (logo 文件, 目标高度) 缓存缩放后的 RGBA 版本。
+
+原始 logo 分辨率很高（个别解码后近 100 MB），只在缩放时临时解码，不进入缓存。
+"""
+
+import os
+
+from PIL import Image
+
+from constants import ImageConstants
+from imaging.image_cache import ImageLRUCache
+from imaging.image_ops import image_resize
+
+
+class LogoCache:
+    """logo 缓存，键为 (路径, 高度)。"""
+
+    def __init__(self, max_bytes: int = ImageConstants.LOGO_CACHE_MAX_BYTES):
+        self._images = ImageLRUCache(max_bytes)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._images.max_bytes
+
+    def get(self, logo_path: str, target_height: int) -> Image.Image:
+        """返回缩放到 target_height 的 RGBA logo；返回的是副本，调用方可以随意修改。"""
+        target_height = int(target_height)
+
+        def _scale() -> Image.Image:
+            with Image.open(logo_path) as raw:
+                return image_resize(raw.convert("RGBA"), target_height)
+
+        return self._images.get_or_create((os.path.abspath(logo_path), target_height), _scale).copy()
+
+    def clear(self) -> None:
+        self._images.clear()
+
+    def stats(self) -> dict:
+        return self._images.stats()
+
+
+_logo_cache = LogoCache()
+
+
+def get_logo(logo_path: str, target_height: int) -> Image.Image:
+    return _logo_cache.get(logo_path, target_height)
+
+
+def logo_cache_stats() -> dict:
+    return _logo_cache.stats()
+
+
+def clear_logo_cache() -> None:
+    _logo_cache.clear()
@@ -0,0 +1,150 @@
+"""亮度统计：在缩小后的采样图上一次性计算均值、直方图与分区亮度，按源图缓存，供自适应配色的样式共用。"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+from PIL import Image, ImageStat
+
+from constants import ImageConstants
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.luminance")
+
+# reduce() 支持的模式；其他模式（P、1 等）先转 RGB
+_REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F"}
+
+
+@dataclass(frozen=True)
+class LuminanceStats:
+    """灰度（ITU-R 601-2，与 convert("L") 一致）统计结果。"""
+
+    mean: float
+    histogram: Tuple[int, ...]
+    # 分区均值：top_half / bottom_half / left_half / right_half / center
+    regions: Dict[str, float]
+    sample_size: Tuple[int, int]
+
+    def region_mean(self, name: str) -> float:
+        return self.regions[name]
+
+    def percentile(self, fraction: float) -> int:
+        """直方图中累计占比达到 fraction 的最小灰度值。"""
+        target = sum(self.histogram) * fraction
+        total = 0
+        for level, count in enumerate(self.histogram):
+            total += count
+            if total >= target:
+                return level
+        return 255
+
+    def is_bright(self, threshold: float = ImageConstants.WATERMARK_GLASS_BG_THRESHOLD) -> bool:
+        """整图与下半部分都比阈值亮才算亮背景（文字通常落在下半部分，避免误判）。"""
+        return self.mean > threshold and self.regions["bottom_half"] > threshold
+
+
+def _sample(image: Image.Image) -> Image.Image:
+    """把图像按整数倍盒式缩小到长边不超过采样上限，返回灰度采样图。"""
+    if image.mode not in _REDUCIBLE_MODES:
+        image = image.convert("RGB")
+    factor = max(1, -(-max(image.size) // ImageConstants.LUMINANCE_SAMPLE_MAX_DIMENSION))
+    reduced = image.reduce(factor) if factor > 1 else image
+    try:
+        return reduced.convert("L")
+    finally:
+        if reduced is not image:
+            reduced.close()
+
+
+def _region_mean(gray: Image.Image, box) -> float:
+    left, top, right, bottom = box
+    if right <= left or bottom <= top:
+        return ImageStat.Stat(gray).mean[0]
+    return ImageStat.Stat(gray.crop(box)).mean[0]
+
+
+def compute_luminance_stats(image: Image.Image) -> LuminanceStats:
+    gray = _sample(image)
+    try:
+        w, h = gray.size
+        histogram = tuple(gray.histogram())
+        regions = {
+            "top_half": _region_mean(gray, (0, 0, w, h // 2)),
+            "bottom_half": _region_mean(gray, (0, h // 2, w, h)),
+            "left_half": _region_mean(gray, (0, 0, w // 2, h)),
+            "right_half": _region_mean(gray, (w // 2, 0, w, h)),
+            "center": _region_mean(gray, (w // 4, h // 4, w - w // 4, h - h // 4)),
+        }
+        mean = ImageStat.Stat(gray).mean[0]
+        return LuminanceStats(mean=mean, histogram=histogram, regions=regions, sample_size=(w, h))
+    finally:
+        gray.close()
+
+
+class _LuminanceCache:
+    """源图标识 -> LuminanceStats 的 LRU（条目只有几 KB，按条数淘汰）。"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, LuminanceStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[LuminanceStats]:
+        with self._lock:
+            stats = self._entries.get(key)
+            if stats is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return stats
+
+    def put(self, key: Hashable, stats: LuminanceStats) -> None:
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = stats
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_luminance_cache = _LuminanceCache(ImageConstants.LUMINANCE_CACHE_MAX_ENTRIES)
+
+
+def get_luminance_stats(image: Image.Image, key: Optional[Hashable] = None) -> LuminanceStats:
+    """返回 image 的亮度统计。
+
+    key 标识源图（例如 文件路径 + mtime + 大小），同一源图渲染多个样式或重复渲染时直接复用；
+    key 为 None 时不缓存。
+    """
+    if key is not None:
+        cached = _luminance_cache.get(key)
+        if cached is not None:
+            return cached
+    stats = compute_luminance_stats(image)
+    logger.info(
+        "Luminance stats: mean %.1f, bottom-half %.1f (sample %sx%s)",
+        stats.mean, stats.regions["bottom_half"], *stats.sample_size,
+    )
+    if key is not None:
+        _luminance_cache.put(key, stats)
+    return stats
+
+
+def luminance_cache_stats() -> dict:
+    return _luminance_cache.stats()
+
+
+def clear_luminance_cache() -> None:
+    _luminance_cache.clear()
@@ -0,0 +1,64 @@
+"""motion photo 视频水印用的边框叠加层：只保存内容区四周的不透明条带及其几何信息。"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from PIL import Image
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class OverlayStrip:
+    """画布上的一条边框区域（box 为画布坐标 left, top, right, bottom）。"""
+
+    name: str
+    box: Box
+    image: Image.Image
+
+
+@dataclass
+class BorderOverlay:
+    """成品画布去掉内容区后的部分。
+
+    内容区之外的像素全部不透明，因此按上/下/左/右四条 RGB 条带保存即可，
+    不必再分配整幅 RGBA 叠加层（50MP 照片约 200MB）。
+    """
+
+    canvas_size: Tuple[int, int]
+    content_box: Box
+    strips: List[OverlayStrip] = field(default_factory=list)
+
+    @classmethod
+    def from_canvas(cls, canvas: Image.Image, content_box: Box) -> "BorderOverlay":
+        width, height = canvas.size
+        left, top, right, bottom = content_box
+        boxes = (
+            ("top", (0, 0, width, top)),
+            ("bottom", (0, bottom, width, height)),
+            ("left", (0, top, left, bottom)),
+            ("right", (right, top, width, bottom)),
+        )
+        strips = [
+            OverlayStrip(name, box, canvas.crop(box))
+            for name, box in boxes
+            if box[2] > box[0] and box[3] > box[1]
+        ]
+        return cls(canvas_size=canvas.size, content_box=tuple(content_box), strips=strips)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.image.width * s.image.height * len(s.image.getbands()) for s in self.strips)
+
+    def to_image(self) -> Image.Image:
+        """还原整幅 RGBA 叠加层（内容区透明），仅用于调试和兼容。"""
+        overlay = Image.new("RGBA", self.canvas_size, (0, 0, 0, 0))
+        for strip in self.strips:
+            overlay.paste(strip.image, strip.box[:2])
+        return overlay
+
+    def close(self) -> None:
+        for strip in self.strips:
+            strip.image.close()
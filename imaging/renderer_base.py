@@ -2,10 +2,12 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Optional, Tuple
+from typing import Any, Hashable, Optional, Tuple
 
 from PIL import Image
 
+from imaging.luminance import LuminanceStats, get_luminance_stats
+
 
 @dataclass
 class RenderContext:
@@ -14,8 +16,11 @@ class RenderContext:
     # 样式配置
     style: dict[str, Any]
 
-    # 原始图像
-    origin_image: Image.Image
+    # 原始图像（只渲染页脚条带或做合成规划时为 None）
+    origin_image: Optional[Image.Image]
+
+    # 原图尺寸（方向校正后）
+    origin_size: Tuple[int, int]
 
     # 资源路径
     logo_path: Optional[str]
@@ -43,8 +48,23 @@ class RenderContext:
     left_block: Optional[Image.Image] = None
     shooting_info_block: Optional[Image.Image] = None
 
+    # 原图粘贴进画布后立即 close() 释放像素缓冲（调用方拥有原图时才开启）
+    release_origin: bool = False
+
+    # 亮度统计的源图标识（同一源图多次渲染时复用统计结果），以及惰性计算后的结果
+    luminance_key: Optional[Hashable] = None
+    luminance: Optional[LuminanceStats] = None
+
     # 渲染输出（渲染器可写入以传递给后续流程）
     content_box: Optional[Tuple[int, int, int, int]] = None
+    # 画布的布局尺寸（不含偶数化补齐的像素）
+    canvas_size: Optional[Tuple[int, int]] = None
+
+
+def even_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    """把尺寸向上补齐为偶数（视频编码与 4:2:0 采样要求）。"""
+    width, height = size
+    return width + width % 2, height + height % 2
 
 
 class LayoutRenderer(ABC):
@@ -63,21 +83,52 @@ class LayoutRenderer(ABC):
         """
         ...
 
+    def plan_canvas(self, context: RenderContext) -> Tuple[Tuple[int, int], int]:
+        """不解码原图，返回 (画布布局尺寸, 渲染期间额外临时缓冲的字节数估算)。子类可覆写。"""
+        if context.style["background"] == "frosted":
+            from imaging.frosted_glass import frosted_canvas_size, frosted_scratch_bytes
+            return frosted_canvas_size(context.origin_size), frosted_scratch_bytes(context.origin_size)
+        return (context.new_width, context.new_height), 0
+
+    def new_canvas(self, context: RenderContext, size: Tuple[int, int], color) -> Image.Image:
+        """按偶数化后的最终尺寸一次性分配画布，补齐的像素填白（与原先 ImageOps.expand 的结果一致）。"""
+        context.canvas_size = tuple(size)
+        width, height = size
+        canvas = Image.new("RGB", even_size(size), color)
+        if color != "white":
+            if width % 2:
+                canvas.paste("white", (width, 0, width + 1, canvas.height))
+            if height % 2:
+                canvas.paste("white", (0, height, canvas.width, height + 1))
+        return canvas
+
+    def release_origin(self, context: RenderContext) -> None:
+        """原图像素已经合成进画布后调用；仅在 context.release_origin 时释放。"""
+        if context.release_origin and context.origin_image is not None:
+            context.origin_image.close()
+
     def create_background(self, context: RenderContext) -> Image.Image:
         """默认背景创建：基于 style["background"] 参数。子类可覆写。"""
         mode = context.style["background"]
         if mode == "frosted":
-            from imaging.frosted_glass import create_frosted_glass_effect
-            return create_frosted_glass_effect(context.origin_image)
+            from imaging.frosted_glass import create_frosted_glass_effect, frosted_canvas_size
+            context.canvas_size = frosted_canvas_size(context.origin_image.size)
+            canvas = create_frosted_glass_effect(context.origin_image, pad_to_even=True)
         else:  # "white"
-            canvas = Image.new("RGB", (context.new_width, context.new_height), "white")
+            canvas = self.new_canvas(context, (context.new_width, context.new_height), "white")
             canvas.paste(context.origin_image, (context.border_left, context.border_top))
-            return canvas
+        self.release_origin(context)
+        return canvas
+
+    def luminance_stats(self, context: RenderContext) -> LuminanceStats:
+        """原图的亮度统计（每个上下文只计算一次，按 luminance_key 跨任务缓存）。须在释放原图之前调用。"""
+        if context.luminance is None:
+            context.luminance = get_luminance_stats(context.origin_image, context.luminance_key)
+        return context.luminance
 
     def resolve_text_color(self, context: RenderContext) -> str:
         """根据 style["text_color_mode"] 解析文字颜色。"""
         mode = context.style["text_color_mode"]
         if mode == "auto_contrast":
-            from imaging.image_ops import is_image_bright
-            return "black" if is_image_bright(context.origin_image) else "white"
+            return "black" if self.luminance_stats(context).is_bright() else "white"
         return "black"
@@ -1,7 +1,7 @@
 from PIL import Image
 
 from imaging.renderer_base import LayoutRenderer, RenderContext
-from imaging.image_ops import image_resize
+from imaging.logo_cache import get_logo
 from imaging.text_rendering import text_to_image
 
 
@@ -10,16 +10,15 @@ class CenterStackRenderer(LayoutRenderer):
 
     def render(self, context: RenderContext) -> Image.Image:
         style = context.style
+        # 文字颜色依赖原图亮度，需在背景合成（可能释放原图）之前确定
+        text_color = self.resolve_text_color(context)
         final_image = self.create_background(context)
 
         # Logo
         logo_target_height = int(context.footer_height * style["center_logo_ratio"])
-        with Image.open(context.logo_path) as _logo_raw:
-            logo = _logo_raw.convert("RGBA")
-        logo = image_resize(logo, logo_target_height)
+        logo = get_logo(context.logo_path, logo_target_height)
 
         # 文字
-        text_color = self.resolve_text_color(context)
         center_text = text_to_image(
             context.shooting_info[0], context.font_path_bold, context.font_size, text_color
         )
@@ -37,27 +36,28 @@ class CenterStackRenderer(LayoutRenderer):
         center_group.paste(center_text, (text_x, logo.height + v_gap), center_text)
 
         # 定位
-        pos_x, pos_y = self._resolve_position(context, center_group, final_image)
+        pos_x, pos_y = self._resolve_position(context, center_group, context.canvas_size or final_image.size)
         final_image.paste(center_group, (pos_x, pos_y), center_group)
 
         return final_image
 
     @staticmethod
     def _resolve_position(
-        context: RenderContext, center_group: Image.Image, final_image: Image.Image
+        context: RenderContext, center_group: Image.Image, canvas_size: tuple[int, int]
     ) -> tuple[int, int]:
         mode = context.style["position_mode"]
 
         if mode == "bottom_offset":
             style = context.style
-            pos_x = (final_image.width - center_group.width) // 2
+            canvas_width, canvas_height = canvas_size
+            pos_x = (canvas_width - center_group.width) // 2
             divisor = int(
                 style["bottom_offset_landscape_divisor"]
                 if context.landscape
                 else style["bottom_offset_portrait_divisor"]
             )
             divisor = max(1, divisor)
-            pos_y = final_image.height - center_group.height - max(1, center_group.height // divisor)
+            pos_y = canvas_height - center_group.height - max(1, center_group.height // divisor)
             return pos_x, pos_y
         else:  # "footer_center"
             pos_x = (context.new_width - center_group.width) // 2
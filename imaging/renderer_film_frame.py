@@ -1,10 +1,25 @@
-from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+from dataclasses import dataclass
 
+from PIL import Image, ImageDraw, ImageFilter
+
+from imaging.font_cache import get_font_or_default
 from imaging.renderer_base import LayoutRenderer, RenderContext
-from imaging.image_ops import image_resize
+from imaging.logo_cache import get_logo
 from imaging.text_rendering import text_to_image_with_symbol_font
 
 
+@dataclass(frozen=True)
+class _FramedGeometry:
+    """加黑边后的照片尺寸；只参与布局计算，不分配像素。"""
+
+    width: int
+    height: int
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
 class FilmFrameRenderer(LayoutRenderer):
     """胶片留白布局：独立画布，带阴影边框和居中 caption。"""
 
@@ -12,30 +27,19 @@ class FilmFrameRenderer(LayoutRenderer):
         style = context.style
         origin = context.origin_image
 
-        photo = origin.convert("RGB") if origin.mode != "RGB" else origin.copy()
-
-        border_size = max(2, int(round(min(photo.size) * style["frame"]["border_ratio"])))
-        framed_photo = ImageOps.expand(photo, border=border_size, fill="black")
+        border_size, framed_photo = self._frame_geometry(style, origin.size)
         metrics = self._get_metrics(style, framed_photo)
 
         caption_group = self._create_caption_group(context, framed_photo, metrics)
 
-        canvas_width = framed_photo.width + metrics["side_margin"] * 2
-        canvas_height = (
-            metrics["top_margin"]
-            + framed_photo.height
-            + metrics["text_gap"]
-            + caption_group.height
-            + metrics["bottom_margin"]
-        )
-
+        canvas_width, canvas_height = self._layout_size(style, framed_photo, metrics, caption_group.height)
         if style.get("frame", {}).get("force_square", False):
             canvas_side = max(canvas_width, canvas_height)
-            canvas = Image.new("RGB", (canvas_side, canvas_side), metrics["background_color"])
+            canvas = self.new_canvas(context, (canvas_side, canvas_side), metrics["background_color"])
             offset_x = (canvas_side - canvas_width) // 2
             offset_y = (canvas_side - canvas_height) // 2
         else:
-            canvas = Image.new("RGB", (canvas_width, canvas_height), metrics["background_color"])
+            canvas = self.new_canvas(context, (canvas_width, canvas_height), metrics["background_color"])
             offset_x = 0
             offset_y = 0
 
@@ -44,7 +48,10 @@ class FilmFrameRenderer(LayoutRenderer):
         shadow_blur = max(4, int(round(border_size * 2.5)))
 
         self._draw_shadow(canvas, framed_photo, photo_x, photo_y, shadow_blur)
-        canvas.paste(framed_photo, (photo_x, photo_y))
+        # 黑边直接画在画布上，原图只粘贴一次（模式不同时 paste 会自动转换）
+        canvas.paste("black", (photo_x, photo_y, photo_x + framed_photo.width, photo_y + framed_photo.height))
+        canvas.paste(origin, (photo_x + border_size, photo_y + border_size))
+        self.release_origin(context)
 
         caption_x = offset_x + (canvas_width - caption_group.width) // 2
         caption_y = photo_y + framed_photo.height + metrics["text_gap"]
@@ -53,12 +60,49 @@ class FilmFrameRenderer(LayoutRenderer):
         context.content_box = (
             photo_x + border_size,
             photo_y + border_size,
-            photo_x + border_size + photo.width,
-            photo_y + border_size + photo.height,
+            photo_x + border_size + origin.width,
+            photo_y + border_size + origin.height,
         )
 
         return canvas
 
+    def plan_canvas(self, context: RenderContext):
+        style = context.style
+        border_size, framed_photo = self._frame_geometry(style, context.origin_size)
+        metrics = self._get_metrics(style, framed_photo)
+        # caption 高度按 logo + 三行起始字号估算
+        caption_height = (
+            metrics["logo_height"]
+            + metrics["logo_gap"]
+            + 3 * int(metrics["font_start_size"] * 1.25)
+            + 2 * metrics["line_gap"]
+        )
+        canvas_width, canvas_height = self._layout_size(style, framed_photo, metrics, caption_height)
+        if style.get("frame", {}).get("force_square", False):
+            canvas_width = canvas_height = max(canvas_width, canvas_height)
+        # 阴影层为 RGBA，高斯模糊时再复制一份
+        shadow_padding = 2 * 3 * max(4, int(round(border_size * 2.5)))
+        scratch = 2 * 4 * (framed_photo.width + shadow_padding) * (framed_photo.height + shadow_padding)
+        return (canvas_width, canvas_height), scratch
+
+    @staticmethod
+    def _frame_geometry(style, origin_size):
+        border_size = max(2, int(round(min(origin_size) * style["frame"]["border_ratio"])))
+        framed_photo = _FramedGeometry(origin_size[0] + 2 * border_size, origin_size[1] + 2 * border_size)
+        return border_size, framed_photo
+
+    @staticmethod
+    def _layout_size(style, framed_photo, metrics, caption_height):
+        canvas_width = framed_photo.width + metrics["side_margin"] * 2
+        canvas_height = (
+            metrics["top_margin"]
+            + framed_photo.height
+            + metrics["text_gap"]
+            + caption_height
+            + metrics["bottom_margin"]
+        )
+        return canvas_width, canvas_height
+
     @staticmethod
     def _get_metrics(style, framed_photo):
         fc = style["frame"]
@@ -127,10 +171,7 @@ class FilmFrameRenderer(LayoutRenderer):
         hi = max(lo, int(start_size))
 
         def _fits(size):
-            try:
-                font = ImageFont.truetype(font_path, int(size))
-            except Exception:
-                font = ImageFont.load_default()
+            font = get_font_or_default(font_path, size)
             for line in text_lines:
                 if not line:
                     continue
@@ -154,9 +195,7 @@ class FilmFrameRenderer(LayoutRenderer):
 
     def _create_caption_group(self, context: RenderContext, framed_photo, metrics):
         logo_target_height = metrics["logo_height"]
-        with Image.open(context.logo_path) as _logo_raw:
-            logo_image = _logo_raw.convert("RGBA")
-        logo_image = image_resize(logo_image, logo_target_height)
+        logo_image = get_logo(context.logo_path, logo_target_height)
 
         caption_lines = [
             context.camera_info[1] if len(context.camera_info) > 1 else "",
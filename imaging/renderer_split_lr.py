@@ -9,7 +9,16 @@ class SplitLRRenderer(LayoutRenderer):
 
     def render(self, context: RenderContext) -> Image.Image:
         final_image = self.create_background(context)
+        self._paste_footer(final_image, context, offset_y=0)
+        return final_image
+
+    def render_footer(self, context: RenderContext) -> Image.Image:
+        """只渲染白底页脚条带，坐标与 render 的页脚区域逐像素一致。"""
+        strip = Image.new("RGB", (context.new_width, context.footer_height), "white")
+        self._paste_footer(strip, context, offset_y=context.new_height - context.footer_height)
+        return strip
 
+    def _paste_footer(self, canvas: Image.Image, context: RenderContext, offset_y: int) -> None:
         right_group = create_right_block(
             context.logo_path,
             context.shooting_info_block,
@@ -19,10 +28,8 @@ class SplitLRRenderer(LayoutRenderer):
 
         left_x = context.padding_x
         left_y = int(context.footer_center_y - context.left_block.height / 2)
-        final_image.paste(context.left_block, (left_x, left_y), context.left_block)
+        canvas.paste(context.left_block, (left_x, left_y - offset_y), context.left_block)
 
         right_x = context.new_width - context.padding_x - right_group.width
         right_y = int(context.footer_center_y - right_group.height / 2)
-        final_image.paste(right_group, (right_x, right_y), right_group)
-
-        return final_image
+        canvas.paste(right_group, (right_x, right_y - offset_y), right_group)
@@ -1,6 +1,8 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from constants import ImageConstants
-from imaging.image_ops import image_resize
+from imaging.font_cache import get_font, get_font_or_default
+from imaging.image_cache import ImageLRUCache
+from imaging.logo_cache import get_logo
 
 # 文字渲染相关常量
 FONT_PADDING_RATIO = 0.2       # 文字画布宽度额外留白比例
@@ -9,15 +11,32 @@ RIGHT_BLOCK_SPACING_RATIO = 0.2  # 右侧元素间距占底栏高度比例
 RIGHT_BLOCK_LINE_WIDTH_RATIO = 0.02  # 竖线宽度占底栏高度比例
 RIGHT_BLOCK_LINE_HEIGHT_RATIO = 0.45  # 竖线高度占底栏高度比例
 
+# 已栅格化的文字 / 文字块，按内容、字体、字号、颜色缓存；同一机身的批量照片直接复用
+_text_image_cache = ImageLRUCache(ImageConstants.TEXT_BLOCK_CACHE_MAX_BYTES)
+
+
+def _color_key(color):
+    return tuple(color) if isinstance(color, list) else color
+
+
+def text_image_cache_stats() -> dict:
+    return _text_image_cache.stats()
+
+
+def clear_text_image_cache() -> None:
+    _text_image_cache.clear()
+
 
 def text_to_image(text, font_path, font_size, color):
     """
-    直接使用确定的字号渲染文字
+    直接使用确定的字号渲染文字（结果为缓存共享对象，只能作为 paste 源图）
     """
-    try:
-        font = ImageFont.truetype(font_path, int(font_size))
-    except Exception:
-        font = ImageFont.load_default()
+    key = ("line", text, str(font_path), int(font_size), _color_key(color))
+    return _text_image_cache.get_or_create(key, lambda: _render_text(text, font_path, font_size, color))
+
+
+def _render_text(text, font_path, font_size, color):
+    font = get_font_or_default(font_path, font_size)
 
     ascent, descent = font.getmetrics()
     line_height = ascent + descent
@@ -44,11 +63,19 @@ def text_to_image_with_symbol_font(text, font_path, font_size, color, symbol_fon
     if not text or not symbol_font_path or symbol_char not in text:
         return text_to_image(text, font_path, font_size, color)
 
+    key = ("symbol", text, str(font_path), str(symbol_font_path), symbol_char, int(font_size), _color_key(color))
+    return _text_image_cache.get_or_create(
+        key,
+        lambda: _render_text_with_symbol_font(text, font_path, font_size, color, symbol_font_path, symbol_char),
+    )
+
+
+def _render_text_with_symbol_font(text, font_path, font_size, color, symbol_font_path, symbol_char):
     try:
-        primary_font = ImageFont.truetype(font_path, int(font_size))
-        symbol_font = ImageFont.truetype(symbol_font_path, int(font_size))
+        primary_font = get_font(font_path, font_size)
+        symbol_font = get_font(symbol_font_path, font_size)
     except Exception:
-        return text_to_image(text, font_path, font_size, color)
+        return _render_text(text, font_path, font_size, color)
 
     segments = []
     current_text = []
@@ -94,12 +121,20 @@ def text_to_image_with_symbol_font(text, font_path, font_size, color, symbol_fon
     return cropped
 
 
-def create_text_block(line1_text, line2_text, font_bold, font_thin, font_size):
+def create_text_block(line1_text, line2_text, font_bold, font_thin, font_size, color='black'):
     """
-    将两行文字组合成一个块（用于样式 1 和 2）
+    将两行文字组合成一个块（用于样式 1 和 2；结果为缓存共享对象）
     """
-    img1 = text_to_image(line1_text, font_bold, font_size, 'black')
-    img2 = text_to_image(line2_text, font_thin, font_size, 'black')
+    key = ("block", line1_text, line2_text, str(font_bold), str(font_thin), int(font_size), _color_key(color))
+    return _text_image_cache.get_or_create(
+        key,
+        lambda: _render_text_block(line1_text, line2_text, font_bold, font_thin, font_size, color),
+    )
+
+
+def _render_text_block(line1_text, line2_text, font_bold, font_thin, font_size, color):
+    img1 = text_to_image(line1_text, font_bold, font_size, color)
+    img2 = text_to_image(line2_text, font_thin, font_size, color)
 
     # 上下两行间距：字号的 50%
     gap = int(font_size * TEXT_LINE_GAP_RATIO)
@@ -121,9 +156,7 @@ def create_right_block(logo_path, text_block_img, footer_height, with_line=True,
     组合右侧元素：[Logo] [竖线] [参数文字]
     """
     logo_target_height = int(footer_height * ImageConstants.LOGO_HEIGHT_RATIO)
-    with Image.open(logo_path) as _logo_raw:
-        logo = _logo_raw.convert("RGBA")
-    logo = image_resize(logo, logo_target_height)
+    logo = get_logo(logo_path, logo_target_height)
 
     # 元素水平间距：底栏高度的 20%
     spacing = int(footer_height * RIGHT_BLOCK_SPACING_RATIO)
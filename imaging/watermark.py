@@ -1,8 +1,8 @@
-from PIL import Image, ImageOps
+from PIL import ImageOps
 
 from constants import CommonConstants
-from imaging.image_ops import is_landscape
-from imaging.renderer_base import RenderContext
+from imaging.overlay import BorderOverlay
+from imaging.renderer_base import RenderContext, even_size
 from imaging.renderer_registry import get_renderer
 from imaging.text_rendering import create_text_block
 from logging_utils import get_logger
@@ -11,10 +11,10 @@ from services.watermark_styles import get_style, load_cached_watermark_styles
 logger = get_logger("autowatermark.watermark")
 
 
-def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info,
-                             font_path_thin, font_path_bold, watermark_type=1,
-                             return_metadata=False, style_config=None, style=None,
-                             font_path_regular=None, font_path_symbol=None):
+def _build_render_context(origin_image, origin_size, logo_path, camera_info, shooting_info,
+                          font_path_thin, font_path_bold, watermark_type,
+                          style_config, style, font_path_regular, font_path_symbol,
+                          release_origin=False, luminance_key=None):
     if font_path_regular is None:
         font_path_regular = font_path_bold
     if font_path_symbol is None:
@@ -28,9 +28,8 @@ def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info
 
     global_style = style_config["global"]
 
-    logger.info("Generating watermark, current watermark type: %s", style["style_id"])
-    ori_width, ori_height = origin_image.size
-    landscape = is_landscape(origin_image)
+    ori_width, ori_height = origin_size
+    landscape = ori_width >= ori_height
 
     if landscape:
         footer_ratio = global_style["footer_ratio_landscape"]
@@ -76,6 +75,7 @@ def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info
     context = RenderContext(
         style=style,
         origin_image=origin_image,
+        origin_size=(ori_width, ori_height),
         logo_path=logo_path,
         font_path_thin=font_path_thin,
         font_path_bold=font_path_bold,
@@ -94,13 +94,39 @@ def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info
         footer_center_y=footer_center_y,
         left_block=left_block,
         shooting_info_block=shooting_info_block,
+        release_origin=release_origin,
+        luminance_key=luminance_key,
+    )
+    return context
+
+
+def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info,
+                             font_path_thin, font_path_bold, watermark_type=1,
+                             return_metadata=False, style_config=None, style=None,
+                             font_path_regular=None, font_path_symbol=None,
+                             release_origin=False, luminance_key=None):
+    """渲染水印成品。
+
+    画布按偶数化后的最终尺寸一次性分配；release_origin=True 表示调用方把原图交给渲染流程，
+    原图像素合成进画布后立即释放（原图对象随后不可再读取像素）。
+    luminance_key 标识源图，自动配色样式的亮度统计按它缓存复用。
+    """
+    context = _build_render_context(
+        origin_image, origin_image.size, logo_path, camera_info, shooting_info,
+        font_path_thin, font_path_bold, watermark_type,
+        style_config, style, font_path_regular, font_path_symbol,
+        release_origin=release_origin,
+        luminance_key=luminance_key,
     )
+    logger.info("Generating watermark, current watermark type: %s", context.style["style_id"])
+    border_left, border_top = context.border_left, context.border_top
+    ori_width, ori_height = context.origin_size
 
     # 通过注册表获取渲染器
-    renderer = get_renderer(style["layout"])
+    renderer = get_renderer(context.style["layout"])
     final_image = renderer.render(context)
 
-    # 尺寸对齐（偶数化）
+    # 尺寸对齐（偶数化）；内置渲染器已按偶数尺寸分配画布，这里只兜底第三方渲染器
     final_width, final_height = final_image.size
     if final_width % 2 != 0 or final_height % 2 != 0:
         final_image = ImageOps.expand(
@@ -111,15 +137,63 @@ def generate_watermark_image(origin_image, logo_path, camera_info, shooting_info
 
     if return_metadata:
         content_box = context.content_box or (border_left, border_top, border_left + ori_width, border_top + ori_height)
-        overlay_image = final_image.copy().convert("RGBA")
-        transparent = Image.new("RGBA", (content_box[2] - content_box[0], content_box[3] - content_box[1]), (0, 0, 0, 0))
-        overlay_image.paste(transparent, (content_box[0], content_box[1]))
-
         metadata = {
-            "overlay_image": overlay_image,
+            # 只保留内容区四周的边框条带，视频阶段逐条叠加
+            "overlay": BorderOverlay.from_canvas(final_image, content_box),
             "content_box": content_box,
             "final_size": final_image.size,
         }
         return final_image, metadata
 
     return final_image
+
+
+def supports_footer_strip(style) -> bool:
+    """样式输出是否等于 “原图 + 底部白色页脚”，即可以只渲染页脚条带。"""
+    return bool(
+        style
+        and style.get("layout") == "split_lr"
+        and style.get("background") == "white"
+        and not style.get("border_top_ratio")
+        and not style.get("border_left_ratio")
+    )
+
+
+def generate_footer_strip(origin_size, logo_path, camera_info, shooting_info,
+                          font_path_thin, font_path_bold, watermark_type=1,
+                          style_config=None, style=None,
+                          font_path_regular=None, font_path_symbol=None):
+    """只渲染页脚条带（不解码原图），像素与 generate_watermark_image 输出的页脚区域一致。
+
+    仅适用于 supports_footer_strip 为 True 的样式；条带高度包含偶数化补齐的 1 像素。
+    """
+    context = _build_render_context(
+        None, tuple(origin_size), logo_path, camera_info, shooting_info,
+        font_path_thin, font_path_bold, watermark_type,
+        style_config, style, font_path_regular, font_path_symbol,
+    )
+    if not supports_footer_strip(context.style):
+        raise ValueError(f"Watermark style {context.style['style_id']} does not support footer strips")
+    logger.info("Generating footer strip, current watermark type: %s", context.style["style_id"])
+
+    renderer = get_renderer(context.style["layout"])
+    strip = renderer.render_footer(context)
+
+    if context.new_height % 2 != 0:
+        strip = ImageOps.expand(strip, border=(0, 0, 0, 1), fill='white')
+    return strip
+
+
+def plan_watermark_canvas(origin_size, logo_path, camera_info, shooting_info,
+                          font_path_thin, font_path_bold, watermark_type=1,
+                          style_config=None, style=None,
+                          font_path_regular=None, font_path_symbol=None):
+    """在解码原图之前规划成品画布：返回 (偶数化后的画布尺寸, 渲染临时缓冲字节数估算)。"""
+    context = _build_render_context(
+        None, tuple(origin_size), logo_path, camera_info, shooting_info,
+        font_path_thin, font_path_bold, watermark_type,
+        style_config, style, font_path_regular, font_path_symbol,
+    )
+    renderer = get_renderer(context.style["layout"])
+    canvas_size, scratch_bytes = renderer.plan_canvas(context)
+    return even_size(canvas_size), scratch_bytes
@@ -1,5 +1,6 @@
 """media 包：Motion Photo / Ultra HDR / 视频处理。"""
 
+from media.media_probe import MediaFeatures, probe_media_features
 from media.motion_photo import MotionPhotoSession, prepare_motion_photo
 from media.ultrahdr import (
     split_ultrahdr,
@@ -7,12 +8,17 @@ from media.ultrahdr import (
     update_primary_xmp_lengths,
     expand_gainmap_for_borders,
 )
+from media.video_probe import VideoInfo, probe_video
 
 __all__ = [
+    "MediaFeatures",
+    "probe_media_features",
     "MotionPhotoSession",
     "prepare_motion_photo",
     "split_ultrahdr",
     "inject_xmp",
     "update_primary_xmp_lengths",
     "expand_gainmap_for_borders",
+    "VideoInfo",
+    "probe_video",
 ]
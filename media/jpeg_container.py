@@ -0,0 +1,314 @@
+"""JPEG 容器索引：一次扫描记录标记段位置、SOF 尺寸、APP1 EXIF / XMP、EOI 与追加项目表。
+
+上传尺寸检查、Ultra HDR 拆分、Motion Photo 定位与 XMP 读取共用同一个索引，不再各自重扫文件。
+索引只保存偏移量；data 可以是 bytes 或 mmap，载荷在查询时才切片。
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+__all__ = [
+    "XMP_APP1_HEADER",
+    "EXIF_APP1_HEADER",
+    "JpegSegment",
+    "ContainerItem",
+    "JpegContainer",
+    "find_end_of_jpeg",
+]
+
+XMP_APP1_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+EXIF_APP1_HEADER = b"Exif\x00\x00"
+
+_XMP_START = b"<x:xmpmeta"
+_XMP_END = b"</x:xmpmeta>"
+
+# 没有长度字段的独立标记：RSTn、SOI、TEM
+_STANDALONE_MARKERS = frozenset(range(0xFFD0, 0xFFD8)) | {0xFFD8, 0xFF01}
+# 带尺寸的 SOF 标记（排除 DHT / JPG / DAC）
+_SOF_MARKERS = frozenset(range(0xFFC0, 0xFFD0)) - {0xFFC4, 0xFFC8, 0xFFCC}
+
+
+# ---- JPEG marker scanning ----
+def _read_u16_be(data: bytes, off: int) -> int:
+    return (data[off] << 8) | data[off + 1]
+
+# Last 0xFF of a fill run followed by a marker code (neither a 0x00 stuffing byte nor another 0xFF).
+_MARKER_TAIL_RE = re.compile(rb"\xff[^\x00\xff]")
+
+def _find_next_marker(data: bytes, off: int) -> Optional[Tuple[int, int]]:
+    """Return (marker, offset of the first 0xFF of its fill run) at or after off.
+
+    Entropy-coded data is skipped by the regex engine instead of a per-byte Python loop;
+    stuffed 0xFF00 pairs never match, so results equal a byte-wise scan.
+    """
+    match = _MARKER_TAIL_RE.search(data, off)
+    if match is None:
+        return None
+    tail = match.start()
+    i = tail
+    while i > off and data[i - 1] == 0xFF:
+        i -= 1
+    return (0xFF << 8) | data[tail + 1], i
+
+def find_end_of_jpeg(data: bytes, start: int = 0) -> int:
+    if start + 1 >= len(data) or data[start:start + 2] != b"\xFF\xD8":
+        raise ValueError("Not a JPEG SOI at given start offset")
+
+    off = start + 2
+    while True:
+        mk = _find_next_marker(data, off)
+        if mk is None:
+            raise ValueError("EOI not found")
+        marker, mpos = mk
+
+        if marker == 0xFFD9:  # EOI
+            return mpos + 2
+
+        if marker in _STANDALONE_MARKERS:
+            off = mpos + 2
+            continue
+
+        if marker == 0xFFDA:  # SOS
+            if mpos + 4 > len(data):
+                raise ValueError("Truncated SOS")
+            seglen = _read_u16_be(data, mpos + 2)
+            off = mpos + 2 + seglen
+            continue
+
+        if mpos + 4 > len(data):
+            raise ValueError("Truncated segment")
+        seglen = _read_u16_be(data, mpos + 2)
+        if seglen < 2:
+            raise ValueError("Invalid segment length")
+        off = mpos + 2 + seglen
+
+
+def _scan_appended_jpegs(data: bytes, start_off: int, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """[start_off, end) 内完整 JPEG 的 (SOI 偏移, EOI 之后)。"""
+    end = len(data) if end is None else end
+    res: List[Tuple[int, int]] = []
+    i = start_off
+    while True:
+        pos = data.find(b"\xFF\xD8", i, end)
+        if pos < 0:
+            break
+        try:
+            jpeg_end = find_end_of_jpeg(data, pos)
+        except ValueError:
+            i = pos + 2
+            continue
+        if jpeg_end > end:
+            break
+        res.append((pos, jpeg_end))
+        i = jpeg_end
+    return res
+
+
+class JpegSegment(NamedTuple):
+    """一个带长度字段的标记段：offset 指向 0xFF，载荷为 [offset + 4, end)。"""
+
+    marker: int
+    offset: int
+    end: int
+
+    @property
+    def payload_offset(self) -> int:
+        return self.offset + 4
+
+
+class ContainerItem(NamedTuple):
+    """主图 XMP 中 GContainer 目录描述的追加项目（gain map、motion 视频等）及其在文件中的位置。"""
+
+    semantic: Optional[str]
+    mime: Optional[str]
+    offset: int
+    length: int
+
+
+class JpegContainer:
+    """JPEG 文件的结构索引。
+
+    构造时只扫描 SOS 之前的标记段（文件头，通常几十 KB）；主图 EOI 与追加 JPEG 在首次查询时
+    用 marker 扫描各计算一次并缓存。end 限制追加内容的查找范围（如 motion photo 的视频起点）。
+    """
+
+    def __init__(self, data, end: Optional[int] = None):
+        self.data = data
+        self.end = len(data) if end is None else min(end, len(data))
+        self.segments: List[JpegSegment] = []
+        self.sos_offset: Optional[int] = None
+        self.size: Optional[Tuple[int, int]] = None
+        self.exif_segment: Optional[JpegSegment] = None
+        self.xmp_segments: List[JpegSegment] = []
+        self._primary_end: Optional[int] = None
+        self._appended_jpegs: Optional[List[Tuple[int, int]]] = None
+        self._items: Optional[List[ContainerItem]] = None
+        self._directory_entries: Optional[List[Tuple[Optional[str], Optional[str], int, int]]] = None
+        self._index_headers()
+
+    @classmethod
+    @contextmanager
+    def open(cls, path) -> Iterator["JpegContainer"]:
+        """以只读 mmap 打开文件建立索引；离开 with 后 data 不可再访问。"""
+        with open(path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                yield cls(b"")
+                return
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield cls(mm)
+
+    @property
+    def is_jpeg(self) -> bool:
+        return self.data[:2] == b"\xff\xd8"
+
+    def _index_headers(self) -> None:
+        data = self.data
+        n = self.end
+        if not self.is_jpeg:
+            return
+        off = 2
+        while off + 4 <= n:
+            mk = _find_next_marker(data, off)
+            if mk is None:
+                break
+            marker, mpos = mk
+            if marker == 0xFFD9:
+                self._primary_end = mpos + 2
+                break
+            if marker in _STANDALONE_MARKERS:
+                off = mpos + 2
+                continue
+            if mpos + 4 > n:
+                break
+            seg_end = mpos + 2 + _read_u16_be(data, mpos + 2)
+            if seg_end > n:
+                break
+            segment = JpegSegment(marker, mpos, seg_end)
+            self.segments.append(segment)
+            if marker == 0xFFDA:
+                self.sos_offset = mpos
+                break
+            if marker in _SOF_MARKERS and self.size is None and seg_end - mpos >= 9:
+                self.size = (_read_u16_be(data, mpos + 7), _read_u16_be(data, mpos + 5))
+            elif marker == 0xFFE1:
+                header = data[mpos + 4:mpos + 4 + len(XMP_APP1_HEADER)]
+                if header.startswith(EXIF_APP1_HEADER):
+                    if self.exif_segment is None:
+                        self.exif_segment = segment
+                elif header == XMP_APP1_HEADER:
+                    self.xmp_segments.append(segment)
+            off = seg_end
+
+    def read(self, start: int, end: int) -> bytes:
+        return bytes(self.data[start:end])
+
+    @property
+    def exif(self) -> Optional[bytes]:
+        """APP1 EXIF 载荷（不含 "Exif\\0\\0" 头），可直接交给 piexif.load。"""
+        segment = self.exif_segment
+        if segment is None:
+            return None
+        return self.read(segment.payload_offset + len(EXIF_APP1_HEADER), segment.end)
+
+    @property
+    def xmp_packets(self) -> List[bytes]:
+        """各 APP1 XMP 段的原始 XML（不含 XMP APP1 头）。"""
+        skip = len(XMP_APP1_HEADER)
+        return [self.read(segment.payload_offset + skip, segment.end) for segment in self.xmp_segments]
+
+    @property
+    def xmp(self) -> Optional[bytes]:
+        """第一个 APP1 XMP 包中的 <x:xmpmeta>…</x:xmpmeta>。
+
+        没有 APP1 XMP 段（非标准写入）时，退回在主图范围内查找，不会扫到追加的视频。
+        """
+        for segment in self.xmp_segments:
+            start = self.data.find(_XMP_START, segment.payload_offset, segment.end)
+            if start == -1:
+                continue
+            stop = self.data.find(_XMP_END, start, segment.end)
+            if stop != -1:
+                return self.read(start, stop + len(_XMP_END))
+        limit = self.primary_end or self.end
+        start = self.data.find(_XMP_START, 0, limit)
+        if start == -1:
+            return None
+        stop = self.data.find(_XMP_END, start, limit)
+        if stop == -1:
+            return None
+        return self.read(start, stop + len(_XMP_END))
+
+    @property
+    def primary_end(self) -> Optional[int]:
+        """主图 EOI 之后的偏移；找不到 EOI 时为 None。"""
+        if self._primary_end is None and self.sos_offset is not None:
+            try:
+                self._primary_end = find_end_of_jpeg(self.data, 0)
+            except ValueError:
+                # 截断的文件：记为 -1，不再重复扫描
+                self._primary_end = -1
+        if self._primary_end is None or not 0 < self._primary_end <= self.end:
+            return None
+        return self._primary_end
+
+    @property
+    def appended_jpegs(self) -> List[Tuple[int, int]]:
+        """主图之后、end 之前的完整 JPEG 的 (起点, EOI 之后)。"""
+        if self._appended_jpegs is None:
+            primary_end = self.primary_end
+            start = primary_end if primary_end is not None else self.end
+            self._appended_jpegs = _scan_appended_jpegs(self.data, start, self.end)
+        return self._appended_jpegs
+
+    def _directory(self) -> List[Tuple[Optional[str], Optional[str], int, int]]:
+        """GContainer 目录中带长度的非 Primary 项目：(semantic, mime, length, padding)。"""
+        if self._directory_entries is None:
+            from media.ultrahdr import parse_gcontainer_items_from_xmp
+
+            entries = next(
+                (found for found in map(parse_gcontainer_items_from_xmp, self.xmp_packets) if found), None,
+            ) or []
+            self._directory_entries = [
+                (entry.get("semantic"), entry.get("mime"), entry["length"], entry.get("padding") or 0)
+                for entry in entries
+                if entry.get("semantic") != "Primary" and entry.get("length")
+            ]
+        return self._directory_entries
+
+    @property
+    def items(self) -> List[ContainerItem]:
+        """按 GContainer 目录顺序排列的追加项目（跳过 Primary）；偏移从主图 EOI 起依次累加长度与 padding。"""
+        if self._items is None:
+            self._items = []
+            cur = self.primary_end
+            if cur is not None:
+                for semantic, mime, length, padding in self._directory():
+                    self._items.append(ContainerItem(semantic, mime, cur, length))
+                    cur += length + padding
+        return self._items
+
+    def trailing_items(self) -> List[ContainerItem]:
+        """假定目录项目紧贴在 end 之前，按长度从 end 倒推各项目偏移。
+
+        只用到文件头中的 XMP，不扫描主图熵编码数据；调用方应校验偏移处的内容。
+        """
+        items = []
+        cur = self.end
+        for semantic, mime, length, padding in reversed(self._directory()):
+            cur -= length + padding
+            items.append(ContainerItem(semantic, mime, cur, length))
+        return items[::-1]
+
+    def bounded(self, end: int) -> "JpegContainer":
+        """同一文件在 [0, end) 范围内的索引，复用已解析的文件头与主图 EOI。"""
+        view = JpegContainer.__new__(JpegContainer)
+        view.__dict__.update(self.__dict__)
+        view.end = min(end, len(self.data))
+        view._appended_jpegs = None
+        view._items = None
+        return view
@@ -0,0 +1,188 @@
+"""
+压缩域 JPEG 拼接：在原图下方追加新的 MCU 行，原有 DCT 系数原样保留。
+
+依赖 IJG jpegtran 9+ 的两项能力（libjpeg-turbo 版本的 jpegtran 不支持）：
+- ``-crop WxH+0+0`` 在目标尺寸大于原图时扩展画布（crop extension）；
+- ``-drop +X+Y file`` 把另一张 JPEG 的系数块写入指定 MCU 位置。
+
+页脚条带使用原图的量化表与采样方式编码，因此 drop 时无需重新量化。
+不满足条件（没有 jpegtran、非 MCU 对齐、色彩模式不支持等）时返回 None / 抛出
+LosslessAppendError，由调用方回退到解码重编码流程。
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, JpegImagePlugin
+
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.jpeg_lossless")
+
+_SUPPORTED_MODES = ("L", "RGB")
+_MPF_APP2_HEADER = b"MPF\x00"
+
+
+class LosslessAppendError(RuntimeError):
+    """jpegtran 拼接失败。"""
+
+
+@lru_cache(maxsize=1)
+def find_jpegtran() -> Optional[str]:
+    """返回支持 crop 扩展与 -drop 的 jpegtran 路径；不可用时返回 None。
+
+    usage 文本无法说明 -crop 能否扩展画布，因此用一张 16x16 的小图实际执行一次扩展 + drop，结果按进程缓存。
+    """
+    executable = shutil.which("jpegtran")
+    if not executable:
+        return None
+    try:
+        _probe_crop_and_drop(executable)
+    except LosslessAppendError as exc:
+        logger.info("jpegtran at %s cannot extend and drop (%s); lossless footer disabled", executable, exc)
+        return None
+    return executable
+
+
+def _probe_crop_and_drop(jpegtran: str) -> None:
+    source = BytesIO()
+    Image.new("RGB", (16, 16), "#336699").save(source, format="JPEG", subsampling=0)
+    strip = BytesIO()
+    with Image.open(BytesIO(source.getvalue())) as image:
+        Image.new("RGB", (16, 16), "white").save(strip, format="JPEG", qtables=image.quantization, subsampling=0)
+    result = _extend_and_drop(jpegtran, source.getvalue(), strip.getvalue(), 16, 16, 32, timeout=5)
+    try:
+        with Image.open(BytesIO(result)) as image:
+            size = image.size
+    except OSError as exc:
+        raise LosslessAppendError(f"jpegtran produced an unreadable JPEG: {exc}") from exc
+    if size != (16, 32):
+        raise LosslessAppendError(f"jpegtran produced {size[0]}x{size[1]} instead of 16x32")
+
+
+def mcu_size(image: Image.Image) -> Optional[Tuple[int, int]]:
+    """返回 JPEG 的 MCU 尺寸 (宽, 高)；非 JPEG 或无法识别时返回 None。"""
+    layers = getattr(image, "layer", None)
+    if image.format != "JPEG" or not layers:
+        return None
+    max_h = max(h for _, h, _, _ in layers)
+    max_v = max(v for _, _, v, _ in layers)
+    return 8 * max_h, 8 * max_v
+
+
+def can_append_losslessly(image: Image.Image) -> bool:
+    """图像（未解码的 JpegImageFile）是否可以在底部按 MCU 行无损追加内容。"""
+    if image.mode not in _SUPPORTED_MODES:
+        return False
+    mcu = mcu_size(image)
+    if mcu is None:
+        return False
+    if image.mode == "RGB" and JpegImagePlugin.get_sampling(image) == -1:
+        return False
+    return image.height % mcu[1] == 0
+
+
+def _run_jpegtran(args, timeout: float) -> None:
+    try:
+        subprocess.run(
+            args,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except subprocess.CalledProcessError as exc:
+        detail = exc.stderr.decode("utf-8", errors="replace").strip() or "unknown jpegtran error"
+        raise LosslessAppendError(f"jpegtran failed: {detail}") from exc
+    except (OSError, subprocess.SubprocessError) as exc:
+        raise LosslessAppendError(f"jpegtran failed: {exc}") from exc
+
+
+def _extend_and_drop(jpegtran: str, jpeg_bytes: bytes, strip_jpeg: bytes, width: int, height: int,
+                     new_height: int, timeout: float) -> bytes:
+    """-crop 把画布扩展到 new_height，再 -drop 把 strip_jpeg 放到原图下方。"""
+    with tempfile.TemporaryDirectory(prefix="autowatermark_jpegtran_") as tmp_dir:
+        src_path = os.path.join(tmp_dir, "source.jpg")
+        strip_path = os.path.join(tmp_dir, "strip.jpg")
+        extended_path = os.path.join(tmp_dir, "extended.jpg")
+        out_path = os.path.join(tmp_dir, "output.jpg")
+        with open(src_path, "wb") as f:
+            f.write(jpeg_bytes)
+        with open(strip_path, "wb") as f:
+            f.write(strip_jpeg)
+
+        _run_jpegtran(
+            [jpegtran, "-copy", "all", "-crop", f"{width}x{new_height}+0+0",
+             "-outfile", extended_path, src_path],
+            timeout,
+        )
+        _run_jpegtran(
+            [jpegtran, "-copy", "all", "-drop", f"+0+{height}", strip_path,
+             "-outfile", out_path, extended_path],
+            timeout,
+        )
+        try:
+            with open(out_path, "rb") as f:
+                return f.read()
+        except OSError as exc:
+            raise LosslessAppendError(f"jpegtran wrote no output: {exc}") from exc
+
+
+def append_strip_lossless(jpeg_bytes: bytes, strip: Image.Image, timeout: float = 60) -> bytes:
+    """在 jpeg_bytes 底部追加 strip（宽度必须一致），原图区域的压缩数据保持不变。
+
+    输出保留原文件的 APP 段（EXIF/ICC/XMP，MPF 除外）；jpegtran 不可用或图像不满足
+    MCU 对齐条件时抛出 LosslessAppendError。
+    """
+    jpegtran = find_jpegtran()
+    if jpegtran is None:
+        raise LosslessAppendError("jpegtran with crop extension and -drop support is not available")
+
+    with Image.open(BytesIO(jpeg_bytes)) as source:
+        if not can_append_losslessly(source):
+            raise LosslessAppendError("source JPEG is not MCU aligned or uses an unsupported mode")
+        if strip.width != source.width:
+            raise LosslessAppendError(
+                f"strip width {strip.width} does not match image width {source.width}"
+            )
+        width, height = source.size
+        mode = source.mode
+        qtables = source.quantization
+        subsampling = JpegImagePlugin.get_sampling(source) if mode == "RGB" else 0
+
+    strip_out = BytesIO()
+    # 与原图相同的量化表/采样方式，-drop 时系数可直接拷贝
+    strip.convert(mode).save(strip_out, format="JPEG", qtables=qtables, subsampling=subsampling)
+
+    result = _extend_and_drop(
+        jpegtran, jpeg_bytes, strip_out.getvalue(), width, height, height + strip.height, timeout,
+    )
+    if not result.startswith(b"\xFF\xD8"):
+        raise LosslessAppendError("jpegtran produced an invalid JPEG")
+    return strip_mpf(result)
+
+
+def strip_mpf(jpeg_bytes: bytes) -> bytes:
+    """移除 APP2 MPF 段：原文件尾部附带的图像不会被 jpegtran 带到输出中，MPF 索引已失效。"""
+    if not jpeg_bytes.startswith(b"\xFF\xD8"):
+        raise ValueError("Input is not a JPEG")
+    out = bytearray(jpeg_bytes[:2])
+    idx = 2
+    n = len(jpeg_bytes)
+    while idx + 4 <= n and jpeg_bytes[idx] == 0xFF:
+        marker = jpeg_bytes[idx + 1]
+        if marker == 0xDA or not (0xC0 <= marker <= 0xFE):
+            break
+        seg_end = idx + 2 + ((jpeg_bytes[idx + 2] << 8) | jpeg_bytes[idx + 3])
+        if marker != 0xE2 or not jpeg_bytes[idx + 4:seg_end].startswith(_MPF_APP2_HEADER):
+            out.extend(jpeg_bytes[idx:seg_end])
+        idx = seg_end
+    out.extend(jpeg_bytes[idx:])
+    return bytes(out)
@@ -0,0 +1,67 @@
+"""上传阶段的 Motion Photo / Ultra HDR 特征探测。
+
+只读取文件头（APP1 XMP、前 64KB 的 Ultra HDR 特征）与视频所在的文件尾：不复制载荷、不创建临时文件，
+耗时不随主图大小增长。
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from media.jpeg_container import JpegContainer
+from media.motion_photo import _locate_motion_video
+from media.ultrahdr import ULTRAHDR_MARKERS, ULTRAHDR_PROBE_BYTES
+
+__all__ = ["MediaFeatures", "probe_media_features"]
+
+
+@dataclass(frozen=True)
+class MediaFeatures:
+    is_motion: bool = False
+    is_hdr: bool = False
+    # 追加的 MP4 起始偏移
+    video_offset: Optional[int] = None
+    # Ultra HDR gain map JPEG 的起始偏移；目录缺失或与文件内容对不上时为 None
+    gainmap_offset: Optional[int] = None
+
+
+def probe_media_features(source: Union[str, os.PathLike, bytes]) -> MediaFeatures:
+    """source 为文件路径（mmap 读取）或已在内存中的字节。"""
+    if isinstance(source, (bytes, bytearray)):
+        return _features_from_container(JpegContainer(source))
+    if os.path.getsize(source) < 16:
+        return MediaFeatures()
+    with JpegContainer.open(source) as container:
+        return _features_from_container(container)
+
+
+def _features_from_container(container: JpegContainer) -> MediaFeatures:
+    video_offset, _xmp = _locate_motion_video(container)
+    header = container.data[:ULTRAHDR_PROBE_BYTES]
+    is_hdr = any(marker in header for marker in ULTRAHDR_MARKERS)
+    return MediaFeatures(
+        is_motion=video_offset is not None,
+        is_hdr=is_hdr,
+        video_offset=video_offset,
+        gainmap_offset=_locate_gainmap(container, video_offset) if is_hdr else None,
+    )
+
+
+def _locate_gainmap(container: JpegContainer, video_offset: Optional[int]) -> Optional[int]:
+    """按 GContainer 目录中的长度从追加内容末尾倒推 gain map 位置，不扫描主图熵编码数据。
+
+    目录可能包含也可能不包含 motion 视频项目，因此依次假定追加内容止于视频起点或文件末尾，
+    取第一个指向 JPEG SOI 的结果。
+    """
+    if container.sos_offset is None:
+        return None
+    data = container.data
+    for end in dict.fromkeys(filter(None, (video_offset, len(data)))):
+        for item in container.bounded(end).trailing_items():
+            if item.semantic != "GainMap":
+                continue
+            if item.offset > container.sos_offset and data[item.offset:item.offset + 2] == b"\xff\xd8":
+                return item.offset
+    return None
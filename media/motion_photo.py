@@ -2,13 +2,15 @@
 
 from __future__ import annotations
 
+import os
 import tempfile
 import mmap
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 from logging_utils import get_logger
+from process_io import FilePart, copy_range, make_sink
 
 _logger = get_logger("autowatermark.motion_photo")
 
@@ -23,7 +25,6 @@ from media.xmp import (
     MICRO_VIDEO_OFFSET_PATTERN,
     OFFSET_ATTRS,
     LENGTH_ATTRS,
-    _extract_xmp_segment,
     _parse_first_match,
     _looks_like_motionphoto_flag,
     _prepare_xmp_ultrahdr_motion,
@@ -34,19 +35,18 @@ from media.video import (
     _apply_watermark_to_video,
     _copy_all_metadata_with_exiftool,
 )
-
-
-@dataclass
-class _RawMotionComponents:
-    photo_bytes: bytes
-    video_bytes: bytes
-    xmp_bytes: Optional[bytes]
+from media.jpeg_container import JpegContainer
+from media.ultrahdr import ULTRAHDR_MARKERS as _UHDR_PROBE_MARKERS, ULTRAHDR_PROBE_BYTES as _UHDR_PROBE_BYTES
+from media.ultrahdr import split_ultrahdr
 
 
 @dataclass
 class MotionPhotoSession:
     still_path: Path
-    video_bytes: bytes
+    # 原始视频位于 video_source 的 [video_offset, video_offset + video_length)，会话不持有视频字节
+    video_source: Path
+    video_offset: int
+    video_length: int
     xmp_bytes: bytes
     _workspace: tempfile.TemporaryDirectory
 
@@ -56,13 +56,23 @@ class MotionPhotoSession:
     ultrahdr_primary_size: Optional[tuple[int, int]] = None
     @property
     def has_motion(self) -> bool:
-        return bool(self.video_bytes)
-
-    def finalize(self, watermarked_path: Path, output_path: Path, metadata: dict) -> None:
+        return self.video_length > 0
+
+    def _original_video_path(self) -> Path:
+        """ffmpeg 的输入文件：视频已是独立文件时直接使用，否则从源文件在内核中复制出来。"""
+        if self.video_offset == 0 and self.video_source.stat().st_size == self.video_length:
+            return self.video_source
+        target = Path(self._workspace.name) / "motion_original.mp4"
+        with self.video_source.open("rb") as src, target.open("wb") as out:
+            copy_range(src.fileno(), out.fileno(), self.video_offset, self.video_length)
+        return target
+
+    def finalize(self, watermarked_path: Path, output, metadata: dict, encoding_profile=None) -> None:
         """
         watermarked_path: path to the watermarked STILL jpeg (already rendered by your watermark pipeline)
-        output_path: final motion photo path to write
-        metadata: must contain overlay_image (PIL image) and content_box (left,top,right,bottom)
+        output: final motion photo path, or a process_io.OutputSink (primary / gain map / video written as chunks)
+        metadata: must contain overlay (imaging.overlay.BorderOverlay) and content_box (left,top,right,bottom)
+        encoding_profile: media.video.VideoEncodingProfile for the video re-encode (None: configured default)
         """
         if not self.has_motion:
             raise ValueError("Cannot finalize motion photo without video bytes")
@@ -71,29 +81,31 @@ class MotionPhotoSession:
         if not metadata:
             raise ValueError("Watermark metadata required for motion photo processing")
 
-        overlay_image = metadata.get("overlay_image")
+        overlay = metadata.get("overlay")
         content_box = metadata.get("content_box")
-        if overlay_image is None or content_box is None:
+        if overlay is None or content_box is None:
             raise ValueError("Incomplete watermark metadata for motion photo processing")
 
         workspace_path = Path(self._workspace.name)
 
         # --- 1) Watermark the appended video using ffmpeg ---
-        original_video_path = workspace_path / "motion_original.mp4"
-        original_video_path.write_bytes(self.video_bytes)
+        original_video_path = self._original_video_path()
 
-        overlay_path = workspace_path / "watermark_overlay.png"
-        overlay_image.save(overlay_path, format="PNG")
+        # 只传边框条带（不透明 RGB），由 _apply_watermark_to_video 缩放到视频分辨率后交给 ffmpeg
+        overlay_strips = [(strip.image, strip.box) for strip in overlay.strips]
 
         watermarked_video_path = workspace_path / "motion_watermarked.mp4"
         _apply_watermark_to_video(
             original_video_path,
-            overlay_path,
+            overlay_strips,
             watermarked_video_path,
             content_box,
-            overlay_size=overlay_image.size,  # (w, h)
+            overlay_size=overlay.canvas_size,  # (w, h)
+            profile=encoding_profile,
         )
-        watermarked_video_bytes = watermarked_video_path.read_bytes()
+        # 带水印的视频不读回内存，组装输出时按文件片段直接复制
+        watermarked_video = FilePart(str(watermarked_video_path))
+        watermarked_video_length = watermarked_video.resolved_length()
 
         # --- 2) IMPORTANT: preserve EXIF/MakerNote metadata on still image (Xiaomi album may rely on it) ---
         # Copy metadata from original still (extracted from original motion file) to the watermarked still jpeg.
@@ -148,7 +160,7 @@ class MotionPhotoSession:
                 self.xmp_bytes,
                 primary_length=0,
                 gainmap_length=len(gainmap_jpeg),
-                video_length=len(watermarked_video_bytes),
+                video_length=watermarked_video_length,
             )
             tmp_primary = _inject_xmp(watermarked_still_bytes, xmp0)
 
@@ -156,76 +168,100 @@ class MotionPhotoSession:
                 self.xmp_bytes,
                 primary_length=len(tmp_primary),
                 gainmap_length=len(gainmap_jpeg),
-                video_length=len(watermarked_video_bytes),
+                video_length=watermarked_video_length,
             )
             final_primary = _inject_xmp(watermarked_still_bytes, xmp1)
 
-            output_path = Path(output_path)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_bytes(final_primary + gainmap_jpeg + watermarked_video_bytes)
+            make_sink(output).write_parts((final_primary, gainmap_jpeg, watermarked_video))
             return
 
         # --- Original SDR motion photo path ---
         jpeg_with_xmp = _inject_xmp(
             watermarked_still_bytes,
-            _prepare_xmp(self.xmp_bytes, len(watermarked_video_bytes)),
+            _prepare_xmp(self.xmp_bytes, watermarked_video_length),
         )
 
-        output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        output_path.write_bytes(jpeg_with_xmp + watermarked_video_bytes)
+        make_sink(output).write_parts((jpeg_with_xmp, watermarked_video))
 
     def cleanup(self) -> None:
         self._workspace.cleanup()
 
 
-def prepare_motion_photo(image_path: str | Path) -> Optional[MotionPhotoSession]:
-    path = Path(image_path)
-    data = path.read_bytes()
-    components = _split_motion_photo(data)
-    if not components.video_bytes or not components.xmp_bytes:
+def prepare_motion_photo(source: str | Path | bytes) -> Optional[MotionPhotoSession]:
+    """source 为文件路径或已在内存中的文件内容。
+
+    只记录视频的偏移与长度；文件通过 mmap 定位，照片部分写成 still_path，视频留到 finalize 时再复制。
+    """
+    if isinstance(source, bytes):
+        return _prepare_from_buffer(source, "source", None)
+    path = Path(source)
+    with path.open("rb") as fp:
+        if os.fstat(fp.fileno()).st_size < 16:
+            return None
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _prepare_from_buffer(mm, path.stem, path)
+
+
+def _prepare_from_buffer(data, stem: str, source_path: Optional[Path]) -> Optional[MotionPhotoSession]:
+    container = JpegContainer(data)
+    video_start, xmp = _locate_motion_video(container)
+    if video_start is None or not xmp:
         return None
 
     workspace = tempfile.TemporaryDirectory()
-    still_bytes = components.photo_bytes
-    ultrahdr_gainmap_jpeg = None
-    ultrahdr_gainmap_xmp = None
-    ultrahdr_primary_size = None
-
-    # --- Try detect Ultra HDR (JPEG_R) in the still part ---
-    # 如果 photo_bytes 是 JPEG_R（primary+gainmap），则：
-    # 1) still_path 写 primary_jpeg
-    # 2) session 缓存 gainmap_jpeg/xmp，finalize 时再封装回去
+    workspace_path = Path(workspace.name)
+    view = memoryview(data)
     try:
-        from media.ultrahdr import split_ultrahdr
-        from io import BytesIO
-        from PIL import Image
-
-        parts = split_ultrahdr(components.photo_bytes)
-        if parts.gainmap_jpeg:
-            still_bytes = parts.primary_jpeg
-            ultrahdr_gainmap_jpeg = parts.gainmap_jpeg
-            ultrahdr_gainmap_xmp = parts.gainmap_xmp
+        ultrahdr_gainmap_jpeg = None
+        ultrahdr_gainmap_xmp = None
+        ultrahdr_primary_size = None
+        still_bytes = None
+
+        # --- Try detect Ultra HDR (JPEG_R) in the still part ---
+        # 如果照片部分是 JPEG_R（primary+gainmap），则：
+        # 1) still_path 写 primary_jpeg
+        # 2) session 缓存 gainmap_jpeg/xmp，finalize 时再封装回去
+        # 普通照片不读入内存，直接从源文件复制到 still_path
+        if any(marker in data[:min(video_start, _UHDR_PROBE_BYTES)] for marker in _UHDR_PROBE_MARKERS):
             try:
-                im = Image.open(BytesIO(parts.primary_jpeg))
-                try:
-                    im.load()
-                    ultrahdr_primary_size = im.size
-                finally:
-                    im.close()
+                # 复用同一个索引，只在视频起点之前查找 gain map
+                still = container.bounded(video_start)
+                parts = split_ultrahdr(still)
+                if parts.gainmap_jpeg:
+                    still_bytes = parts.primary_jpeg
+                    ultrahdr_gainmap_jpeg = parts.gainmap_jpeg
+                    ultrahdr_gainmap_xmp = parts.gainmap_xmp
+                    # 主图尺寸取自 SOF，不解码像素
+                    ultrahdr_primary_size = still.size
             except Exception:
-                _logger.debug("Failed to read Ultra HDR primary image size", exc_info=True)
-                ultrahdr_primary_size = None
-    except Exception:
-        _logger.debug("Ultra HDR detection failed for motion photo, treating as standard", exc_info=True)
-
-    still_path = Path(workspace.name) / f"{path.stem}_motion_still.jpg"
-    still_path.write_bytes(still_bytes)
+                _logger.debug("Ultra HDR detection failed for motion photo, treating as standard", exc_info=True)
+
+        still_path = workspace_path / f"{stem}_motion_still.jpg"
+        if still_bytes is not None:
+            still_path.write_bytes(still_bytes)
+        else:
+            _write_range(still_path, view, source_path, 0, video_start)
+
+        video_length = len(data) - video_start
+        if source_path is None:
+            # 内存输入没有可供复制的源文件，直接把视频切片写入工作目录
+            video_source = workspace_path / "motion_source.mp4"
+            video_source.write_bytes(view[video_start:])
+            video_offset = 0
+        else:
+            video_source, video_offset = source_path, video_start
+    except BaseException:
+        workspace.cleanup()
+        raise
+    finally:
+        view.release()
 
     return MotionPhotoSession(
         still_path=still_path,
-        video_bytes=components.video_bytes,
-        xmp_bytes=components.xmp_bytes,
+        video_source=video_source,
+        video_offset=video_offset,
+        video_length=video_length,
+        xmp_bytes=xmp,
         _workspace=workspace,
         ultrahdr_gainmap_jpeg=ultrahdr_gainmap_jpeg,
         ultrahdr_gainmap_xmp=ultrahdr_gainmap_xmp,
@@ -233,70 +269,63 @@ def prepare_motion_photo(image_path: str | Path) -> Optional[MotionPhotoSession]
     )
 
 
-def _split_motion_photo(data: bytes) -> _RawMotionComponents:
-    xmp = _extract_xmp_segment(data)
+def _write_range(target: Path, view: memoryview, source_path: Optional[Path], offset: int, length: int) -> None:
+    """把 [offset, offset + length) 写到 target：有源文件时在内核中复制，否则写内存切片。"""
+    with target.open("wb") as out:
+        if source_path is None:
+            out.write(view[offset:offset + length])
+            return
+        with source_path.open("rb") as src:
+            copy_range(src.fileno(), out.fileno(), offset, length)
+
+
+def _locate_motion_video(container: JpegContainer) -> Tuple[Optional[int], Optional[bytes]]:
+    """按 JPEG 索引定位追加的 MP4，返回 (视频起始偏移, XMP)；不是 motion photo 时偏移为 None。"""
+    data = container.data
+    file_size = len(data)
+    if file_size < 16:
+        return None, None
+    xmp = container.xmp
     if not xmp:
-        return _RawMotionComponents(photo_bytes=data, video_bytes=b"", xmp_bytes=None)
+        return None, None
 
     length = _parse_first_match(MICRO_VIDEO_LENGTH_PATTERN, xmp)
     offset = _parse_first_match(MICRO_VIDEO_OFFSET_PATTERN, xmp)
 
-    file_size = len(data)
-
     # 1) Old style: length/offset describes appended video tail
-    if length and length > 0:
-        video_length = length
-        video_start = file_size - video_length
-        if 0 < video_start < file_size:
-            photo_bytes = data[:video_start]
-            video_bytes = data[video_start:video_start + video_length]
-            if _mp4_looks_valid(video_bytes):
-                return _RawMotionComponents(photo_bytes=photo_bytes, video_bytes=video_bytes, xmp_bytes=xmp)
-
-    if offset and offset > 0:
-        video_length = offset
-        video_start = file_size - video_length
-        if 0 < video_start < file_size:
-            photo_bytes = data[:video_start]
-            video_bytes = data[video_start:video_start + video_length]
-            if _mp4_looks_valid(video_bytes):
-                return _RawMotionComponents(photo_bytes=photo_bytes, video_bytes=video_bytes, xmp_bytes=xmp)
+    for video_length in (length, offset):
+        if video_length and video_length > 0:
+            video_start = file_size - video_length
+            if 0 < video_start < file_size and _mp4_looks_valid_at(data, video_start, file_size):
+                return video_start, xmp
 
     # 2) Xiaomi / generic: MotionPhoto=1 but no explicit offset/length.
     #    Fall back to scanning file tail for MP4 box 'ftyp' to locate video start.
     if _looks_like_motionphoto_flag(xmp):
         start = _find_mp4_start_by_ftyp(data)
-        if start is not None and 0 < start < file_size:
-            photo_bytes = data[:start]
-            video_bytes = data[start:]
-            if _mp4_looks_valid(video_bytes):
-                return _RawMotionComponents(photo_bytes=photo_bytes, video_bytes=video_bytes, xmp_bytes=xmp)
+        if start is not None and 0 < start < file_size and _mp4_looks_valid_at(data, start, file_size):
+            return start, xmp
 
-    return _RawMotionComponents(photo_bytes=data, video_bytes=b"", xmp_bytes=xmp)
+    return None, xmp
 
 
-def _mp4_looks_valid(video_bytes: bytes) -> bool:
-    head = video_bytes[:65536]
-    return b"ftyp" in head
-
-
-def _find_mp4_start_by_ftyp(data: bytes, scan_tail_bytes: int = 32 * 1024 * 1024) -> Optional[int]:
+def _find_mp4_start_by_ftyp(data, scan_tail_bytes: int = 32 * 1024 * 1024) -> Optional[int]:
     """
     Scan the tail of file to locate MP4 start by finding 'ftyp' box.
     Typical MP4 starts with: [4-byte size][b'ftyp']...
     Many motion photos are: JPEG ... FFD9 ... MP4...
+    data 可以是 bytes 或 mmap；直接在原缓冲上按范围查找，不复制文件尾部。
     """
     n = len(data)
     if n < 16:
         return None
 
-    tail = data[max(0, n - scan_tail_bytes):]
-    base = n - len(tail)
+    base = max(0, n - scan_tail_bytes)
 
-    idx = tail.rfind(b"ftyp")
+    idx = data.rfind(b"ftyp", base)
     while idx != -1:
-        if idx >= 4:
-            start = base + idx - 4
+        if idx - base >= 4:
+            start = idx - 4
             if start >= 0 and start + 8 <= n and data[start + 4:start + 8] == b"ftyp":
                 size = int.from_bytes(data[start:start + 4], "big", signed=False)
                 if 8 <= size <= (n - start):
@@ -308,7 +337,7 @@ def _find_mp4_start_by_ftyp(data: bytes, scan_tail_bytes: int = 32 * 1024 * 1024
                             return cand
                     return start
 
-        idx = tail.rfind(b"ftyp", 0, idx)
+        idx = data.rfind(b"ftyp", base, idx)
     return None
 
 
@@ -330,31 +359,7 @@ def find_motion_video_start(file_path: str | Path) -> Optional[int]:
         return None
 
     with path.open("rb") as fp:
+        if os.fstat(fp.fileno()).st_size < 16:
+            return None
         with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-            file_size = len(mm)
-            if file_size < 16:
-                return None
-
-            xmp = _extract_xmp_segment(mm)
-            if not xmp:
-                return None
-
-            length = _parse_first_match(MICRO_VIDEO_LENGTH_PATTERN, xmp)
-            offset = _parse_first_match(MICRO_VIDEO_OFFSET_PATTERN, xmp)
-
-            if length and length > 0:
-                video_start = file_size - length
-                if 0 < video_start < file_size and _mp4_looks_valid_at(mm, video_start, file_size):
-                    return video_start
-
-            if offset and offset > 0:
-                video_start = file_size - offset
-                if 0 < video_start < file_size and _mp4_looks_valid_at(mm, video_start, file_size):
-                    return video_start
-
-            if _looks_like_motionphoto_flag(xmp):
-                start = _find_mp4_start_by_ftyp(mm)
-                if start is not None and 0 < start < file_size and _mp4_looks_valid_at(mm, start, file_size):
-                    return start
-
-    return None
+            return _locate_motion_video(JpegContainer(mm))[0]
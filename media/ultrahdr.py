@@ -12,6 +12,7 @@ This module provides:
 - split_ultrahdr(): extract primary and gainmap JPEG bytes
 - pack_ultrahdr(): build a JPEG_R file from primary+gainmap and XMP
 - expand_gainmap_for_borders(): if you enlarge the primary (add borders), pad the gainmap with neutral pixels
+- append_gainmap_footer_lossless(): same for a bottom-only footer, without re-encoding the existing gain map
 - small XMP helpers (strip/inject/update directory lengths)
 """
 
@@ -25,141 +26,40 @@ from typing import Dict, List, Optional, Tuple
 
 from PIL import Image
 
-XMP_APP1_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+from media.jpeg_container import (  # noqa: F401  (re-exported for existing callers)
+    XMP_APP1_HEADER,
+    JpegContainer,
+    _scan_appended_jpegs,
+    find_end_of_jpeg,
+)
+
 HDRGM_NS = "http://ns.adobe.com/hdr-gain-map/1.0/"
 
-# ---- JPEG parsing helpers ----
-def _read_u16_be(data: bytes, off: int) -> int:
-    return (data[off] << 8) | data[off + 1]
-
-def _find_next_marker(data: bytes, off: int) -> Optional[Tuple[int, int]]:
-    n = len(data)
-    i = off
-    while i + 1 < n:
-        if data[i] == 0xFF:
-            j = i + 1
-            while j < n and data[j] == 0xFF:
-                j += 1
-            if j >= n:
-                return None
-            if data[j] == 0x00:  # stuffed
-                i = j + 1
-                continue
-            marker = (0xFF << 8) | data[j]
-            return marker, i
-        i += 1
-    return None
-
-def find_end_of_jpeg(data: bytes, start: int = 0) -> int:
-    if start + 1 >= len(data) or data[start:start + 2] != b"\xFF\xD8":
-        raise ValueError("Not a JPEG SOI at given start offset")
-
-    off = start + 2
-    while True:
-        mk = _find_next_marker(data, off)
-        if mk is None:
-            raise ValueError("EOI not found")
-        marker, mpos = mk
-
-        if marker == 0xFFD9:  # EOI
-            return mpos + 2
-
-        if 0xFFD0 <= marker <= 0xFFD7 or marker in (0xFFD8, 0xFF01):
-            off = mpos + 2
-            continue
-
-        if marker == 0xFFDA:  # SOS
-            if mpos + 4 > len(data):
-                raise ValueError("Truncated SOS")
-            seglen = _read_u16_be(data, mpos + 2)
-            off = mpos + 2 + seglen
-            continue
-
-        if mpos + 4 > len(data):
-            raise ValueError("Truncated segment")
-        seglen = _read_u16_be(data, mpos + 2)
-        if seglen < 2:
-            raise ValueError("Invalid segment length")
-        off = mpos + 2 + seglen
-
-def iter_app1_xmp_packets(jpeg_bytes: bytes) -> List[bytes]:
-    """Return list of raw XMP XML (without the APP1 XMP header)."""
-    if jpeg_bytes[:2] != b"\xFF\xD8":
-        return []
-    packets: List[bytes] = []
-    off = 2
-    n = len(jpeg_bytes)
-    while off + 4 <= n:
-        mk = _find_next_marker(jpeg_bytes, off)
-        if mk is None:
-            break
-        marker, mpos = mk
-        if marker in (0xFFDA, 0xFFD9):
-            break
-        if 0xFFD0 <= marker <= 0xFFD7 or marker in (0xFFD8, 0xFF01):
-            off = mpos + 2
-            continue
-
-        seglen = _read_u16_be(jpeg_bytes, mpos + 2)
-        payload_start = mpos + 4
-        payload_end = mpos + 2 + seglen
-        if payload_end > n:
-            break
-
-        if marker == 0xFFE1:  # APP1
-            payload = jpeg_bytes[payload_start:payload_end]
-            if payload.startswith(XMP_APP1_HEADER):
-                packets.append(payload[len(XMP_APP1_HEADER):])
-
-        off = payload_end
-    return packets
+# Ultra HDR 专有特征，出现在文件前 64KB（ULTRAHDR_PROBE_BYTES）内
+ULTRAHDR_MARKERS = (
+    b"hdrgm:Version",
+    b"urn:apple:photo:2024:aux:hdrgainmap",
+    b'Item:Semantic="GainMap"',
+    b"http://ns.adobe.com/hdr-gain-map/1.0/",
+)
+ULTRAHDR_PROBE_BYTES = 65536
+
+def iter_app1_xmp_packets(jpeg) -> List[bytes]:
+    """Return list of raw XMP XML (without the APP1 XMP header); jpeg is bytes or a JpegContainer."""
+    container = jpeg if isinstance(jpeg, JpegContainer) else JpegContainer(jpeg)
+    return container.xmp_packets
 
 def _strip_xmp(jpeg_bytes: bytes) -> bytes:
     """Remove APP1 XMP segments only (keeps EXIF APP1)."""
-    if not jpeg_bytes.startswith(b"\xff\xd8"):
+    container = JpegContainer(jpeg_bytes)
+    if not container.is_jpeg:
         raise ValueError("Input is not a JPEG")
-    out = bytearray(jpeg_bytes[:2])
-    idx = 2
-    n = len(jpeg_bytes)
-    while idx < n:
-        if jpeg_bytes[idx] != 0xFF:
-            out.extend(jpeg_bytes[idx:])
-            break
-
-        j = idx + 1
-        while j < n and jpeg_bytes[j] == 0xFF:
-            j += 1
-        if j >= n:
-            break
-
-        marker = (0xFF << 8) | jpeg_bytes[j]
-        out.extend(jpeg_bytes[idx:j + 2])
-        idx = j + 2
-
-        if marker == 0xFFD9:
-            break
-        if 0xFFD0 <= marker <= 0xFFD7 or marker in (0xFFD8, 0xFF01):
-            continue
-        if marker == 0xFFDA:
-            out.extend(jpeg_bytes[idx:])
-            break
-
-        if idx + 2 > n:
-            break
-        seglen = _read_u16_be(jpeg_bytes, idx)
-        seg_start = idx - 2
-        seg_end = idx + seglen
-        if seg_end > n:
-            break
-
-        payload = jpeg_bytes[idx + 2:seg_end]
-        if marker == 0xFFE1 and payload.startswith(XMP_APP1_HEADER):
-            # remove this segment: roll back marker bytes we just wrote
-            out = out[:-2]
-        else:
-            out.extend(jpeg_bytes[idx:seg_end])
-
-        idx = seg_end
+    out = bytearray()
+    pos = 0
+    for segment in container.xmp_segments:
+        out += jpeg_bytes[pos:segment.offset]
+        pos = segment.end
+    out += jpeg_bytes[pos:]
     return bytes(out)
 
 def _build_xmp_segment(xmp_xml: bytes) -> bytes:
@@ -269,13 +169,18 @@ def build_primary_xmp_for_gainmap(gainmap_len: int) -> bytes:
 </x:xmpmeta>'''.encode("utf-8")
 
 
-def looks_like_ultrahdr(primary_jpeg: bytes) -> bool:
+_ULTRAHDR_XMP_SIGNALS = (
+    b"http://ns.adobe.com/hdr-gain-map/1.0/",
+    b'hdrgm:Version="1.0"',
+    b'Item:Semantic="GainMap"',
+    b"DirectoryItemSemantic>GainMap",
+)
+
+def looks_like_ultrahdr(primary_jpeg) -> bool:
+    """primary_jpeg is bytes or a JpegContainer; only its APP1 XMP packets are inspected."""
     # Android spec: hdrgm:Version="1.0" in primary XMP is a signal; also GContainer GainMap semantic.
-    if b"http://ns.adobe.com/hdr-gain-map/1.0/" in primary_jpeg or b'hdrgm:Version="1.0"' in primary_jpeg:
-        return True
-    if b'Item:Semantic="GainMap"' in primary_jpeg or b"DirectoryItemSemantic>GainMap" in primary_jpeg:
-        return True
-    return False
+    container = primary_jpeg if isinstance(primary_jpeg, JpegContainer) else JpegContainer(primary_jpeg)
+    return any(signal in pkt for pkt in container.xmp_packets for signal in _ULTRAHDR_XMP_SIGNALS)
 
 # ---- Gain map metadata + neutral fill ----
 
@@ -339,21 +244,6 @@ class UltraHDRParts:
     gainmap_xmp: Optional[bytes]
     primary_len: int
 
-def _scan_appended_jpegs(data: bytes, start_off: int) -> List[Tuple[int, int]]:
-    res: List[Tuple[int, int]] = []
-    i = start_off
-    while True:
-        pos = data.find(b"\xFF\xD8", i)
-        if pos < 0:
-            break
-        try:
-            end = find_end_of_jpeg(data, pos)
-            res.append((pos, end))
-            i = end
-        except Exception:
-            i = pos + 2
-    return res
-
 def _looks_like_gainmap(jpeg_bytes: bytes) -> bool:
     if b"http://ns.adobe.com/hdr-gain-map/1.0/" in jpeg_bytes or b"hdrgm:GainMap" in jpeg_bytes:
         return True
@@ -362,45 +252,28 @@ def _looks_like_gainmap(jpeg_bytes: bytes) -> bool:
             return True
     return False
 
-def split_ultrahdr(file_bytes: bytes) -> UltraHDRParts:
-    base_end = find_end_of_jpeg(file_bytes, 0)
-    primary = file_bytes[:base_end]
-    tail = file_bytes[base_end:]
+def split_ultrahdr(source) -> UltraHDRParts:
+    """source is the file bytes or a JpegContainer (e.g. bounded to the still part of a motion photo)."""
+    container = source if isinstance(source, JpegContainer) else JpegContainer(source)
+    base_end = container.primary_end
+    if base_end is None:
+        raise ValueError("EOI not found")
+    primary = container.read(0, base_end)
 
-    primary_xmp = None
-    pkts = iter_app1_xmp_packets(primary)
-    if pkts:
-        primary_xmp = pkts[0]
+    pkts = container.xmp_packets
+    primary_xmp = pkts[0] if pkts else None
 
     gainmap_bytes: Optional[bytes] = None
     gainmap_xmp: Optional[bytes] = None
 
     # Prefer GContainer semantic + length if present
-    items = None
-    if pkts:
-        for pkt in pkts:
-            items = parse_gcontainer_items_from_xmp(pkt)
-            if items:
-                break
-
-    if items:
-        # compute offsets: primary length is base_end (primary item ends at EOI)
-        cur = base_end
-        for it in items:
-            if it.get("semantic") == "Primary":
-                continue
-            ln = it.get("length")
-            pad = it.get("padding") or 0
-            if it.get("semantic") == "GainMap" and ln:
-                gainmap_bytes = file_bytes[cur:cur + ln]
-                break
-            if ln:
-                cur += ln + pad
+    item = next((it for it in container.items if it.semantic == "GainMap"), None)
+    if item is not None:
+        gainmap_bytes = container.read(item.offset, min(item.offset + item.length, container.end))
 
     # Fallback scan
-    if gainmap_bytes is None:
-        appended = _scan_appended_jpegs(file_bytes, base_end)
-        candidates = [file_bytes[o:e] for o, e in appended]
+    if not gainmap_bytes:
+        candidates = [container.read(o, e) for o, e in container.appended_jpegs]
         gm = next((c for c in candidates if _looks_like_gainmap(c)), None)
         gainmap_bytes = gm or (candidates[0] if candidates else None)
 
@@ -483,3 +356,39 @@ def expand_gainmap_for_borders(
         canvas.close()
         out.close()
     return result
+
+
+def append_gainmap_footer_lossless(
+    *,
+    orig_gainmap_jpeg: bytes,
+    orig_gainmap_xmp: bytes,
+    orig_primary_size: Tuple[int, int],
+    new_primary_size: Tuple[int, int],
+) -> bytes:
+    """
+    Bottom-only variant of expand_gainmap_for_borders(): append neutral MCU rows below the
+    gain map via jpegtran so the existing gain map coefficients are kept as-is.
+
+    Raises media.jpeg_lossless.LosslessAppendError when the gain map cannot be extended losslessly.
+    """
+    from media.jpeg_lossless import LosslessAppendError, append_strip_lossless
+
+    (bw, bh) = orig_primary_size
+    (nw, nh) = new_primary_size
+    if nw != bw:
+        raise LosslessAppendError("primary width changed; gain map needs side padding")
+
+    with Image.open(BytesIO(orig_gainmap_jpeg)) as gm_img:
+        gw, gh = gm_img.size
+
+    new_gh = max(1, int(round(gh * (nh / bh))))
+    if new_gh <= gh:
+        return orig_gainmap_jpeg
+
+    neutral = neutral_encoded_recovery_for_gain_1(parse_gainmap_params_from_xmp(orig_gainmap_xmp))
+    strip = Image.new("L", (gw, new_gh - gh), color=neutral)
+    try:
+        # jpegtran -copy all keeps the hdrgm XMP of the gain map
+        return append_strip_lossless(orig_gainmap_jpeg, strip)
+    finally:
+        strip.close()
@@ -2,12 +2,20 @@
 
 from __future__ import annotations
 
-import json
-import re
 import shutil
 import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
+
+from PIL import Image
+
+from constants import AppConstants
+from exif.exiftool_pool import copy_all_metadata
+from logging_utils import get_logger
+from media.video_probe import _normalize_rotation, probe_video
+
+logger = get_logger("autowatermark.video")
 
 __all__ = [
     "_copy_all_metadata_with_exiftool",
@@ -15,81 +23,144 @@ __all__ = [
     "_normalize_rotation",
     "_apply_watermark_to_video",
     "_get_video_rotation",
+    "VideoEncodingProfile",
+    "get_encoding_profile",
 ]
 
 
+@dataclass(frozen=True)
+class VideoEncodingProfile:
+    name: str
+    preset: str
+    crf: int
+    tune: Optional[str] = None
+    # 0 表示由 x264 自动决定线程数
+    threads: int = 0
+    # 输出画布长边上限（None 不限制）
+    max_dimension: Optional[int] = None
+    timeout_seconds: int = 120
+
+    def x264_args(self) -> list[str]:
+        args = ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+        return args
+
+
+def get_encoding_profile(name: Optional[str] = None) -> VideoEncodingProfile:
+    """按名称取 AppConstants.VIDEO_ENCODING_PROFILES 中的编码档位；未知名称回退到默认档位。"""
+    profiles = AppConstants.VIDEO_ENCODING_PROFILES
+    name = name or AppConstants.VIDEO_ENCODING_PROFILE
+    if name not in profiles:
+        logger.warning("Unknown video encoding profile %r, using %r", name, AppConstants.VIDEO_ENCODING_PROFILE)
+        name = AppConstants.VIDEO_ENCODING_PROFILE
+    return VideoEncodingProfile(name=name, **profiles[name])
+
+
 def _copy_all_metadata_with_exiftool(src_jpg: Path, dst_jpg: Path) -> None:
     """
     Preserve EXIF/MakerNote/etc. Some phone albums rely on vendor tags to recognize Motion Photos.
     If exiftool is unavailable, do nothing.
     """
-    if not shutil.which("exiftool"):
-        return
     try:
-        subprocess.run(
-            [
-                "exiftool",
-                "-overwrite_original",
-                "-TagsFromFile",
-                str(src_jpg),
-                "-all:all",
-                "-unsafe",
-                str(dst_jpg),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=30,
-        )
+        copy_all_metadata(str(src_jpg), str(dst_jpg), timeout=30)
     except Exception:
         # Do not fail the pipeline if metadata copy fails; motion photo may still work on some devices.
         return
 
 def _get_video_wh(video_path: Path) -> tuple[int, int]:
-    ffprobe_path = shutil.which("ffprobe")
-    if not ffprobe_path:
-        raise RuntimeError("ffprobe is required to read motion photo video dimensions but was not found in PATH")
-    try:
-        r = subprocess.run(
-            [
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "csv=p=0:s=x",
-                str(video_path),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=30,
-        )
-        s = r.stdout.strip()
-        match = re.search(r"(\d+)x(\d+)", s)
-        if match:
-            return int(match.group(1)), int(match.group(2))
-        raise RuntimeError(f"Unable to parse video dimensions from ffprobe output: {s or '<empty>'}")
-    except subprocess.CalledProcessError as exc:
-        detail = exc.stderr.strip() or exc.stdout.strip() or "unknown ffprobe error"
-        raise RuntimeError(f"ffprobe failed to read motion photo video dimensions: {detail}") from exc
-    except ValueError as exc:
-        raise RuntimeError(f"Unable to parse video dimensions from ffprobe output: {s or '<empty>'}") from exc
-
-def _normalize_rotation(value: int | float | str) -> int:
-    return int(round(float(value))) % 360
+    info = probe_video(video_path)
+    return info.width, info.height
 
 def _apply_watermark_to_video(
     video_path: Path,
-    overlay_path: Path,
+    overlay_strips: Sequence[tuple[Image.Image, tuple[int, int, int, int]]],
     output_path: Path,
     content_box: tuple[int, int, int, int],
     overlay_size: tuple[int, int],
+    profile: Optional[VideoEncodingProfile] = None,
 ) -> None:
+    """
+    overlay_strips: [(strip image, box on the still canvas)], opaque border strips around content_box.
+    overlay_size: size of the watermarked still canvas.
+    profile: x264 encoding profile; defaults to AppConstants.VIDEO_ENCODING_PROFILE.
+
+    条带在 Python 中一次缩放到视频输出画布上的最终尺寸，作为单帧输入交给 ffmpeg；
+    overlay 滤镜在单帧输入结束后重复使用最后一帧，逐帧不再解码和缩放叠加图。
+    """
+    profile = profile or get_encoding_profile()
     if not shutil.which("ffmpeg"):
         raise RuntimeError("ffmpeg is required to process motion photo video but was not found in PATH")
 
-    # Still/watermark canvas (same as watermarked JPG / overlay PNG)
+    # 一次探测得到编码尺寸（旋转前）与旋转角度（e.g. 270）
+    info = probe_video(video_path)
+
+    layout = _overlay_layout(
+        (info.width, info.height), info.rotation, [box for _, box in overlay_strips], content_box, overlay_size,
+        max_dimension=profile.max_dimension,
+    )
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-noautorotate",
+        "-i", str(video_path),
+    ]
+    strip_paths = []
+    for index, ((strip, _), (_x, _y, width, height)) in enumerate(zip(overlay_strips, layout.strip_rects)):
+        strip_path = Path(output_path).parent / f"{Path(output_path).stem}_strip{index}.png"
+        scaled = strip.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        try:
+            scaled.save(strip_path, format="PNG", compress_level=1)
+        finally:
+            scaled.close()
+        strip_paths.append(strip_path)
+        command += ["-i", str(strip_path)]
+    command += [
+        "-filter_complex", _overlay_filter(layout),
+        "-map", "[out]",
+        "-map", "0:a?",
+        *profile.x264_args(),
+        "-pix_fmt", "yuv420p",
+        "-c:a", "copy",
+        "-metadata:s:v:0", "rotate=0",   # baked rotation -> no metadata rotation
+        str(output_path),
+    ]
+
+    try:
+        subprocess.run(
+            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=profile.timeout_seconds,
+        )
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError(
+            f"Failed to overlay watermark onto motion video: {exc.stderr.decode(errors='ignore')}"
+        ) from exc
+    finally:
+        for strip_path in strip_paths:
+            strip_path.unlink(missing_ok=True)
+
+
+@dataclass(frozen=True)
+class _OverlayLayout:
+    """视频输出画布的几何：旋转滤镜、内容区尺寸、画布尺寸与内容区位置、各条带的 (x, y, w, h)。"""
+    rot_filter: str
+    display_size: tuple[int, int]
+    canvas_size: tuple[int, int]
+    content_offset: tuple[int, int]
+    strip_rects: tuple[tuple[int, int, int, int], ...]
+
+
+def _overlay_layout(
+    video_size: tuple[int, int],
+    rotation: Optional[int],
+    strip_boxes: Sequence[tuple[int, int, int, int]],
+    content_box: tuple[int, int, int, int],
+    overlay_size: tuple[int, int],
+    max_dimension: Optional[int] = None,
+) -> _OverlayLayout:
+    # Still/watermark canvas (same as watermarked JPG)
     canvas_w, canvas_h = overlay_size
     if canvas_w <= 0 or canvas_h <= 0:
         raise ValueError("Invalid overlay size")
@@ -100,10 +171,7 @@ def _apply_watermark_to_video(
     if content_w <= 0 or content_h <= 0:
         raise ValueError("Invalid content box")
 
-    # Video coded size (before rotation metadata)
-    vw, vh = _get_video_wh(video_path)
-
-    rotation = _get_video_rotation(video_path)  # e.g. 270
+    vw, vh = video_size
 
     # Bake rotation into pixels so output is upright and we don't depend on rotate/displaymatrix quirks.
     rot_filter = ""
@@ -122,6 +190,13 @@ def _apply_watermark_to_video(
     # content area in video stays ~disp_w x disp_h, but overall canvas grows by (canvas/content) ratio.
     out_canvas_w = int(round(disp_w * (canvas_w / content_w)))
     out_canvas_h = int(round(disp_h * (canvas_h / content_h)))
+    if max_dimension and max(out_canvas_w, out_canvas_h) > max_dimension:
+        # 限制输出画布长边：内容区与边框按同一比例缩小
+        shrink = max_dimension / max(out_canvas_w, out_canvas_h)
+        disp_w = max(2, int(round(disp_w * shrink)))
+        disp_h = max(2, int(round(disp_h * shrink)))
+        out_canvas_w = min(max_dimension, int(round(disp_w * (canvas_w / content_w))))
+        out_canvas_h = min(max_dimension, int(round(disp_h * (canvas_h / content_h))))
 
     # Positions scaled to the new output canvas
     scale_x = out_canvas_w / canvas_w
@@ -133,92 +208,59 @@ def _apply_watermark_to_video(
     def even(x: int) -> int:
         return x if x % 2 == 0 else x - 1 if x > 1 else x
 
-    out_canvas_w = even(out_canvas_w)
-    out_canvas_h = even(out_canvas_h)
-    out_left = even(out_left)
-    out_top = even(out_top)
+    strip_rects = []
+    for x0, y0, x1, y1 in strip_boxes:
+        sx0, sy0 = int(round(x0 * scale_x)), int(round(y0 * scale_y))
+        sw = max(1, int(round(x1 * scale_x)) - sx0)
+        sh = max(1, int(round(y1 * scale_y)) - sy0)
+        strip_rects.append((sx0, sy0, sw, sh))
+
+    return _OverlayLayout(
+        rot_filter=rot_filter,
+        # Also ensure content display dims are even
+        display_size=(even(disp_w), even(disp_h)),
+        canvas_size=(even(out_canvas_w), even(out_canvas_h)),
+        content_offset=(even(out_left), even(out_top)),
+        strip_rects=tuple(strip_rects),
+    )
 
-    # Also ensure content display dims are even
-    disp_w = even(disp_w)
-    disp_h = even(disp_h)
 
+def _overlay_filter(layout: _OverlayLayout) -> str:
     # Filter:
     # 1) noautorotate + bake rotation into pixels
     # 2) scale to display size (content area)
     # 3) pad to output canvas at the scaled left/top
-    # 4) scale overlay full-canvas PNG to output canvas and overlay
-    filter_complex = (
-        f"[0:v]setsar=1{rot_filter},"
+    # 4) overlay each pre-scaled opaque border strip (a single frame, repeated by overlay) at its position
+    disp_w, disp_h = layout.display_size
+    out_canvas_w, out_canvas_h = layout.canvas_size
+    out_left, out_top = layout.content_offset
+    parts = [
+        f"[0:v]setsar=1{layout.rot_filter},"
         f"scale={disp_w}:{disp_h},"
         f"crop=trunc(iw/2)*2:trunc(ih/2)*2"
-        f"[vid];"
-        f"[vid]pad={out_canvas_w}:{out_canvas_h}:{out_left}:{out_top}:black[base];"
-        f"[1:v]format=rgba,scale={out_canvas_w}:{out_canvas_h}[wm];"
-        f"[base][wm]overlay=0:0:shortest=1[out]"
-    )
-
-    command = [
-        "ffmpeg",
-        "-y",
-        "-noautorotate",
-        "-i", str(video_path),
-        "-loop", "1",
-        "-i", str(overlay_path),
-        "-filter_complex", filter_complex,
-        "-map", "[out]",
-        "-map", "0:a?",
-        "-c:v", "libx264",
-        "-preset", "medium",
-        "-crf", "23",
-        "-pix_fmt", "yuv420p",
-        "-c:a", "copy",
-        "-metadata:s:v:0", "rotate=0",   # baked rotation -> no metadata rotation
-        str(output_path),
+        f"[vid]",
+        f"[vid]pad={out_canvas_w}:{out_canvas_h}:{out_left}:{out_top}:black[base0]",
     ]
+    for index, (sx0, sy0, _sw, _sh) in enumerate(layout.strip_rects):
+        parts.append(f"[base{index}][{index + 1}:v]overlay={sx0}:{sy0}:eof_action=repeat[base{index + 1}]")
+    parts.append(f"[base{len(layout.strip_rects)}]null[out]")
+    return ";".join(parts)
 
-    try:
-        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
-    except subprocess.CalledProcessError as exc:
-        raise RuntimeError(
-            f"Failed to overlay watermark onto motion video: {exc.stderr.decode(errors='ignore')}"
-        ) from exc
 
-def _get_video_rotation(video_path: Path) -> Optional[int]:
-    ffprobe_path = shutil.which("ffprobe")
-    if not ffprobe_path:
-        return None
+def _build_overlay_filter(
+    video_size: tuple[int, int],
+    rotation: Optional[int],
+    strip_boxes: Sequence[tuple[int, int, int, int]],
+    content_box: tuple[int, int, int, int],
+    overlay_size: tuple[int, int],
+    max_dimension: Optional[int] = None,
+) -> str:
+    return _overlay_filter(
+        _overlay_layout(video_size, rotation, strip_boxes, content_box, overlay_size, max_dimension)
+    )
 
+def _get_video_rotation(video_path: Path) -> Optional[int]:
     try:
-        result = subprocess.run(
-            [
-                ffprobe_path,
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_streams",
-                "-of",
-                "json",
-                str(video_path),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=30,
-        )
-        payload = json.loads(result.stdout)
-        stream = (payload.get("streams") or [{}])[0]
-
-        for side_data in stream.get("side_data_list") or []:
-            rotation = side_data.get("rotation")
-            if rotation is not None:
-                return _normalize_rotation(rotation)
-
-        rotate_tag = (stream.get("tags") or {}).get("rotate")
-        if rotate_tag:
-            # Legacy rotate tag uses the opposite sign convention from side_data rotation.
-            return (-_normalize_rotation(rotate_tag)) % 360
+        return probe_video(video_path).rotation or None
     except Exception:
         return None
-    return None
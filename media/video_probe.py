@@ -0,0 +1,350 @@
+"""motion photo 视频的流信息：优先在进程内解析 MP4 的 moov 盒子，解析不了时调用一次 ffprobe（JSON）。
+
+结果按视频内容摘要缓存，同一视频换样式重新渲染时不再重复探测。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from constants import CommonConstants
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.video_probe")
+
+__all__ = [
+    "VideoInfo",
+    "probe_video",
+    "parse_mp4_info",
+    "video_info_cache_stats",
+    "clear_video_info_cache",
+]
+
+# 摘要只读取文件头尾各 1MB（加上文件大小），避免为了查缓存把整个视频读一遍
+_DIGEST_SAMPLE_BYTES = 1024 * 1024
+# moov 超过这个大小时不在进程内解析，交给 ffprobe
+_MAX_MOOV_BYTES = 16 * 1024 * 1024
+_CONTAINER_BOXES = {b"trak", b"mdia", b"minf", b"stbl"}
+# stsd 中的 fourcc -> ffprobe 的 codec_name
+_CODEC_NAMES = {
+    b"avc1": "h264",
+    b"avc3": "h264",
+    b"hvc1": "hevc",
+    b"hev1": "hevc",
+    b"av01": "av1",
+    b"vp09": "vp9",
+    b"mp4v": "mpeg4",
+}
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    # 编码尺寸（旋转前）
+    width: int
+    height: int
+    # 显示时需要逆时针旋转的角度（与 ffprobe 的 displaymatrix rotation 一致），0 表示无旋转
+    rotation: int = 0
+    codec: Optional[str] = None
+    duration: Optional[float] = None
+    frame_rate: Optional[float] = None
+    has_audio: bool = False
+    # "mp4"（进程内解析）或 "ffprobe"
+    source: str = "ffprobe"
+
+
+def _normalize_rotation(value) -> int:
+    return int(round(float(value))) % 360
+
+
+# ---- MP4 盒子解析 ----
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历 data[start:end] 中的盒子，产出 (类型, 负载起点, 盒子终点)；结构损坏时抛 ValueError。"""
+    pos = start
+    end = len(data) if end is None else end
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise ValueError("truncated large box header")
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"invalid {kind!r} box size")
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find_moov(fp: BinaryIO) -> Optional[bytes]:
+    """按顶层盒子头跳读，找到 moov 并只读取它（mdat 不读）；分片 MP4 返回 None。"""
+    fp.seek(0, os.SEEK_END)
+    file_size = fp.tell()
+    pos = 0
+    while pos + 8 <= file_size:
+        fp.seek(pos)
+        header = fp.read(16)
+        size, kind = struct.unpack_from(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+            header_len = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header_len or pos + size > file_size:
+            return None
+        if kind == b"moof":
+            return None
+        if kind == b"moov":
+            if size > _MAX_MOOV_BYTES:
+                return None
+            fp.seek(pos + header_len)
+            return fp.read(size - header_len)
+        pos += size
+    return None
+
+
+def _matrix_rotation(a: int, b: int, c: int, d: int) -> int:
+    """与 ffmpeg av_display_rotation_get 相同的换算（矩阵元素为 16.16 定点数）。"""
+    scale_x = math.hypot(a, c)
+    scale_y = math.hypot(b, d)
+    if not scale_x or not scale_y:
+        return 0
+    rotation = math.degrees(math.atan2(b / scale_y, a / scale_x))
+    return _normalize_rotation(-rotation)
+
+
+def _parse_trak(data: bytes, start: int, end: int, track: Optional[dict] = None) -> dict:
+    track = {} if track is None else track
+    for kind, box_start, box_end in _iter_boxes(data, start, end):
+        if kind == b"tkhd":
+            version = data[box_start]
+            matrix_at = box_start + (52 if version == 1 else 40)
+            a, b, _u, c, d = struct.unpack_from(">5i", data, matrix_at)
+            track["rotation"] = _matrix_rotation(a, b, c, d)
+        elif kind in _CONTAINER_BOXES:
+            _parse_trak(data, box_start, box_end, track)
+        elif kind == b"mdhd":
+            version = data[box_start]
+            if version == 1:
+                track["timescale"], track["duration"] = struct.unpack_from(">IQ", data, box_start + 20)
+            else:
+                track["timescale"], track["duration"] = struct.unpack_from(">II", data, box_start + 12)
+        elif kind == b"hdlr":
+            # QuickTime 的 minf 里还有数据引用用的 hdlr（alis），以 mdia 中先出现的为准
+            track.setdefault("handler", data[box_start + 8:box_start + 12])
+        elif kind == b"stsd":
+            entry = box_start + 8
+            if entry + 36 <= box_end:
+                track["fourcc"] = data[entry + 4:entry + 8]
+                track["coded_size"] = struct.unpack_from(">HH", data, entry + 32)
+        elif kind == b"stts":
+            (count,) = struct.unpack_from(">I", data, box_start + 4)
+            track["samples"] = sum(
+                struct.unpack_from(">I", data, box_start + 8 + index * 8)[0] for index in range(count)
+            )
+    return track
+
+
+def parse_mp4_info(video_path) -> Optional[VideoInfo]:
+    """只解析 moov 中的 tkhd / mdhd / hdlr / stsd / stts；不是普通（非分片）MP4 时返回 None。"""
+    try:
+        with open(video_path, "rb") as fp:
+            moov = _find_moov(fp)
+        if moov is None:
+            return None
+        tracks = [
+            _parse_trak(moov, start, end)
+            for kind, start, end in _iter_boxes(moov)
+            if kind == b"trak"
+        ]
+    except (OSError, ValueError, struct.error):
+        logger.debug("MP4 box parsing failed for %s", video_path, exc_info=True)
+        return None
+
+    video = next((track for track in tracks if track.get("handler") == b"vide"), None)
+    if video is None or not video.get("coded_size") or not all(video["coded_size"]):
+        return None
+    width, height = video["coded_size"]
+    duration = None
+    frame_rate = None
+    if video.get("timescale") and video.get("duration"):
+        duration = video["duration"] / video["timescale"]
+        if video.get("samples"):
+            frame_rate = video["samples"] / duration
+    fourcc = video.get("fourcc", b"")
+    return VideoInfo(
+        width=width,
+        height=height,
+        rotation=video.get("rotation", 0),
+        codec=_CODEC_NAMES.get(fourcc, fourcc.decode("latin-1").strip() or None),
+        duration=duration,
+        frame_rate=frame_rate,
+        has_audio=any(track.get("handler") == b"soun" for track in tracks),
+        source="mp4",
+    )
+
+
+# ---- ffprobe ----
+
+def _parse_rate(value: Optional[str]) -> Optional[float]:
+    if not value or value in ("0/0", "0"):
+        return None
+    numerator, _, denominator = value.partition("/")
+    try:
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate or None
+
+
+def _video_info_from_ffprobe(payload: dict) -> VideoInfo:
+    streams = payload.get("streams") or []
+    video = next((stream for stream in streams if stream.get("codec_type", "video") == "video"), None)
+    if video is None or not video.get("width") or not video.get("height"):
+        raise RuntimeError("ffprobe did not report a video stream")
+
+    rotation = 0
+    for side_data in video.get("side_data_list") or []:
+        if side_data.get("rotation") is not None:
+            rotation = _normalize_rotation(side_data["rotation"])
+            break
+    else:
+        rotate_tag = (video.get("tags") or {}).get("rotate")
+        if rotate_tag:
+            # Legacy rotate tag uses the opposite sign convention from side_data rotation.
+            rotation = (-_normalize_rotation(rotate_tag)) % 360
+
+    duration = video.get("duration") or (payload.get("format") or {}).get("duration")
+    return VideoInfo(
+        width=int(video["width"]),
+        height=int(video["height"]),
+        rotation=rotation,
+        codec=video.get("codec_name"),
+        duration=float(duration) if duration else None,
+        frame_rate=_parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")),
+        has_audio=any(stream.get("codec_type") == "audio" for stream in streams),
+        source="ffprobe",
+    )
+
+
+def _ffprobe_video_info(video_path) -> VideoInfo:
+    ffprobe_path = shutil.which("ffprobe")
+    if not ffprobe_path:
+        raise RuntimeError("ffprobe is required to read motion photo video info but was not found in PATH")
+    try:
+        result = subprocess.run(
+            [
+                ffprobe_path,
+                "-v", "error",
+                "-show_streams",
+                "-show_format",
+                "-of", "json",
+                str(video_path),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=CommonConstants.FFPROBE_TIMEOUT_SECONDS,
+        )
+    except subprocess.CalledProcessError as exc:
+        detail = exc.stderr.strip() or exc.stdout.strip() or "unknown ffprobe error"
+        raise RuntimeError(f"ffprobe failed to read motion photo video info: {detail}") from exc
+    try:
+        payload = json.loads(result.stdout)
+    except ValueError as exc:
+        raise RuntimeError(f"Unable to parse ffprobe output: {result.stdout.strip() or '<empty>'}") from exc
+    return _video_info_from_ffprobe(payload)
+
+
+# ---- 缓存 ----
+
+def _video_digest(video_path) -> str:
+    size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_path, "rb") as fp:
+        digest.update(fp.read(_DIGEST_SAMPLE_BYTES))
+        if size > 2 * _DIGEST_SAMPLE_BYTES:
+            fp.seek(-_DIGEST_SAMPLE_BYTES, os.SEEK_END)
+        digest.update(fp.read(_DIGEST_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+class _VideoInfoCache:
+    """视频摘要 -> VideoInfo 的 LRU。"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, VideoInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[VideoInfo]:
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return info
+
+    def put(self, key: str, info: VideoInfo) -> None:
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_video_info_cache = _VideoInfoCache(CommonConstants.VIDEO_INFO_CACHE_MAX_ENTRIES)
+
+
+def probe_video(video_path: Path) -> VideoInfo:
+    """返回视频的尺寸、旋转、编码、时长、帧率与是否有音轨；读取失败时抛 RuntimeError。"""
+    try:
+        key = _video_digest(video_path)
+    except OSError as exc:
+        raise RuntimeError(f"Cannot read motion photo video {video_path}: {exc}") from exc
+    cached = _video_info_cache.get(key)
+    if cached is not None:
+        return cached
+    info = parse_mp4_info(video_path) or _ffprobe_video_info(video_path)
+    logger.info(
+        "Video info (%s): %sx%s, rotation %s, codec %s, %.2f fps, audio %s",
+        info.source, info.width, info.height, info.rotation, info.codec, info.frame_rate or 0.0, info.has_audio,
+    )
+    _video_info_cache.put(key, info)
+    return info
+
+
+def video_info_cache_stats() -> dict:
+    return _video_info_cache.stats()
+
+
+def clear_video_info_cache() -> None:
+    _video_info_cache.clear()
@@ -0,0 +1,40 @@
+"""上传阶段一次性探测结果，随任务持久化并传入 process_image()。"""
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+
+
+@dataclass
+class ProbeResult:
+    """文件头级别的探测结果：尺寸、方向、EXIF 摘要、厂商以及 Motion/HDR 特征。"""
+    file_size: int = 0
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: int = 1
+    is_motion: bool = False
+    is_hdr: bool = False
+    video_offset: Optional[int] = None
+    gainmap_offset: Optional[int] = None
+    exif_readable: bool = False
+    using_fallback_metadata: bool = False
+    manufacturer: Optional[str] = None
+    camera_model: Optional[str] = None
+    camera_info: Optional[str] = None
+    shooting_info: Optional[str] = None
+
+    @property
+    def features(self) -> dict:
+        return {"is_hdr": self.is_hdr, "is_motion": self.is_motion}
+
+    @property
+    def has_metadata(self) -> bool:
+        return bool(self.manufacturer and self.camera_info and self.shooting_info)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["ProbeResult"]:
+        if not data:
+            return None
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
@@ -1,7 +1,8 @@
 import os
+import tempfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Optional, Callable, Sequence
 
 import sys
 import piexif
@@ -10,27 +11,41 @@ from io import BytesIO
 
 
 from exif import find_logo, get_manufacturer, get_exif_data, get_exif_data_with_exiftool, get_camera_model
-from imaging import reset_image_orientation, generate_watermark_image
+from imaging import generate_watermark_image
+from imaging.composition import CompositionPlan, oriented_size, reduced_size
+from imaging.image_ops import orientation_transpose
+from imaging.watermark import generate_footer_strip, plan_watermark_canvas, supports_footer_strip
 from constants import CommonConstants, ImageConstants
 from errors import WatermarkError, WatermarkErrorCode
 
 from media.ultrahdr import (
+    ULTRAHDR_MARKERS,
+    ULTRAHDR_PROBE_BYTES,
     UltraHDRParts,
     split_ultrahdr,
     inject_xmp,
     update_primary_xmp_lengths,
     build_primary_xmp_for_gainmap,
     expand_gainmap_for_borders,
+    append_gainmap_footer_lossless,
+    _strip_xmp,
 )
+from media.jpeg_lossless import LosslessAppendError, append_strip_lossless, can_append_losslessly, find_jpegtran
+from media.media_probe import probe_media_features
 from media.motion_photo import prepare_motion_photo
+from media.video import get_encoding_profile
+from probe_result import ProbeResult
+from process_io import OutputSink, Source, make_sink, read_source
 from process_result import ProcessResult
 from logging_utils import get_logger
 from services.i18n import get_error_message
+from services.memory_budget import get_memory_budget
 from services.watermark_styles import get_style, load_cached_watermark_styles
 
 
 logger = get_logger("autowatermark.process")
 
+
 def _enforce_image_pixel_limit(image: Image.Image) -> None:
     max_pixels = ImageConstants.MAX_IMAGE_PIXELS
     image_size = image.width * image.height
@@ -48,8 +63,8 @@ def _report_progress(progress_callback: Optional[Callable], progress: float, sta
 class _ProcessingState:
     """process_image() 的中间处理状态。"""
     image_path: str
-    output_path: str
-    working_image_path: str
+    # 实际读取的文件；内存输入（bytes / 文件对象）为 None，内容在 source_bytes 中
+    working_image_path: Optional[str]
     style_config: dict
     style: dict
     watermark_type: int
@@ -69,42 +84,131 @@ class _ProcessingState:
     shooting_info: Optional[str] = None
     new_image: Optional[Image.Image] = None
     watermark_metadata: Optional[dict] = None
+    probe: Optional[ProbeResult] = None
+    max_dimension: Optional[int] = None
+    plan: Optional[CompositionPlan] = None
+    # motion photo 视频编码档位名（None 使用配置的默认档位）
+    video_profile: Optional[str] = None
+    # 源图编码格式（解码前记录），内存输出端据此选择编码器
+    source_format: Optional[str] = None
+    sink: Optional[OutputSink] = None
+    source_bytes: Optional[bytes] = None
+    # 内存输入需要落盘时（exiftool 回退）使用的临时目录
+    spill_dir: Optional[tempfile.TemporaryDirectory] = None
+
+
+def _has_ultrahdr_markers(source) -> bool:
+    """source 为路径或已在内存中的字节。"""
+    if isinstance(source, bytes):
+        header = source[:ULTRAHDR_PROBE_BYTES]
+    else:
+        with open(source, "rb") as f:
+            header = f.read(ULTRAHDR_PROBE_BYTES)
+    return any(m in header for m in ULTRAHDR_MARKERS)
+
+
+def _working_source(state: _ProcessingState):
+    """当前输入：文件路径，或内存输入的字节。"""
+    return state.source_bytes if state.working_image_path is None else state.working_image_path
+
+
+def _working_bytes(state: _ProcessingState) -> bytes:
+    if state.working_image_path is None:
+        return state.source_bytes
+    return Path(state.working_image_path).read_bytes()
+
+
+def _metadata_path(state: _ProcessingState) -> str:
+    """传给 exif 辅助函数的路径：它们只在 EXIF 缺失或镜头未知时才读文件，内存输入仅在这时落盘。"""
+    if state.working_image_path is not None:
+        return state.working_image_path
+    exif_data = (state.exif_dict or {}).get("Exif", {})
+    if state.exif_dict is None or not exif_data.get(piexif.ExifIFD.LensModel):
+        return _working_file(state)
+    return state.image_path
+
 
+def _working_file(state: _ProcessingState) -> str:
+    """需要真实文件的外部工具（exiftool）使用的路径；内存输入按需写到临时文件。"""
+    if state.working_image_path is not None:
+        return state.working_image_path
+    if state.spill_dir is None:
+        state.spill_dir = tempfile.TemporaryDirectory()
+        Path(state.spill_dir.name, "source").write_bytes(state.source_bytes)
+    return str(Path(state.spill_dir.name, "source"))
 
-def detect_image_features(image_path: str) -> dict:
-    """快速检测图片是否为 HDR 或 Motion Photo（仅读取文件头，不加载图像）。"""
-    result = {"is_hdr": False, "is_motion": False}
 
-    # 检测 Motion Photo
+def probe_image(image_path: str) -> ProbeResult:
+    """上传时一次性探测：只解析文件头与 EXIF，不解码像素、不写临时文件。"""
+    probe = ProbeResult()
     try:
-        motion_session = prepare_motion_photo(image_path)
-        if motion_session:
-            result["is_motion"] = bool(motion_session.has_motion)
-            motion_session.cleanup()
+        probe.file_size = os.path.getsize(image_path)
+    except OSError:
+        return probe
+
+    try:
+        features = probe_media_features(image_path)
+        probe.is_motion = features.is_motion
+        probe.is_hdr = features.is_hdr
+        probe.video_offset = features.video_offset
+        probe.gainmap_offset = features.gainmap_offset
     except Exception:
-        pass
+        logger.debug("Motion photo / Ultra HDR probe failed for %s", image_path, exc_info=True)
 
-    # 检测 Ultra HDR（读取前 64KB 检查标记）
-    UHDR_MARKERS = (
-        b"hdrgm:Version",
-        b"urn:apple:photo:2024:aux:hdrgainmap",
-        b'Item:Semantic="GainMap"',
-        b"http://ns.adobe.com/hdr-gain-map/1.0/",
-    )
     try:
-        with open(image_path, "rb") as f:
-            header = f.read(65536)
-        if any(m in header for m in UHDR_MARKERS):
-            result["is_hdr"] = True
+        image = Image.open(image_path)
     except Exception:
+        logger.debug("Cannot open %s for probing", image_path, exc_info=True)
+        return probe
+
+    state = _ProcessingState(
+        image_path=image_path,
+        working_image_path=image_path,
+        style_config={},
+        style={},
+        watermark_type=0,
+        image_quality=0,
+        logo_preference="",
+        image=image,
+    )
+    try:
+        probe.width, probe.height = image.size
+        _extract_metadata(state)
+    except WatermarkError:
+        # 元数据不完整时保留已解析部分，由处理阶段给出正式错误
         pass
+    except Exception:
+        logger.debug("Metadata probe failed for %s", image_path, exc_info=True)
+    finally:
+        image.close()
+
+    if state.exif_dict:
+        probe.orientation = int(state.exif_dict.get("0th", {}).get(piexif.ImageIFD.Orientation, 1) or 1)
+    probe.exif_readable = state.exif_dict is not None
+    probe.using_fallback_metadata = state.using_fallback_metadata
+    probe.manufacturer = state.manufacturer
+    probe.camera_model = state.camera_model
+    probe.camera_info = state.camera_info
+    probe.shooting_info = state.shooting_info
+    return probe
+
 
-    return result
+def detect_image_features(source) -> dict:
+    """快速检测图片是否为 HDR 或 Motion Photo；source 可以是路径或已有的 ProbeResult。"""
+    probe = source if isinstance(source, ProbeResult) else probe_image(source)
+    return probe.features
 
 
 def _detect_format(state: _ProcessingState) -> None:
     """检测 motion photo 和 Ultra HDR 格式，更新 working_image_path。"""
-    state.motion_session = prepare_motion_photo(state.image_path)
+    if state.probe is not None and not state.probe.is_motion:
+        # 上传阶段已确认不是 motion photo，跳过整文件读取
+        state.motion_session = None
+        if not state.probe.is_hdr:
+            state.ultrahdr_parts = None
+            return
+    else:
+        state.motion_session = prepare_motion_photo(_working_source(state))
     if state.motion_session and state.motion_session.has_motion:
         state.working_image_path = str(state.motion_session.still_path)
         if state.motion_session.ultrahdr_gainmap_jpeg:
@@ -122,21 +226,13 @@ def _detect_format(state: _ProcessingState) -> None:
 
     try:
         # 先读前 64KB 检查 Ultra HDR 专有特征，避免对大文件做全量读取
-        UHDR_MARKERS = (
-            b"hdrgm:Version",
-            b"urn:apple:photo:2024:aux:hdrgainmap",
-            b'Item:Semantic="GainMap"',
-            b"http://ns.adobe.com/hdr-gain-map/1.0/",
-        )
-        with open(state.working_image_path, "rb") as f:
-            header = f.read(65536)
-        if not any(m in header for m in UHDR_MARKERS):
+        if not _has_ultrahdr_markers(_working_source(state)):
             state.ultrahdr_parts = None
             return
-        data_bytes = Path(state.working_image_path).read_bytes()
+        data_bytes = _working_bytes(state)
         state.ultrahdr_parts = split_ultrahdr(data_bytes)
     except Exception:
-        logger.debug("Ultra HDR detection failed for %s, treating as SDR", state.working_image_path, exc_info=True)
+        logger.debug("Ultra HDR detection failed for %s, treating as SDR", state.image_path, exc_info=True)
         state.ultrahdr_parts = None
 
     if state.ultrahdr_parts is not None and (
@@ -149,27 +245,94 @@ def _detect_format(state: _ProcessingState) -> None:
         else:
             logger.warning(
                 "Incomplete Ultra HDR metadata for %s; fallback to SDR output.",
-                state.working_image_path,
+                state.image_path,
             )
             state.ultrahdr_parts = None
 
 
-def _load_image(state: _ProcessingState) -> None:
-    """从文件或 Ultra HDR 主图打开图像，重置方向，检查像素上限。"""
+def _open_image(state: _ProcessingState) -> None:
+    """打开文件或 Ultra HDR 主图并检查像素上限；只解析文件头，像素留到 _decode_image 再解码。"""
     Image.MAX_IMAGE_PIXELS = ImageConstants.MAX_IMAGE_PIXELS
     try:
         if state.ultrahdr_parts is not None:
             state.image = Image.open(BytesIO(state.ultrahdr_parts.primary_jpeg))
+        elif state.working_image_path is None:
+            state.image = Image.open(BytesIO(state.source_bytes))
         else:
             state.image = Image.open(state.working_image_path)
     except Image.DecompressionBombError as e:
         raise WatermarkError(WatermarkErrorCode.IMAGE_TOO_LARGE, detail=str(e)) from e
-    state.image = reset_image_orientation(state.image)
+    # 解码与方向转置产生的新图像不再带 format
+    state.source_format = state.image.format
     _enforce_image_pixel_limit(state.image)
 
 
+def _plan_composition(state: _ProcessingState, retain_source: bool = False) -> CompositionPlan:
+    """根据文件头信息规划解码尺寸、方向转置与成品画布，估算本任务的像素缓冲峰值。"""
+    image = state.image
+    transpose = orientation_transpose(image)
+    decode_size = image.size
+    if state.max_dimension and max(image.size) > state.max_dimension:
+        # draft 按 1/2^n 缩放解码，最多比目标尺寸大一倍
+        target = reduced_size(image.size, state.max_dimension)
+        decode_size = (min(image.width, target[0] * 2), min(image.height, target[1] * 2))
+    render_size = oriented_size(reduced_size(image.size, state.max_dimension), transpose)
+    canvas_size, scratch_bytes = plan_watermark_canvas(
+        render_size,
+        state.logo_path,
+        state.camera_info.split('\n'),
+        state.shooting_info.split('\n'),
+        CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+        CommonConstants.GLOBAL_FONT_PATH_BOLD,
+        state.watermark_type,
+        font_path_regular=CommonConstants.GLOBAL_FONT_PATH_MONO,
+        font_path_symbol=CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+        style_config=state.style_config,
+        style=state.style,
+    )
+    return CompositionPlan(
+        decode_size=decode_size,
+        bands=len(image.getbands()),
+        canvas_size=canvas_size,
+        transpose=transpose,
+        needs_overlay=(state.motion_session is not None) or (state.ultrahdr_parts is not None),
+        scratch_bytes=scratch_bytes,
+        content_size=render_size,
+        retain_source=retain_source,
+    )
+
+
+def _decode_image(state: _ProcessingState) -> None:
+    """解码像素（按需 DCT 缩小），方向校正用一次转置完成，并立即释放转置前的缓冲。"""
+    if state.max_dimension and max(state.image.size) > state.max_dimension:
+        _reduce_on_decode(state.image, state.max_dimension)
+    transpose = state.plan.transpose if state.plan is not None else orientation_transpose(state.image)
+    if transpose is not None:
+        source = state.image
+        state.image = source.transpose(transpose)
+        source.close()
+
+
+def _reduce_on_decode(image: Image.Image, max_dimension: int) -> None:
+    """把长边缩小到 max_dimension 以内。
+
+    JPEG 先用 draft() 让 libjpeg 在 DCT 阶段按 1/2、1/4、1/8 缩放解码，
+    再用 reducing_gap 做剩余的高质量缩小；其他格式退化为完整解码后缩小。
+    """
+    original_size = image.size
+    scale = max_dimension / max(original_size)
+    # thumbnail() 传给 draft() 的是 reducing_gap 倍的方框，缩放倍数受短边限制；这里按保持宽高比的目标尺寸请求
+    image.draft(image.mode, (max(1, int(original_size[0] * scale * 2)), max(1, int(original_size[1] * scale * 2))))
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=2.0)
+    logger.info("Reduced decode %sx%s -> %sx%s", *original_size, *image.size)
+
+
 def _extract_metadata(state: _ProcessingState) -> None:
     """提取 EXIF 数据、制造商、相机型号、拍摄信息。"""
+    if state.probe is not None and state.probe.has_metadata:
+        _apply_probe_metadata(state)
+        return
+
     state.exif_bytes = state.image.info.get('exif')
     state.exif_dict = None
     state.fallback_metadata = None
@@ -177,13 +340,13 @@ def _extract_metadata(state: _ProcessingState) -> None:
         try:
             state.exif_dict = piexif.load(state.exif_bytes)
         except Exception:
-            logger.debug("piexif.load failed for %s, falling back to exiftool", state.working_image_path, exc_info=True)
+            logger.debug("piexif.load failed for %s, falling back to exiftool", state.image_path, exc_info=True)
             state.exif_bytes = b''
     else:
         state.exif_bytes = b''
 
     if state.exif_dict is None:
-        state.fallback_metadata = get_exif_data_with_exiftool(state.working_image_path)
+        state.fallback_metadata = get_exif_data_with_exiftool(_working_file(state))
         if not state.fallback_metadata:
             raise WatermarkError(WatermarkErrorCode.MISSING_EXIF_DATA)
 
@@ -191,9 +354,9 @@ def _extract_metadata(state: _ProcessingState) -> None:
     if state.manufacturer:
         logger.debug("Using preliminary manufacturer: %s", state.manufacturer)
     else:
-        state.manufacturer = get_manufacturer(state.working_image_path, state.exif_dict)
+        state.manufacturer = get_manufacturer(_metadata_path(state), state.exif_dict)
     if not state.manufacturer:
-        state.fallback_metadata = state.fallback_metadata or get_exif_data_with_exiftool(state.working_image_path)
+        state.fallback_metadata = state.fallback_metadata or get_exif_data_with_exiftool(_working_file(state))
         state.manufacturer = state.fallback_metadata.get("manufacturer") if state.fallback_metadata else None
         if not state.manufacturer:
             raise WatermarkError(WatermarkErrorCode.MISSING_EXIF_DATA)
@@ -203,7 +366,7 @@ def _extract_metadata(state: _ProcessingState) -> None:
     if not state.camera_model and state.fallback_metadata:
         state.camera_model = state.fallback_metadata.get("camera_model")
 
-    result = None if state.using_fallback_metadata else get_exif_data(state.working_image_path, state.exif_dict)
+    result = None if state.using_fallback_metadata else get_exif_data(_metadata_path(state), state.exif_dict)
     if (result is None or result == (None, None)) and state.fallback_metadata:
         result = (
             state.fallback_metadata.get("camera_info"),
@@ -215,6 +378,20 @@ def _extract_metadata(state: _ProcessingState) -> None:
     state.camera_info, state.shooting_info = result
 
 
+def _apply_probe_metadata(state: _ProcessingState) -> None:
+    """复用上传阶段的探测结果，跳过 piexif / exiftool 的重复解析。"""
+    probe = state.probe
+    state.exif_bytes = (state.image.info.get('exif') or b'') if probe.exif_readable else b''
+    state.using_fallback_metadata = probe.using_fallback_metadata
+    if state.manufacturer:
+        logger.debug("Using preliminary manufacturer: %s", state.manufacturer)
+    else:
+        state.manufacturer = probe.manufacturer
+    state.camera_model = probe.camera_model
+    state.camera_info = probe.camera_info
+    state.shooting_info = probe.shooting_info
+
+
 def _resolve_logo(state: _ProcessingState) -> None:
     """根据制造商和样式配置查找品牌 logo。"""
     if state.manufacturer and "xiaomi" in state.manufacturer.lower():
@@ -229,8 +406,22 @@ def _resolve_logo(state: _ProcessingState) -> None:
         raise WatermarkError(WatermarkErrorCode.UNSUPPORTED_MANUFACTURER, detail=detail)
 
 
-def _render_watermark(state: _ProcessingState) -> None:
-    """生成水印图像，写入 state.new_image 和 state.watermark_metadata。"""
+def _luminance_key(state: _ProcessingState):
+    """亮度统计的源图标识：同一上传文件换样式重新渲染时复用统计结果（内存输入不缓存）。"""
+    if state.source_bytes is not None:
+        return None
+    try:
+        stat = os.stat(state.image_path)
+    except OSError:
+        return None
+    return os.path.abspath(state.image_path), stat.st_mtime_ns, stat.st_size
+
+
+def _render_watermark(state: _ProcessingState, release_origin: bool = True) -> None:
+    """生成水印图像，写入 state.new_image 和 state.watermark_metadata。
+
+    release_origin=False 时保留 state.image，供同一原图继续渲染其他样式。
+    """
     camera_info_lines = state.camera_info.split('\n')
     shooting_info_lines = state.shooting_info.split('\n')
     logger.info(
@@ -253,6 +444,9 @@ def _render_watermark(state: _ProcessingState) -> None:
         return_metadata=needs_metadata,
         style_config=state.style_config,
         style=state.style,
+        # state.image 归本流程所有，粘贴进画布后即可释放
+        release_origin=release_origin,
+        luminance_key=_luminance_key(state),
     )
     logger.info("Finished generating watermark for %s", state.image_path)
 
@@ -296,7 +490,10 @@ def _save_output(state: _ProcessingState, preview: bool, advance_progress: Calla
             state.motion_session.ultrahdr_primary_size = None
         temp_output = Path(state.motion_session.still_path.parent) / "watermarked_motion_frame.jpg"
         state.new_image.save(temp_output, exif=state.exif_bytes, quality=state.image_quality)
-        state.motion_session.finalize(temp_output, Path(state.output_path), state.watermark_metadata)
+        state.motion_session.finalize(
+            temp_output, state.sink, state.watermark_metadata,
+            encoding_profile=get_encoding_profile(state.video_profile),
+        )
     else:
         if should_preserve_hdr:
             output_is_hdr = True
@@ -323,18 +520,7 @@ def _save_output(state: _ProcessingState, preview: bool, advance_progress: Calla
                 )
 
             # 3) 更新主图 XMP 长度并注入
-            if state.ultrahdr_parts.primary_xmp is None:
-                raise WatermarkError(WatermarkErrorCode.UNEXPECTED_ERROR, detail="Primary XMP missing; cannot rebuild Ultra HDR container.")
-
-            tmp_primary = inject_xmp(new_primary_jpeg, state.ultrahdr_parts.primary_xmp)
-            updated_xmp = update_primary_xmp_lengths(
-                state.ultrahdr_parts.primary_xmp,
-                primary_len=len(tmp_primary),
-                gainmap_len=len(gainmap_jpeg),
-            )
-            final_primary = inject_xmp(new_primary_jpeg, updated_xmp)
-
-            Path(state.output_path).write_bytes(final_primary + gainmap_jpeg)
+            _write_ultrahdr_output(state, new_primary_jpeg, gainmap_jpeg)
             advance_progress("saved")
             return ProcessResult(is_hdr=output_is_hdr)
         else:
@@ -344,12 +530,126 @@ def _save_output(state: _ProcessingState, preview: bool, advance_progress: Calla
                     state.watermark_type,
                 )
 
-        state.new_image.save(state.output_path, exif=state.exif_bytes, quality=state.image_quality)
+        state.sink.save_image(
+            state.new_image, state.source_format, exif=state.exif_bytes, quality=state.image_quality,
+        )
         advance_progress("saved")
         return ProcessResult(is_hdr=output_is_hdr)
     return ProcessResult(is_motion=is_motion, is_hdr=output_is_hdr)
 
 
+def _write_ultrahdr_output(state: _ProcessingState, new_primary_jpeg: bytes, gainmap_jpeg: bytes) -> None:
+    """更新主图 XMP 中的 GContainer 长度，依次写出主图与 gainmap。"""
+    if state.ultrahdr_parts.primary_xmp is None:
+        raise WatermarkError(WatermarkErrorCode.UNEXPECTED_ERROR, detail="Primary XMP missing; cannot rebuild Ultra HDR container.")
+
+    tmp_primary = inject_xmp(new_primary_jpeg, state.ultrahdr_parts.primary_xmp)
+    updated_xmp = update_primary_xmp_lengths(
+        state.ultrahdr_parts.primary_xmp,
+        primary_len=len(tmp_primary),
+        gainmap_len=len(gainmap_jpeg),
+    )
+    final_primary = inject_xmp(new_primary_jpeg, updated_xmp)
+
+    state.sink.write_chunks((final_primary, gainmap_jpeg))
+
+
+def _can_append_footer_losslessly(state: _ProcessingState, preview: bool) -> bool:
+    """输出是否等于 “原图 + 白色页脚”，且原图 JPEG 可以在压缩域按 MCU 行追加页脚。"""
+    if preview or state.motion_session is not None or state.max_dimension:
+        return False
+    if not ImageConstants.LOSSLESS_FOOTER_ENABLED:
+        return False
+    # 低质量档位是用户主动要求的压缩，仍走重编码
+    if state.image_quality < CommonConstants.IMAGE_QUALITY_MAP["high"]:
+        return False
+    if not supports_footer_strip(state.style):
+        return False
+    image = state.image
+    # 此时尚未解码；需要旋转或镜像的图像不能直接在底部追加页脚
+    if image.format != "JPEG" or image.getexif().get(piexif.ImageIFD.Orientation, 1) != 1:
+        return False
+    if image.width % 2 != 0 or not can_append_losslessly(image):
+        return False
+    return find_jpegtran() is not None
+
+
+def _save_lossless_footer(state: _ProcessingState, advance_progress: Callable,
+                          preserve_hdr: bool = True) -> Optional[ProcessResult]:
+    """只渲染页脚条带并用 jpegtran 追加到原图 JPEG 之后，原图像素不解码也不重编码。
+
+    jpegtran 处理失败时返回 None，由调用方回退到完整渲染流程。
+    """
+    strip = generate_footer_strip(
+        state.image.size,
+        state.logo_path,
+        state.camera_info.split('\n'),
+        state.shooting_info.split('\n'),
+        CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+        CommonConstants.GLOBAL_FONT_PATH_BOLD,
+        state.watermark_type,
+        font_path_regular=CommonConstants.GLOBAL_FONT_PATH_MONO,
+        font_path_symbol=CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+        style_config=state.style_config,
+        style=state.style,
+    )
+    source_is_hdr = state.ultrahdr_parts is not None
+    if source_is_hdr:
+        source_jpeg = state.ultrahdr_parts.primary_jpeg
+    else:
+        source_jpeg = _working_bytes(state)
+
+    strip_bytes = strip.width * strip.height * len(strip.getbands())
+    try:
+        new_primary_jpeg = append_strip_lossless(source_jpeg, strip)
+    except LosslessAppendError as exc:
+        logger.warning("Lossless footer append failed for %s, re-encoding instead: %s", state.image_path, exc)
+        return None
+    finally:
+        strip.close()
+    advance_progress("rendered")
+    advance_progress("saving")
+
+    new_size = (state.image.width, state.image.height + strip.height)
+    if preserve_hdr and source_is_hdr and state.style["supports_ultrahdr"]:
+        gainmap_jpeg = state.ultrahdr_parts.gainmap_jpeg
+        try:
+            gainmap_jpeg = append_gainmap_footer_lossless(
+                orig_gainmap_jpeg=gainmap_jpeg,
+                orig_gainmap_xmp=state.ultrahdr_parts.gainmap_xmp,
+                orig_primary_size=state.image.size,
+                new_primary_size=new_size,
+            )
+        except LosslessAppendError as exc:
+            logger.info("Gain map is not MCU aligned, re-encoding it: %s", exc)
+            gainmap_jpeg = expand_gainmap_for_borders(
+                orig_gainmap_jpeg=gainmap_jpeg,
+                orig_gainmap_xmp=state.ultrahdr_parts.gainmap_xmp,
+                orig_primary_size=state.image.size,
+                new_primary_size=new_size,
+                content_box=(0, 0, state.image.width, state.image.height),
+            )
+        _write_ultrahdr_output(state, new_primary_jpeg, gainmap_jpeg)
+        advance_progress("saved")
+        return ProcessResult(is_hdr=True, peak_bytes=strip_bytes)
+
+    if source_is_hdr:
+        # 输出为 SDR：去掉指向 gainmap 的 GContainer XMP
+        new_primary_jpeg = _strip_xmp(new_primary_jpeg)
+    state.sink.write_chunks((new_primary_jpeg,))
+    advance_progress("saved")
+    return ProcessResult(peak_bytes=strip_bytes)
+
+
+def _release_pixel_buffers(state: _ProcessingState, preview: bool) -> None:
+    """保存完成后立即释放全尺寸缓冲，内存预算随之归还（预览图需返回给调用方，保留）。"""
+    for image in (state.image, None if preview else state.new_image):
+        if image is not None:
+            image.close()
+    if state.watermark_metadata and state.watermark_metadata.get("overlay") is not None:
+        state.watermark_metadata["overlay"].close()
+
+
 def _cleanup(state: Optional[_ProcessingState]) -> None:
     """释放处理过程中占用的资源。"""
     if state is None:
@@ -366,10 +666,12 @@ def _cleanup(state: Optional[_ProcessingState]) -> None:
             pass
     if state.motion_session is not None:
         state.motion_session.cleanup()
+    if state.spill_dir is not None:
+        state.spill_dir.cleanup()
 
 
 def process_image(
-    image_path: str,
+    image_path: Source,
     lang: str = 'zh',
     watermark_type: int = 1,
     image_quality: int = 95,
@@ -380,12 +682,16 @@ def process_image(
     preliminary_manufacturer: Optional[str] = None,
     preserve_motion: bool = True,
     preserve_hdr: bool = True,
+    probe: Optional[ProbeResult] = None,
+    max_dimension: Optional[int] = None,
+    output=None,
+    video_profile: Optional[str] = None,
 ) -> ProcessResult:
     """
     Adds a watermark to the given image.
 
     Args:
-        image_path (str): The path to the image file.
+        image_path (str | bytes | file-like): The image file path, its bytes, or a readable binary file object.
         lang (str, optional): The language for error messages. Defaults to 'zh'.
         watermark_type (int, optional): The type of watermark to add. Defaults to 1.
         image_quality (int, optional): The quality of the output image. Defaults to 95.
@@ -395,10 +701,22 @@ def process_image(
         style_config (dict, optional): Loaded watermark style config.
         preserve_motion (bool, optional): Whether to preserve motion photo. Defaults to True.
         preserve_hdr (bool, optional): Whether to preserve Ultra HDR. Defaults to True.
+        probe (ProbeResult, optional): Upload-time probe result; skips format and EXIF re-detection.
+        max_dimension (int, optional): Decode and render with the long edge reduced to this size.
+            Defaults to ImageConstants.PREVIEW_MAX_DIMENSION for previews, full size otherwise.
+        output (optional): Where to write the result: a path, a writable binary file object, a callable
+            receiving byte chunks, or a process_io.OutputSink. Defaults to {name}_watermark{ext} next to
+            image_path; required when image_path is not a path (except for previews).
+        video_profile (str, optional): Motion photo video encoding profile name ("fast", "balanced",
+            "archival"). Defaults to AppConstants.VIDEO_ENCODING_PROFILE.
 
     Returns:
         ProcessResult: 处理结果，包含 success、is_motion、is_hdr、preview_image 字段。
     """
+    source_path, source_bytes = read_source(image_path)
+    if source_path is None and output is None and not preview:
+        raise ValueError("output is required when the image source is not a file path")
+    image_path = source_path if source_path is not None else "<memory>"
     state = None
     try:
         if style_config is None:
@@ -407,19 +725,31 @@ def process_image(
         if not style or not style["enabled"]:
             raise WatermarkError(WatermarkErrorCode.UNEXPECTED_ERROR, detail=f"Invalid watermark style: {watermark_type}")
 
-        original_name, extension = os.path.splitext(image_path)
-        output_path = f"{original_name}_watermark{extension}"
+        if output is None and not preview:
+            original_name, extension = os.path.splitext(source_path)
+            output = f"{original_name}_watermark{extension}"
+        sink = make_sink(output) if output is not None else None
+        output_label = (sink.path or type(sink).__name__) if sink is not None else None
+
+        source_size = len(source_bytes) if source_path is None else os.path.getsize(source_path)
+        if probe is not None and probe.file_size != source_size:
+            logger.info("Probe result is stale for %s, re-detecting", image_path)
+            probe = None
 
         state = _ProcessingState(
             image_path=image_path,
-            output_path=output_path,
-            working_image_path=image_path,
+            working_image_path=source_path,
+            source_bytes=source_bytes,
+            sink=sink,
             style_config=style_config,
             style=style,
             watermark_type=watermark_type,
             image_quality=image_quality,
             logo_preference=logo_preference,
             manufacturer=preliminary_manufacturer,
+            probe=probe,
+            max_dimension=max_dimension or (ImageConstants.PREVIEW_MAX_DIMENSION if preview else None),
+            video_profile=video_profile,
         )
 
         progress_step = 0
@@ -432,9 +762,12 @@ def process_image(
         _detect_format(state)
         logger.info(
             "Received image: %s, output: %s, is_motion: %s, start processing...",
-            image_path, output_path, None != state.motion_session,
+            image_path, output_label, None != state.motion_session,
         )
-        _load_image(state)
+        if state.motion_session is not None and not preview:
+            # motion photo 的视频叠加与 gainmap 扩展按原始分辨率计算，不做缩小输出
+            state.max_dimension = None
+        _open_image(state)
         advance_progress("loaded")
 
         _extract_metadata(state)
@@ -442,10 +775,29 @@ def process_image(
             _resolve_logo(state)
         advance_progress("metadata")
 
-        _render_watermark(state)
-        advance_progress("rendered")
+        if _can_append_footer_losslessly(state, preview):
+            result = _save_lossless_footer(state, advance_progress, preserve_hdr)
+            if result is not None:
+                result.output_path = sink.path
+                return result
 
-        return _save_output(state, preview, advance_progress, preserve_motion, preserve_hdr)
+        # 解码前按规划的峰值预留内存额度，保证并发任务总占用不超过进程预算
+        state.plan = _plan_composition(state)
+        logger.info(
+            "Composition plan for %s: decode %sx%s, canvas %sx%s, peak %.1f MB",
+            image_path, *state.plan.decode_size, *state.plan.canvas_size, state.plan.peak_bytes / 1024 / 1024,
+        )
+        with get_memory_budget().reserve(state.plan.peak_bytes):
+            _decode_image(state)
+            _render_watermark(state)
+            advance_progress("rendered")
+
+            result = _save_output(state, preview, advance_progress, preserve_motion, preserve_hdr)
+            _release_pixel_buffers(state, preview)
+        result.peak_bytes = state.plan.peak_bytes
+        if not preview:
+            result.output_path = sink.path
+        return result
 
     except WatermarkError:
         raise
@@ -454,6 +806,184 @@ def process_image(
     finally:
         _cleanup(state)
 
+def _default_style_output_path(image_path: str, watermark_type: int, multi_style: bool) -> str:
+    original_name, extension = os.path.splitext(image_path)
+    if multi_style:
+        return f"{original_name}_watermark_s{watermark_type}{extension}"
+    return f"{original_name}_watermark{extension}"
+
+
+def _select_style(state: _ProcessingState, watermark_type: int, style: dict, sink: OutputSink) -> None:
+    state.watermark_type = watermark_type
+    state.style = style
+    state.sink = sink
+
+
+def _release_rendered(state: _ProcessingState) -> None:
+    """释放单个样式的成品与叠加层，原图保留给下一个样式。"""
+    if state.new_image is not None:
+        state.new_image.close()
+        state.new_image = None
+    if state.watermark_metadata and state.watermark_metadata.get("overlay") is not None:
+        state.watermark_metadata["overlay"].close()
+    state.watermark_metadata = None
+
+
+def _failed_result(exc: Exception) -> ProcessResult:
+    if not isinstance(exc, WatermarkError):
+        exc = WatermarkError(WatermarkErrorCode.UNEXPECTED_ERROR, detail=str(exc))
+    return ProcessResult(success=False, error=exc)
+
+
+def _process_styles_separately(source, watermark_types, output_path_for: Callable[[int], object],
+                               **kwargs) -> dict:
+    """逐个样式完整调用 process_image，各自直接写到目标输出。"""
+    results = {}
+    for watermark_type in watermark_types:
+        try:
+            results[watermark_type] = process_image(
+                source, watermark_type=watermark_type, output=output_path_for(watermark_type), **kwargs,
+            )
+        except Exception as exc:
+            results[watermark_type] = _failed_result(exc)
+    return results
+
+
+def process_image_styles(
+    image_path: Source,
+    watermark_types: Sequence[int],
+    lang: str = 'zh',
+    image_quality: int = 95,
+    logo_preference: str = "xiaomi",
+    style_config: Optional[dict] = None,
+    preserve_motion: bool = True,
+    preserve_hdr: bool = True,
+    output_path_for: Optional[Callable[[int], object]] = None,
+    video_profile: Optional[str] = None,
+) -> dict:
+    """同一张图片渲染多个样式：格式探测、EXIF 与 logo 解析、像素解码都只做一次。
+
+    Returns:
+        dict: 样式 ID -> ProcessResult（顺序与 watermark_types 一致）。单个样式失败时
+        success=False，错误记录在 ProcessResult.error；整张图片级别的错误（缺少 EXIF、
+        像素超限等）直接抛出 WatermarkError。
+
+    output_path_for(样式 ID) 返回输出目标（路径、文件对象、回调或 OutputSink，同 process_image 的 output）；
+    默认单样式为 {name}_watermark{ext}，多样式为 {name}_watermark_s{ID}{ext}，image_path 不是路径时必须提供。
+    motion photo 的视频按样式各自叠加，退化为逐个样式处理。
+    """
+    source_path, source_bytes = read_source(image_path)
+    if source_path is None and output_path_for is None:
+        raise ValueError("output_path_for is required when the image source is not a file path")
+    image_path = source_path if source_path is not None else "<memory>"
+    if style_config is None:
+        style_config = load_cached_watermark_styles(CommonConstants.WATERMARK_STYLE_CONFIG_PATH)
+    if output_path_for is None:
+        multi_style = len(set(watermark_types)) > 1
+        output_path_for = lambda watermark_type: _default_style_output_path(image_path, watermark_type, multi_style)
+
+    results = {}
+    styles = {}
+    for watermark_type in watermark_types:
+        style = get_style(style_config, watermark_type)
+        if not style or not style["enabled"]:
+            results[watermark_type] = _failed_result(WatermarkError(
+                WatermarkErrorCode.UNEXPECTED_ERROR, detail=f"Invalid watermark style: {watermark_type}",
+            ))
+        else:
+            styles[watermark_type] = style
+    if not styles:
+        return results
+
+    def ignore_progress(_stage):
+        pass
+
+    # 每个样式的输出目标只解析一次（回调可能每次返回新的文件对象）
+    sinks = {watermark_type: make_sink(output_path_for(watermark_type)) for watermark_type in styles}
+    state = None
+    try:
+        first_type = next(iter(styles))
+        state = _ProcessingState(
+            image_path=image_path,
+            working_image_path=source_path,
+            source_bytes=source_bytes,
+            sink=sinks[first_type],
+            style_config=style_config,
+            style=styles[first_type],
+            watermark_type=first_type,
+            image_quality=image_quality,
+            logo_preference=logo_preference,
+        )
+        _detect_format(state)
+        if state.motion_session is not None:
+            _cleanup(state)
+            state = None
+            results.update(_process_styles_separately(
+                source_path if source_path is not None else source_bytes, list(styles), sinks.__getitem__,
+                lang=lang, image_quality=image_quality, logo_preference=logo_preference,
+                style_config=style_config, preserve_motion=preserve_motion, preserve_hdr=preserve_hdr,
+                video_profile=video_profile,
+            ))
+            return {watermark_type: results[watermark_type] for watermark_type in watermark_types}
+
+        _open_image(state)
+        _extract_metadata(state)
+        logo_error = None
+        if any(style.get("requires_logo", True) for style in styles.values()):
+            try:
+                _resolve_logo(state)
+            except WatermarkError as exc:
+                logo_error = exc
+
+        pending = []
+        for watermark_type, style in styles.items():
+            if logo_error is not None and style.get("requires_logo", True):
+                results[watermark_type] = _failed_result(logo_error)
+                continue
+            _select_style(state, watermark_type, style, sinks[watermark_type])
+            if _can_append_footer_losslessly(state, preview=False):
+                result = _save_lossless_footer(state, ignore_progress, preserve_hdr)
+                if result is not None:
+                    result.output_path = state.sink.path
+                    results[watermark_type] = result
+                    continue
+            pending.append(watermark_type)
+
+        if pending:
+            # 原图在各样式之间保留，按保留原图的规划取各样式峰值的最大值
+            plans = {}
+            for watermark_type in pending:
+                _select_style(state, watermark_type, styles[watermark_type], sinks[watermark_type])
+                plans[watermark_type] = _plan_composition(state, retain_source=True)
+            peak_bytes = max(plan.peak_bytes for plan in plans.values())
+            with get_memory_budget().reserve(peak_bytes):
+                state.plan = plans[pending[0]]
+                _decode_image(state)
+                for watermark_type in pending:
+                    _select_style(state, watermark_type, styles[watermark_type], sinks[watermark_type])
+                    state.plan = plans[watermark_type]
+                    try:
+                        _render_watermark(state, release_origin=False)
+                        result = _save_output(state, False, ignore_progress, preserve_motion, preserve_hdr)
+                        result.output_path = state.sink.path
+                    except Exception as exc:
+                        logger.warning("Style %s failed for %s: %s", watermark_type, image_path, exc)
+                        result = _failed_result(exc)
+                    finally:
+                        _release_rendered(state)
+                    result.peak_bytes = peak_bytes
+                    results[watermark_type] = result
+
+        return {watermark_type: results[watermark_type] for watermark_type in watermark_types}
+
+    except WatermarkError:
+        raise
+    except Exception as exc:
+        raise WatermarkError(WatermarkErrorCode.UNEXPECTED_ERROR, detail=str(exc)) from exc
+    finally:
+        _cleanup(state)
+
+
 def main():
     """Main function to handle command-line arguments."""
     if len(sys.argv) < 5:
@@ -0,0 +1,234 @@
+"""process_image() 的输入源与输出端：输入可以是路径、bytes 或文件对象，输出写到路径、文件对象或回调。"""
+from __future__ import annotations
+
+import errno
+import os
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# 内核复制不可用、或输出端不是文件时，按块读取文件片段的块大小
+_COPY_BLOCK_SIZE = 1024 * 1024
+# 这些 errno 表示当前文件系统 / 内核不支持该复制方式，换下一种
+_UNSUPPORTED_COPY_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+class FilePart(NamedTuple):
+    """输出中的一段文件内容 path[offset:offset + length]；length 为 None 表示到文件末尾。
+
+    交给 OutputSink.write_parts() 后由输出端流式复制，不整体读入内存。
+    """
+
+    path: str
+    offset: int = 0
+    length: Optional[int] = None
+
+    def resolved_length(self) -> int:
+        if self.length is not None:
+            return self.length
+        return os.path.getsize(self.path) - self.offset
+
+
+def _kernel_copy_functions():
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        yield lambda src_fd, dst_fd, offset, count: copy_file_range(src_fd, dst_fd, count, offset_src=offset)
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None:
+        yield lambda src_fd, dst_fd, offset, count: sendfile(dst_fd, src_fd, offset, count)
+
+
+def _write_all(fd: int, data) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, length: int) -> None:
+    """把 src_fd 的 [offset, offset + length) 写到 dst_fd 的当前位置。
+
+    依次尝试 copy_file_range、sendfile（数据不经过用户态），都不支持时退回 pread 分块复制。
+    """
+    remaining = length
+    for kernel_copy in _kernel_copy_functions():
+        try:
+            while remaining:
+                copied = kernel_copy(src_fd, dst_fd, offset, remaining)
+                if copied == 0:
+                    raise EOFError("source file is shorter than the requested range")
+                offset += copied
+                remaining -= copied
+            return
+        except OSError as exc:
+            if exc.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
+    while remaining:
+        block = os.pread(src_fd, min(remaining, _COPY_BLOCK_SIZE), offset)
+        if not block:
+            raise EOFError("source file is shorter than the requested range")
+        _write_all(dst_fd, block)
+        offset += len(block)
+        remaining -= len(block)
+
+
+def iter_file_part(part: FilePart) -> Iterator[bytes]:
+    """按块读出文件片段，供不能直接做内核复制的输出端使用。"""
+    remaining = part.resolved_length()
+    offset = part.offset
+    with open(part.path, "rb") as fp:
+        while remaining:
+            block = os.pread(fp.fileno(), min(remaining, _COPY_BLOCK_SIZE), offset)
+            if not block:
+                raise EOFError("source file is shorter than the requested range")
+            yield block
+            offset += len(block)
+            remaining -= len(block)
+
+
+def read_source(source: Source) -> Tuple[Optional[str], Optional[bytes]]:
+    """返回 (路径, None) 或 (None, 字节)：路径输入不读取内容，交给后续流程按需读取。"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source), None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return None, bytes(source)
+    if hasattr(source, "read"):
+        return None, source.read()
+    raise TypeError(f"Unsupported image source: {type(source).__name__}")
+
+
+class OutputSink:
+    """成品输出端。
+
+    write_chunks 按顺序写出若干字节块（Ultra HDR / motion photo 的主图、gainmap、视频无需先拼接）；
+    save_image 直接把 Pillow 图像编码到输出端。
+    """
+
+    # 输出路径（仅路径输出端有值）
+    path: Optional[str] = None
+
+    def write_chunks(self, chunks: Iterable[bytes]) -> None:
+        raise NotImplementedError
+
+    def save_image(self, image: Image.Image, format: Optional[str], **save_kwargs) -> None:
+        raise NotImplementedError
+
+    def write_parts(self, parts: Iterable[Union[bytes, FilePart]]) -> None:
+        """按顺序写出字节块与文件片段（FilePart 按块流式读取）。"""
+        self.write_chunks(_iter_parts(parts))
+
+
+def _iter_parts(parts: Iterable[Union[bytes, FilePart]]) -> Iterator[bytes]:
+    for part in parts:
+        if isinstance(part, FilePart):
+            yield from iter_file_part(part)
+        else:
+            yield part
+
+
+class PathSink(OutputSink):
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+
+    def write_chunks(self, chunks: Iterable[bytes]) -> None:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "wb") as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+
+    def save_image(self, image: Image.Image, format: Optional[str], **save_kwargs) -> None:
+        # 路径输出按扩展名决定编码格式（与 {name}_watermark{ext} 的原有行为一致）
+        image.save(self.path, **save_kwargs)
+
+    def write_parts(self, parts: Iterable[Union[bytes, FilePart]]) -> None:
+        """相邻的字节块用一次 writev 写出，文件片段在内核中直接复制到输出文件。"""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "wb") as fp:
+            fd = fp.fileno()
+            pending = []
+            for part in list(parts) + [None]:
+                if isinstance(part, (bytes, bytearray, memoryview)):
+                    pending.append(part)
+                    continue
+                if pending:
+                    _writev_all(fd, pending)
+                    pending = []
+                if part is not None:
+                    with open(part.path, "rb") as src:
+                        copy_range(src.fileno(), fd, part.offset, part.resolved_length())
+
+
+def _writev_all(fd: int, buffers) -> None:
+    writev = getattr(os, "writev", None)
+    if writev is None:
+        for buffer in buffers:
+            _write_all(fd, buffer)
+        return
+    views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while views:
+        written = writev(fd, views)
+        # 处理部分写入：丢弃已写完的缓冲，截掉当前缓冲已写出的前缀
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if views and written:
+            views[0] = views[0][written:]
+
+
+class FileSink(OutputSink):
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+
+    def write_chunks(self, chunks: Iterable[bytes]) -> None:
+        for chunk in chunks:
+            self.fileobj.write(chunk)
+
+    def save_image(self, image: Image.Image, format: Optional[str], **save_kwargs) -> None:
+        image.save(self.fileobj, format=format or "JPEG", **save_kwargs)
+
+
+class _CallbackWriter:
+    """把 Pillow 编码器的 write() 直接转交给回调，不在内存中攒整个文件。"""
+
+    def __init__(self, callback: Callable[[bytes], None]):
+        self._callback = callback
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._callback(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+
+class CallbackSink(OutputSink):
+    def __init__(self, callback: Callable[[bytes], None]):
+        self.callback = callback
+
+    def write_chunks(self, chunks: Iterable[bytes]) -> None:
+        for chunk in chunks:
+            self.callback(chunk)
+
+    def save_image(self, image: Image.Image, format: Optional[str], **save_kwargs) -> None:
+        image.save(_CallbackWriter(self.callback), format=format or "JPEG", **save_kwargs)
+
+
+def make_sink(target) -> OutputSink:
+    """路径 -> PathSink，可写文件对象 -> FileSink，可调用对象 -> CallbackSink（接收依次写出的字节块）。"""
+    if isinstance(target, OutputSink):
+        return target
+    if isinstance(target, (str, os.PathLike)):
+        return PathSink(target)
+    if hasattr(target, "write"):
+        return FileSink(target)
+    if callable(target):
+        return CallbackSink(target)
+    raise TypeError(f"Unsupported output target: {type(target).__name__}")
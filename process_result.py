@@ -11,3 +11,9 @@ class ProcessResult:
     is_motion: bool = False
     is_hdr: bool = False
     preview_image: Optional[Image.Image] = None
+    # 按合成规划估算的像素缓冲峰值（字节）
+    peak_bytes: int = 0
+    # 输出文件路径（预览时为 None）
+    output_path: Optional[str] = None
+    # 多样式批处理中单个样式失败时的错误（success=False）
+    error: Optional[Exception] = None
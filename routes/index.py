@@ -2,6 +2,8 @@ import os
 
 from flask import Blueprint, jsonify, current_app, send_from_directory
 
+from extensions import limiter
+from services.admission import admission_status
 from services.watermark_styles import get_default_style_id, list_enabled_styles
 
 bp = Blueprint("index", __name__)
@@ -30,6 +32,23 @@ def api_styles():
     })
 
 
+@bp.route("/api/ready")
+@limiter.exempt
+def api_ready():
+    """就绪检查：队列饱和时返回 503，负载均衡器据此把新请求分给其他节点。"""
+    status = admission_status(current_app.extensions["state"])
+    payload = {"ready": status.accepting, **status.to_dict()}
+    job_queue = getattr(current_app.extensions["state"], "job_queue", None)
+    if job_queue is not None:
+        payload["jobs"] = job_queue.stats()
+    if status.accepting:
+        return jsonify(payload), 200
+    response = jsonify(payload)
+    response.status_code = 503
+    response.headers["Retry-After"] = str(status.retry_after)
+    return response
+
+
 @bp.route("/")
 def index():
     """SPA 入口：返回 Vue 构建产物的 index.html。"""
@@ -1,3 +1,4 @@
+import json
 import os
 import time
 from datetime import datetime
@@ -10,8 +11,11 @@ from werkzeug.utils import secure_filename
 from constants import AppConstants, ImageConstants, format_pixel_limit
 from errors import WatermarkError, WatermarkErrorCode
 from extensions import limiter
+from media.jpeg_container import JpegContainer
 from routes._utils import is_browser_request
+from services.admission import QueueFullError
 from services.download_token import verify_token
+from services.events import task_snapshot
 from services.i18n import get_error_message, normalize_lang
 from services.tasks import (
     TaskPayload,
@@ -24,7 +28,8 @@ from services.tasks import (
     submit_task,
 )
 from services.watermark_styles import get_default_style_id, is_style_enabled
-from process import detect_image_features
+from probe_result import ProbeResult
+from process import detect_image_features, probe_image
 
 
 def _requested_bool(name: str) -> bool | None:
@@ -67,31 +72,18 @@ def _read_image_dimensions(filepath: str) -> tuple[int, int] | None:
     try:
         with open(filepath, "rb") as f:
             header = f.read(32)
-            if len(header) < 8:
-                return None
+        if len(header) < 8:
+            return None
 
-            if header[:3] == b"\xff\xd8\xff":
-                # JPEG: 扫描 SOF0 / SOF1 / SOF2 标记段获取尺寸
-                f.seek(2)
-                while True:
-                    chunk = f.read(4)
-                    if len(chunk) < 4:
-                        break
-                    ff, marker_lo, seg_len = struct.unpack(">BBH", chunk)
-                    if ff != 0xFF:
-                        break
-                    if marker_lo < 0xC0 or marker_lo > 0xCF or marker_lo in (0xC4, 0xC8, 0xCC):
-                        f.seek(seg_len - 2, 1)
-                        continue
-                    seg_data = f.read(seg_len - 2)
-                    if len(seg_data) >= 5:
-                        return (struct.unpack(">H", seg_data[3:5])[0], struct.unpack(">H", seg_data[1:3])[0])
-                    break
-
-            elif header[:8] == b"\x89PNG\r\n\x1a\n":
-                # PNG: IHDR 块在偏移 16 bytes，宽高各 4 字节
-                width, height = struct.unpack(">II", header[16:24])
-                return width, height
+        if header[:3] == b"\xff\xd8\xff":
+            # JPEG: 由容器索引读取 SOF 段中的尺寸
+            with JpegContainer.open(filepath) as container:
+                return container.size
+
+        if header[:8] == b"\x89PNG\r\n\x1a\n":
+            # PNG: IHDR 块在偏移 16 bytes，宽高各 4 字节
+            width, height = struct.unpack(">II", header[16:24])
+            return width, height
 
     except Exception:
         pass
@@ -176,8 +168,10 @@ def upload_file():
             os.remove(filepath)
             return jsonify(error=get_error_message("image_too_large", lang, limit=format_pixel_limit(ImageConstants.MAX_IMAGE_PIXELS, lang))), 400
 
-        manufacturer = detect_manufacturer(filepath)
-        features = detect_image_features(filepath)
+        # 只探测一次，结果随任务保存，处理阶段不再重复解析
+        probe = probe_image(filepath)
+        manufacturer = detect_manufacturer(probe)
+        features = detect_image_features(probe)
         if manufacturer and "xiaomi" in manufacturer.lower():
             normalized_preference = (logo_preference or "").lower()
             if normalized_preference not in {"xiaomi", "leica"}:
@@ -196,6 +190,7 @@ def upload_file():
                         "preliminary_manufacturer": manufacturer,
                         "preserve_motion": preserve_motion,
                         "preserve_hdr": preserve_hdr,
+                        "probe": probe.to_dict(),
                     },
                 )
                 return jsonify({"needs_logo_choice": True, "task_id": task_id}), 200
@@ -218,25 +213,32 @@ def upload_file():
                     "preliminary_manufacturer": manufacturer,
                     "preserve_motion": True if preserve_motion is None else preserve_motion,
                     "preserve_hdr": True if preserve_hdr is None else preserve_hdr,
+                    "probe": probe.to_dict(),
                 },
             )
             return jsonify(_options_payload(task_id, features, preserve_motion, preserve_hdr)), 200
 
-        task_id = submit_task(TaskPayload(
-            task_id="",
-            state=state,
-            filepath=filepath,
-            lang=lang,
-            watermark_type=watermark_type_int,
-            image_quality=image_quality_int,
-            burn_after_read=burn_after_read,
-            logo_preference=logo_preference,
-            style_config=style_config,
-            logger=current_app.logger,
-            preliminary_manufacturer=manufacturer,
-            preserve_motion=True if preserve_motion is None else preserve_motion,
-            preserve_hdr=True if preserve_hdr is None else preserve_hdr,
-        ))
+        try:
+            task_id = submit_task(TaskPayload(
+                task_id="",
+                state=state,
+                filepath=filepath,
+                lang=lang,
+                watermark_type=watermark_type_int,
+                image_quality=image_quality_int,
+                burn_after_read=burn_after_read,
+                logo_preference=logo_preference,
+                style_config=style_config,
+                logger=current_app.logger,
+                preliminary_manufacturer=manufacturer,
+                preserve_motion=True if preserve_motion is None else preserve_motion,
+                preserve_hdr=True if preserve_hdr is None else preserve_hdr,
+                probe=probe,
+            ))
+        except QueueFullError:
+            # 未入队的上传不保留，客户端按 Retry-After 重新上传
+            os.remove(filepath)
+            raise
 
         return jsonify({"task_id": task_id}), 202
 
@@ -299,6 +301,7 @@ def confirm_logo_choice():
         preliminary_manufacturer=preliminary_manufacturer,
         preserve_motion=True if preserve_motion is None else bool(preserve_motion),
         preserve_hdr=True if preserve_hdr is None else bool(preserve_hdr),
+        probe=ProbeResult.from_dict(task.get("probe")),
     ))
 
     return jsonify({"task_id": task_id}), 202
@@ -348,7 +351,8 @@ def confirm_options():
     if not isinstance(watermark_type, int) or not is_style_enabled(style_config, watermark_type):
         return jsonify(error=get_error_message("unexpected_error", task.get("lang", "zh"))), 400
 
-    manufacturer = task.get("preliminary_manufacturer") or detect_manufacturer(filepath)
+    probe = ProbeResult.from_dict(task.get("probe"))
+    manufacturer = task.get("preliminary_manufacturer") or detect_manufacturer(probe or filepath)
     logo_preference = task.get("logo_preference")
 
     submit_existing_task(task_id, TaskPayload(
@@ -365,11 +369,125 @@ def confirm_options():
         preliminary_manufacturer=manufacturer,
         preserve_motion=preserve_motion,
         preserve_hdr=preserve_hdr,
+        probe=probe,
     ))
 
     return jsonify({"task_id": task_id}), 202
 
 
+def _requested_task_ids() -> list[str] | None:
+    """ids 参数：逗号分隔或重复出现，去重后保持顺序；为空或超过上限时返回 None。"""
+    task_ids = []
+    for value in request.args.getlist("ids"):
+        task_ids.extend(part.strip() for part in value.split(",") if part.strip())
+    task_ids = list(dict.fromkeys(task_ids))
+    if not task_ids or len(task_ids) > AppConstants.SSE_MAX_TASK_IDS:
+        return None
+    return task_ids
+
+
+def _sse_message(event_id: int, task_id: str, data: dict) -> str:
+    payload = json.dumps({"task_id": task_id, **data}, ensure_ascii=False)
+    return f"id: {event_id}\nevent: task\ndata: {payload}\n\n"
+
+
+_FINAL_STATUSES = {"succeeded", "failed", "unknown"}
+
+
+@bp.route("/events", methods=["GET"])
+def task_events():
+    """SSE 推送任务进度：ids=a,b,c；断线重连时浏览器带 Last-Event-ID，只补发之后的变化。
+
+    所有任务结束（或连接达到最长时长）后关闭流；不支持 SSE 时改用 GET /api/status?ids=...
+    """
+    lang = normalize_lang(request.args.get("lang", "zh"))
+    task_ids = _requested_task_ids()
+    if task_ids is None:
+        return jsonify(error=get_error_message("invalid_task_ids", lang, limit=AppConstants.SSE_MAX_TASK_IDS)), 400
+
+    state = current_app.extensions["state"]
+    bus = state.events
+    # 每条流占用一个 worker 线程；超出名额时让前端改用 /api/status?ids= 轮询，保留线程给上传与状态查询
+    if not state.acquire_event_stream():
+        response = jsonify(error=get_error_message("server_busy", lang, seconds=AppConstants.SSE_RETRY_MS // 1000))
+        response.status_code = 503
+        response.headers["Retry-After"] = str(AppConstants.SSE_RETRY_MS // 1000)
+        return response
+    try:
+        resume_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or "")
+    except ValueError:
+        resume_id = None
+
+    def generate():
+        pending = set(task_ids)
+        yield f"retry: {AppConstants.SSE_RETRY_MS}\n\n"
+
+        if resume_id is not None and bus.can_resume(resume_id):
+            cursor = resume_id
+            # 先记下已结束的任务再取事件：结束事件若晚于 cursor 一定会在下面补发
+            finished = set()
+            for task_id in task_ids:
+                task = state.get_task(task_id)
+                if task is None or task.get("status") in _FINAL_STATUSES:
+                    finished.add(task_id)
+            events = bus.wait(pending, cursor, timeout=0)
+            for event in events:
+                yield _sse_message(event.event_id, event.task_id, event.data)
+                cursor = max(cursor, event.event_id)
+                if event.data.get("status") in _FINAL_STATUSES:
+                    pending.discard(event.task_id)
+            pending -= finished
+        else:
+            # 先取游标再读快照：快照之后的变化都会作为事件送达
+            cursor = bus.last_id
+            for task_id in task_ids:
+                task = state.get_task(task_id)
+                data = task_snapshot(task) if task else {"status": "unknown"}
+                yield _sse_message(cursor, task_id, data)
+                if data["status"] in _FINAL_STATUSES:
+                    pending.discard(task_id)
+
+        deadline = time.monotonic() + AppConstants.SSE_MAX_STREAM_SECONDS
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = bus.wait(pending, cursor, timeout=min(AppConstants.SSE_HEARTBEAT_SECONDS, remaining))
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for event in events:
+                yield _sse_message(event.event_id, event.task_id, event.data)
+                cursor = max(cursor, event.event_id)
+                if event.data.get("status") in _FINAL_STATUSES:
+                    pending.discard(event.task_id)
+        yield "event: end\ndata: {}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    # 流结束或客户端断开时 WSGI 服务器都会调用 close()
+    response.call_on_close(state.release_event_stream)
+    response.headers["Cache-Control"] = "no-cache"
+    # 关闭反向代理（nginx）的响应缓冲，事件才能即时送达
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@bp.route("/status", methods=["GET"])
+def get_task_statuses():
+    """批量查询：GET /api/status?ids=a,b,c，作为 /api/events 不可用时的轮询回退。"""
+    lang = normalize_lang(request.args.get("lang", "zh"))
+    task_ids = _requested_task_ids()
+    if task_ids is None:
+        return jsonify(error=get_error_message("invalid_task_ids", lang, limit=AppConstants.SSE_MAX_TASK_IDS)), 400
+
+    state = current_app.extensions["state"]
+    tasks = {}
+    for task_id in task_ids:
+        task = state.get_task(task_id)
+        tasks[task_id] = task_snapshot(task) if task else {"status": "unknown"}
+    return jsonify({"tasks": tasks})
+
+
 @bp.route("/status/<task_id>", methods=["GET"])
 def get_task_status(task_id):
     if is_browser_request():
@@ -379,15 +497,7 @@ def get_task_status(task_id):
     task = state.get_task(task_id)
     if not task:
         return jsonify({"status": "unknown"}), 404
-    return jsonify(
-        {
-            "status": task.get("status"),
-            "progress": task.get("progress", 0.0),
-            "stage": task.get("stage"),
-            "result": task.get("result"),
-            "error": task.get("error"),
-        }
-    )
+    return jsonify(task_snapshot(task))
 
 
 @bp.route("/upload/<filename>")
@@ -0,0 +1,179 @@
+"""磨砂背景渲染基准：对比重构前的全尺寸实现与当前的分块实现。
+
+用法：python -m scripts.bench_frosted_glass [--megapixels 12 50 100] [--repeat 3]
+"""
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from constants import ImageConstants  # noqa: E402
+from imaging import frosted_glass  # noqa: E402
+from imaging.image_ops import _darken_rgb_inplace, is_landscape  # noqa: E402
+
+
+def legacy_frosted_glass_effect(origin_image, pad_to_even=False):
+    """重构前的实现：全尺寸 LANCZOS 放大背景 + 全尺寸 RGBA 阴影 patch 做 BoxBlur。"""
+    ori_w, ori_h = origin_image.size
+    min_dim = min(ori_w, ori_h)
+
+    shadow_scale_factor = ImageConstants.WATERMARK_GLASS_SHADOW_SCALE
+
+    landscape = is_landscape(origin_image)
+
+    corner_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_CORNER_RADIUS_FACTOR)
+    shadow_blur_radius = int(min_dim * ImageConstants.WATERMARK_GLASS_BLUR_RADIUS)
+
+    shadow_offset_y = int(min_dim * (frosted_glass.SHADOW_OFFSET_Y_LANDSCAPE if landscape else frosted_glass.SHADOW_OFFSET_Y_PORTRAIT))
+    shadow_color = (0, 0, 0, ImageConstants.WATERMARK_GLASS_COLOR)
+
+    canvas_w, canvas_h = frosted_glass.frosted_canvas_size(origin_image.size)
+    canvas_size = (canvas_w, canvas_h)
+    if pad_to_even:
+        canvas_size = (canvas_w + canvas_w % 2, canvas_h + canvas_h % 2)
+
+    ds_w = max(1, canvas_w // 10)
+    ds_h = max(1, canvas_h // 10)
+
+    if origin_image.mode != "RGB":
+        small_bg_source = origin_image.convert("RGB")
+    else:
+        small_bg_source = origin_image
+    small_bg = small_bg_source.resize((ds_w, ds_h), Image.Resampling.BOX)
+
+    blurred_bg = small_bg.filter(ImageFilter.GaussianBlur(frosted_glass.BLUR_DOWNSAMPLE_RADIUS))
+    del small_bg
+    # 在缩小图上变暗（线性变换与缩放可交换），避免对全尺寸背景再复制一次
+    blurred_bg = _darken_rgb_inplace(blurred_bg, dim_alpha_0_255=20)
+    # 放大铺满
+    final_bg = blurred_bg.resize(canvas_size, Image.Resampling.LANCZOS)
+    if canvas_w % 2 and canvas_size[0] != canvas_w:
+        final_bg.paste("white", (canvas_w, 0, canvas_w + 1, canvas_size[1]))
+    if canvas_h % 2 and canvas_size[1] != canvas_h:
+        final_bg.paste("white", (0, canvas_h, canvas_size[0], canvas_h + 1))
+
+    if origin_image.mode != "RGB":
+        foreground_rgb = origin_image.convert("RGB")
+    else:
+        foreground_rgb = origin_image
+
+    pos_x = (canvas_w - ori_w) // 2
+    pos_y = (canvas_h - ori_h) // 2
+
+    shadow_w = int(ori_w * shadow_scale_factor)
+    shadow_h = int(ori_h * shadow_scale_factor)
+    shadow_x = pos_x + (ori_w - shadow_w) // 2
+    shadow_y = pos_y + (ori_h - shadow_h) // 2 - shadow_offset_y
+
+    pad = int(shadow_blur_radius * 1.2)
+
+    x0 = max(0, shadow_x - pad)
+    y0 = max(0, shadow_y - pad)
+    x1 = min(canvas_w, shadow_x + shadow_w + pad)
+    y1 = min(canvas_h, shadow_y + shadow_h + pad)
+
+    patch_w = max(1, x1 - x0)
+    patch_h = max(1, y1 - y0)
+
+    shadow_patch = Image.new("RGBA", (patch_w, patch_h), (0, 0, 0, 0))
+    d = ImageDraw.Draw(shadow_patch)
+
+    rx0 = shadow_x - x0
+    ry0 = shadow_y - y0
+    rx1 = rx0 + shadow_w
+    ry1 = ry0 + shadow_h
+    d.rounded_rectangle((rx0, ry0, rx1, ry1), radius=corner_radius, fill=shadow_color)
+
+    if shadow_blur_radius > 0:
+        shadow_patch = shadow_patch.filter(ImageFilter.BoxBlur(shadow_blur_radius))
+
+    final_image = final_bg
+    del final_bg
+
+    final_image.paste(shadow_patch, (x0, y0), shadow_patch)
+    del shadow_patch
+
+    fg_x = pos_x
+    fg_y = pos_y - shadow_offset_y
+    corner_radius = max(0, min(corner_radius, ori_w // 2, ori_h // 2))
+    if corner_radius > 0:
+        bg_tl = final_image.crop((fg_x, fg_y, fg_x + corner_radius, fg_y + corner_radius))
+        bg_tr = final_image.crop((fg_x + ori_w - corner_radius, fg_y, fg_x + ori_w, fg_y + corner_radius))
+        bg_bl = final_image.crop((fg_x, fg_y + ori_h - corner_radius, fg_x + corner_radius, fg_y + ori_h))
+        bg_br = final_image.crop((fg_x + ori_w - corner_radius, fg_y + ori_h - corner_radius, fg_x + ori_w, fg_y + ori_h))
+
+        corner_mask = Image.new("L", (corner_radius, corner_radius), 255)
+        corner_draw = ImageDraw.Draw(corner_mask)
+        corner_draw.pieslice((0, 0, corner_radius * 2, corner_radius * 2), 180, 270, fill=0)
+        corner_mask_tr = corner_mask.transpose(Image.FLIP_LEFT_RIGHT)
+        corner_mask_bl = corner_mask.transpose(Image.FLIP_TOP_BOTTOM)
+        corner_mask_br = corner_mask.transpose(Image.ROTATE_180)
+
+    final_image.paste(foreground_rgb, (fg_x, fg_y))
+    del foreground_rgb
+
+    if corner_radius > 0:
+        final_image.paste(bg_tl, (fg_x, fg_y), corner_mask)
+        final_image.paste(bg_tr, (fg_x + ori_w - corner_radius, fg_y), corner_mask_tr)
+        final_image.paste(bg_bl, (fg_x, fg_y + ori_h - corner_radius), corner_mask_bl)
+        final_image.paste(bg_br, (fg_x + ori_w - corner_radius, fg_y + ori_h - corner_radius), corner_mask_br)
+        del bg_tl
+        del bg_tr
+        del bg_bl
+        del bg_br
+        del corner_mask
+        del corner_mask_tr
+        del corner_mask_bl
+        del corner_mask_br
+
+    return final_image
+
+
+def _sample_image(megapixels):
+    """3:2 横图，带渐变以便比较输出差异。"""
+    height = int(math.sqrt(megapixels * 1_000_000 / 1.5))
+    width = int(height * 1.5)
+    gradient = Image.linear_gradient("L").resize((width, height), Image.Resampling.BILINEAR)
+    return Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_90).resize((width, height)),
+                               Image.new("L", (width, height), 140)))
+
+
+def _best_of(func, image, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        if result is not None:
+            result.close()
+        start = time.perf_counter()
+        result = func(image, pad_to_even=True)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 50, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>6} {'legacy(s)':>10} {'tiled(s)':>10} {'speedup':>8} {'mean diff':>10}")
+    for megapixels in args.megapixels:
+        image = _sample_image(megapixels)
+        legacy_time, legacy = _best_of(legacy_frosted_glass_effect, image, args.repeat)
+        tiled_time, tiled = _best_of(frosted_glass.create_frosted_glass_effect, image, args.repeat)
+        diff = ImageStat.Stat(ImageChops.difference(legacy, tiled)).mean
+        print(f"{megapixels:>6g} {legacy_time:>10.3f} {tiled_time:>10.3f} "
+              f"{legacy_time / tiled_time:>7.1f}x {sum(diff) / len(diff):>10.2f}")
+        legacy.close()
+        tiled.close()
+        image.close()
+
+
+if __name__ == "__main__":
+    main()
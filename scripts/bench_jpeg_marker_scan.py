@@ -0,0 +1,86 @@
+"""JPEG marker 扫描基准：逐字节 Python 循环（旧）与正则跳扫（新）在 find_end_of_jpeg 上的耗时对比。
+
+测试数据是合成的 JPEG：随机熵编码数据（0xFF 已填充为 0xFF00），每 64KB 插入一个 RST marker。
+用法：python -m scripts.bench_jpeg_marker_scan [--sizes 5 20 80] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from media import jpeg_container  # noqa: E402
+
+_RST_INTERVAL = 64 * 1024
+
+
+def _find_next_marker_bytewise(data, off):
+    """旧实现：逐字节查找 0xFF。"""
+    n = len(data)
+    i = off
+    while i + 1 < n:
+        if data[i] == 0xFF:
+            j = i + 1
+            while j < n and data[j] == 0xFF:
+                j += 1
+            if j >= n:
+                return None
+            if data[j] == 0x00:
+                i = j + 1
+                continue
+            return (0xFF << 8) | data[j], i
+        i += 1
+    return None
+
+
+def _synthetic_jpeg(size_mb: int) -> bytes:
+    header = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sos = b"\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00"
+    entropy = os.urandom(size_mb * 1024 * 1024).replace(b"\xff", b"\xff\x00")
+    chunks = [header, sos]
+    for index, offset in enumerate(range(0, len(entropy), _RST_INTERVAL)):
+        if offset:
+            chunks.append(bytes((0xFF, 0xD0 + (index - 1) % 8)))
+        chunks.append(entropy[offset:offset + _RST_INTERVAL])
+    chunks.append(b"\xff\xd9")
+    return b"".join(chunks)
+
+
+def _best_of(repeat: int, run):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 80], help="MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    fast_scanner = jpeg_container._find_next_marker
+    print(f"{'size(MB)':>8} {'bytewise(s)':>12} {'regex(s)':>9} {'speedup':>8}")
+    for size_mb in args.sizes:
+        data = _synthetic_jpeg(size_mb)
+        try:
+            jpeg_container._find_next_marker = _find_next_marker_bytewise
+            legacy, legacy_end = _best_of(args.repeat, lambda: jpeg_container.find_end_of_jpeg(data))
+        finally:
+            jpeg_container._find_next_marker = fast_scanner
+        fast, fast_end = _best_of(args.repeat, lambda: jpeg_container.find_end_of_jpeg(data))
+        if legacy_end != fast_end:
+            print(f"mismatch at {size_mb} MB: {legacy_end} != {fast_end}", file=sys.stderr)
+            return 1
+        print(f"{size_mb:>8} {legacy:>12.3f} {fast:>9.4f} {legacy / fast:>7.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""motion photo 边框叠加基准：对比逐帧缩放静态图分辨率条带（旧）与预缩放单帧条带（新）的编码耗时。
+
+旧做法：条带按静态图分辨率写成 PNG，以 -loop 1 输入，滤镜里每帧解码 + scale 后再 overlay；
+新做法：_apply_watermark_to_video 在 Python 中把条带缩放到视频画布尺寸，作为单帧输入由 overlay 重复使用。
+需要 PATH 中有 ffmpeg / ffprobe。
+用法：python -m scripts.bench_video_overlay [--size 1920x1080] [--seconds 3] [--still-scale 2.0] [--repeat 3]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from media.video import _apply_watermark_to_video, _overlay_layout, get_encoding_profile  # noqa: E402
+from media.video_probe import probe_video  # noqa: E402
+from scripts.bench_video_profiles import _border_strips, _make_clip  # noqa: E402
+
+
+def _legacy_overlay(clip: Path, strips, output: Path, content_box, canvas_size, profile) -> None:
+    """旧管线：-loop 1 读入静态图分辨率的条带 PNG，每帧 scale 到视频画布后 overlay。"""
+    info = probe_video(clip)
+    layout = _overlay_layout(
+        (info.width, info.height), info.rotation, [box for _, box in strips], content_box, canvas_size,
+        max_dimension=profile.max_dimension,
+    )
+    disp_w, disp_h = layout.display_size
+    out_w, out_h = layout.canvas_size
+    out_left, out_top = layout.content_offset
+    command = ["ffmpeg", "-y", "-v", "error", "-noautorotate", "-i", str(clip)]
+    parts = [
+        f"[0:v]setsar=1{layout.rot_filter},scale={disp_w}:{disp_h},crop=trunc(iw/2)*2:trunc(ih/2)*2[vid]",
+        f"[vid]pad={out_w}:{out_h}:{out_left}:{out_top}:black[base0]",
+    ]
+    for index, ((image, _), (sx0, sy0, sw, sh)) in enumerate(zip(strips, layout.strip_rects)):
+        strip_path = output.parent / f"legacy_strip{index}.png"
+        image.save(strip_path, format="PNG", compress_level=1)
+        command += ["-loop", "1", "-i", str(strip_path)]
+        parts.append(f"[{index + 1}:v]scale={sw}:{sh}[wm{index}]")
+        parts.append(f"[base{index}][wm{index}]overlay={sx0}:{sy0}:shortest=1[base{index + 1}]")
+    parts.append(f"[base{len(strips)}]null[out]")
+    command += [
+        "-filter_complex", ";".join(parts),
+        "-map", "[out]", "-map", "0:a?",
+        *profile.x264_args(),
+        "-pix_fmt", "yuv420p", "-c:a", "copy",
+        str(output),
+    ]
+    subprocess.run(command, check=True, timeout=profile.timeout_seconds)
+
+
+def _best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--still-scale", type=float, default=2.0, help="静态图相对视频的分辨率倍数")
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("ffmpeg / ffprobe not found in PATH", file=sys.stderr)
+        return 1
+
+    profile = get_encoding_profile(args.profile)
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = Path(tmp)
+        clip = workspace / "clip.mp4"
+        _make_clip(clip, args.size, args.seconds)
+        info = probe_video(clip)
+        strips, content_box, canvas_size = _border_strips((info.width, info.height), args.still_scale)
+        print(f"source: {info.width}x{info.height} {info.duration:.1f}s, still canvas {canvas_size[0]}x{canvas_size[1]}, "
+              f"profile {profile.name}")
+
+        legacy = _best_of(args.repeat, lambda: _legacy_overlay(
+            clip, strips, workspace / "legacy.mp4", content_box, canvas_size, profile,
+        ))
+        prescaled = _best_of(args.repeat, lambda: _apply_watermark_to_video(
+            clip, strips, workspace / "prescaled.mp4", content_box, canvas_size, profile=profile,
+        ))
+        print(f"{'pipeline':<22} {'best(s)':>8}")
+        print(f"{'loop + per-frame scale':<22} {legacy:>8.2f}")
+        print(f"{'prescaled single frame':<22} {prescaled:>8.2f}")
+        print(f"speedup: {legacy / prescaled:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""motion photo 视频编码档位基准：对同一段测试视频按各档位叠加边框，报告编码耗时与输出大小。
+
+需要 PATH 中有 ffmpeg / ffprobe。
+用法：python -m scripts.bench_video_profiles [--size 1920x1080] [--seconds 3] [--profiles fast balanced archival]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from constants import AppConstants  # noqa: E402
+from imaging.overlay import BorderOverlay  # noqa: E402
+from media.video import _apply_watermark_to_video, get_encoding_profile  # noqa: E402
+from media.video_probe import probe_video  # noqa: E402
+
+
+def _make_clip(path: Path, size: str, seconds: float) -> None:
+    """testsrc2 画面 + 正弦音轨，用手机录像常见的 balanced 参数编码。"""
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+            "-t", str(seconds),
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+def _border_strips(video_size: tuple[int, int], still_scale: float = 1.0):
+    """与拍立得样式相近的边框：四周窄边 + 底部页脚。
+
+    still_scale > 1 模拟静态图分辨率高于视频（手机动态照片常见 4000px 静态图 + 1080p 视频）。
+    """
+    width, height = (int(round(v * still_scale)) for v in video_size)
+    border = width // 40
+    footer = height // 8
+    canvas = Image.new("RGB", (width + 2 * border, height + border + footer), "white")
+    content_box = (border, border, border + width, border + height)
+    overlay = BorderOverlay.from_canvas(canvas, content_box)
+    strips = [(strip.image, strip.box) for strip in overlay.strips]
+    return strips, content_box, overlay.canvas_size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--profiles", nargs="+", default=list(AppConstants.VIDEO_ENCODING_PROFILES))
+    args = parser.parse_args(argv)
+
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("ffmpeg / ffprobe not found in PATH", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = Path(tmp)
+        clip = workspace / "clip.mp4"
+        _make_clip(clip, args.size, args.seconds)
+        info = probe_video(clip)
+        strips, content_box, canvas_size = _border_strips((info.width, info.height))
+        print(f"source: {info.width}x{info.height} {info.codec} {info.duration:.1f}s, "
+              f"{clip.stat().st_size / 1024 / 1024:.2f} MB")
+
+        print(f"{'profile':<10} {'encode(s)':>10} {'size(MB)':>9} {'output':>11}")
+        for name in args.profiles:
+            profile = get_encoding_profile(name)
+            output = workspace / f"out_{name}.mp4"
+            start = time.perf_counter()
+            _apply_watermark_to_video(clip, strips, output, content_box, canvas_size, profile=profile)
+            elapsed = time.perf_counter() - start
+            out_info = probe_video(output)
+            print(f"{profile.name:<10} {elapsed:>10.2f} {output.stat().st_size / 1024 / 1024:>9.2f} "
+                  f"{out_info.width:>5}x{out_info.height:<5}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
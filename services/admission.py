@@ -0,0 +1,97 @@
+"""任务准入控制：排队深度与在途像素超过上限时拒绝新任务，并按近期的任务消化速度估算 Retry-After。
+
+深度与像素统计读自任务表（queued + processing），多个 Web 进程共享队列时同样有效。
+检查与入队之间没有加锁，并发提交可能略微超出上限，上限是软限制。
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from constants import AppConstants
+from probe_result import ProbeResult
+
+
+class QueueFullError(Exception):
+    """任务队列已饱和；retry_after 为建议的重试等待秒数。"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class AdmissionStatus:
+    depth: int
+    max_depth: int
+    inflight_pixels: int
+    max_inflight_pixels: int
+    # 最近 ADMISSION_DRAIN_WINDOW_SECONDS 内每秒完成的任务数
+    drain_rate: float
+    # 0~1+：深度与像素占用比例中的较大者（上限为 0 的维度不计入）
+    saturation: float
+    accepting: bool
+    reason: Optional[str] = None
+    retry_after: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _retry_after(tasks_to_drain: float, drain_rate: float) -> int:
+    if drain_rate <= 0:
+        return AppConstants.RETRY_AFTER_MAX_SECONDS
+    seconds = math.ceil(tasks_to_drain / drain_rate)
+    return max(AppConstants.RETRY_AFTER_MIN_SECONDS, min(seconds, AppConstants.RETRY_AFTER_MAX_SECONDS))
+
+
+def admission_status(state, pixels: int = 0) -> AdmissionStatus:
+    """pixels 为待提交任务的像素数；为 0 时表示只查询当前负载（就绪检查）。"""
+    window = AppConstants.ADMISSION_DRAIN_WINDOW_SECONDS
+    load = state.queue_load(window)
+    depth = load["depth"]
+    inflight_pixels = load["pixels"]
+    drain_rate = load["completed"] / window
+    max_depth = getattr(state, "max_queue_depth", AppConstants.TASK_QUEUE_MAX_DEPTH)
+    max_pixels = getattr(state, "max_inflight_pixels", AppConstants.TASK_MAX_INFLIGHT_PIXELS)
+
+    ratios = []
+    if max_depth:
+        ratios.append(depth / max_depth)
+    if max_pixels:
+        ratios.append(inflight_pixels / max_pixels)
+    saturation = round(max(ratios, default=0.0), 3)
+
+    reason = None
+    tasks_to_drain = 0.0
+    if max_depth and depth >= max_depth:
+        reason = "queue_depth"
+        tasks_to_drain = depth - max_depth + 1
+    # 队列为空时总是接收，避免单张超大图片永远无法提交
+    elif max_pixels and depth and inflight_pixels + pixels > max_pixels:
+        reason = "inflight_pixels"
+        average_pixels = inflight_pixels / depth
+        tasks_to_drain = (inflight_pixels + pixels - max_pixels) / average_pixels if average_pixels else 1
+
+    return AdmissionStatus(
+        depth=depth,
+        max_depth=max_depth,
+        inflight_pixels=inflight_pixels,
+        max_inflight_pixels=max_pixels,
+        drain_rate=round(drain_rate, 4),
+        saturation=saturation,
+        accepting=reason is None,
+        reason=reason,
+        retry_after=_retry_after(tasks_to_drain, drain_rate) if reason else None,
+    )
+
+
+def check_admission(state, probe: Optional[ProbeResult] = None) -> AdmissionStatus:
+    pixels = (probe.width or 0) * (probe.height or 0) if probe is not None else 0
+    status = admission_status(state, pixels)
+    if not status.accepting:
+        raise QueueFullError(status.reason, status.retry_after)
+    return status
@@ -0,0 +1,88 @@
+"""进程内任务事件总线：update_task 发布任务快照，/api/events 的 SSE 连接订阅。
+
+事件带单调递增的 id 并保留最近若干条，断线重连时按 Last-Event-ID 补发；历史已被覆盖时由调用方改发当前快照。
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from threading import Condition
+from typing import Any, Iterable, NamedTuple, Optional
+
+from constants import AppConstants
+
+# 推送给前端的任务字段（与 /api/status 的响应一致）
+EVENT_FIELDS = ("status", "progress", "stage", "result", "error")
+
+
+class TaskEvent(NamedTuple):
+    event_id: int
+    task_id: str
+    data: dict[str, Any]
+
+
+def task_snapshot(task: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "status": task.get("status"),
+        "progress": task.get("progress", 0.0),
+        "stage": task.get("stage"),
+        "result": task.get("result"),
+        "error": task.get("error"),
+    }
+
+
+class TaskEventBus:
+    def __init__(self, history: int = AppConstants.TASK_EVENT_HISTORY):
+        self._events: deque[TaskEvent] = deque(maxlen=history)
+        self._last_id = 0
+        self._condition = Condition()
+
+    @property
+    def last_id(self) -> int:
+        with self._condition:
+            return self._last_id
+
+    def publish(self, task_id: str, data: dict[str, Any]) -> int:
+        with self._condition:
+            self._last_id += 1
+            self._events.append(TaskEvent(self._last_id, task_id, data))
+            self._condition.notify_all()
+            return self._last_id
+
+    def can_resume(self, after_id: int) -> bool:
+        """after_id 之后的事件是否都还在历史中（否则需要补发快照）。"""
+        with self._condition:
+            if after_id > self._last_id:
+                return False
+            return not self._events or self._events[0].event_id <= after_id + 1
+
+    def _collect(self, task_ids: frozenset[str], after_id: int) -> list[TaskEvent]:
+        # 同一任务只保留最新一条：进度事件之间无需逐条补发
+        latest: dict[str, TaskEvent] = {}
+        for event in reversed(self._events):
+            if event.event_id <= after_id:
+                break
+            if event.task_id in task_ids and event.task_id not in latest:
+                latest[event.task_id] = event
+        return sorted(latest.values())
+
+    def wait(self, task_ids: Iterable[str], after_id: int, timeout: float) -> list[TaskEvent]:
+        """返回 after_id 之后这些任务的事件（每个任务合并为最新一条）；timeout 内没有事件时返回空列表。"""
+        task_ids = frozenset(task_ids)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = self._collect(task_ids, after_id)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._condition.wait(remaining)
+
+    def stats(self) -> dict[str, Optional[int]]:
+        with self._condition:
+            return {
+                "last_id": self._last_id,
+                "buffered": len(self._events),
+                "oldest_id": self._events[0].event_id if self._events else None,
+            }
@@ -0,0 +1,164 @@
+"""跨进程共享的任务队列：jobs 表与任务状态存放在同一个 STATE_DB_PATH 数据库中。
+
+Web 进程只负责入队；任意数量的 worker 进程（python -m services.worker）以租约方式领取任务：
+领取时在 BEGIN IMMEDIATE 事务内把任务标记为 running 并写入租约到期时间，处理期间由心跳续约。
+worker 崩溃后租约过期，任务会被其他 worker 重新领取；超过最大尝试次数的任务被移出队列。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, NamedTuple, Optional
+
+from constants import AppConstants
+
+
+class Job(NamedTuple):
+    job_id: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+class JobQueue:
+    def __init__(self, db_path: str, lease_seconds: float = AppConstants.JOB_LEASE_SECONDS,
+                 max_attempts: int = AppConstants.JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = Lock()
+        # 自动提交模式，事务边界由 _transaction 显式控制
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None,
+            timeout=AppConstants.JOB_DB_BUSY_TIMEOUT_SECONDS,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self.lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    payload_json TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    lease_expires_at REAL,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status_enqueued ON jobs(status, enqueued_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(lease_expires_at)"
+            )
+
+    def _transaction(self, work):
+        """在一个写事务内执行 work(conn) 并返回其结果；调用方持有 lock。"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(self._conn)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        """同一 job_id 重新入队时覆盖旧记录（如补选 logo 后再次提交）。"""
+        with self.lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO jobs(job_id, payload_json, status, enqueued_at, attempts)
+                VALUES (?, ?, 'queued', ?, 0)
+                """,
+                (job_id, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """原子地领取最早入队的任务（含租约已过期的任务），没有可领取的任务时返回 None。"""
+        def claim_one(conn):
+            now = time.time()
+            row = conn.execute(
+                """
+                SELECT job_id, payload_json, attempts FROM jobs
+                WHERE status = 'queued'
+                   OR (status = 'running' AND lease_expires_at < ? AND attempts < ?)
+                ORDER BY enqueued_at
+                LIMIT 1
+                """,
+                (now, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'running', claimed_by = ?, lease_expires_at = ?,
+                                heartbeat_at = ?, attempts = attempts + 1
+                WHERE job_id = ?
+                """,
+                (worker_id, now + self.lease_seconds, now, row["job_id"]),
+            )
+            return Job(row["job_id"], json.loads(row["payload_json"]), row["attempts"] + 1)
+
+        with self.lock:
+            return self._transaction(claim_one)
+
+    def heartbeat(self, worker_id: str) -> int:
+        """为该 worker 持有的所有任务续约，返回续约的任务数。"""
+        now = time.time()
+        with self.lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ?
+                WHERE claimed_by = ? AND status = 'running'
+                """,
+                (now + self.lease_seconds, now, worker_id),
+            )
+        return cursor.rowcount
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        """移出已处理完的任务；租约已被其他 worker 接手时返回 False。"""
+        with self.lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE job_id = ? AND claimed_by = ? AND status = 'running'",
+                (job_id, worker_id),
+            )
+        return cursor.rowcount > 0
+
+    def reap_expired(self) -> list[str]:
+        """移出租约过期且已达最大尝试次数的任务，返回其 job_id（由调用方把任务标记为失败）。"""
+        def reap(conn):
+            rows = conn.execute(
+                """
+                SELECT job_id FROM jobs
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?
+                """,
+                (time.time(), self.max_attempts),
+            ).fetchall()
+            job_ids = [row["job_id"] for row in rows]
+            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            return job_ids
+
+        with self.lock:
+            return self._transaction(reap)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS cnt FROM jobs GROUP BY status").fetchall()
+        counts = {"queued": 0, "running": 0}
+        counts.update({row["status"]: int(row["cnt"]) for row in rows})
+        return counts
+
+    def close(self) -> None:
+        with self.lock:
+            self._conn.close()
@@ -0,0 +1,151 @@
+"""像素内存预算：任务按预估峰值字节数预留额度，额度不足时阻塞等待。
+
+默认预算只在本进程的线程之间共享；进程渲染池的所有子进程共用一个 SharedMemoryBudget。
+"""
+
+import copy
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from constants import ImageConstants
+from logging_utils import get_logger
+
+logger = get_logger("autowatermark.memory_budget")
+
+
+class MemoryBudget:
+    """字节额度信号量。
+
+    单个任务的预估超过总预算时按总预算计（即独占执行），保证任何任务最终都能运行。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._cond = threading.Condition()
+        self.reserved_bytes = 0
+        self.peak_reserved_bytes = 0
+        self.active = 0
+        self.waits = 0
+
+    def acquire(self, nbytes: int, timeout: Optional[float] = None) -> int:
+        """预留 nbytes，返回实际预留的字节数（用于 release）；超时抛出 TimeoutError。"""
+        granted = max(0, min(int(nbytes), self.max_bytes))
+        with self._cond:
+            if self.reserved_bytes + granted > self.max_bytes:
+                self.waits += 1
+                logger.info(
+                    "Waiting for memory budget: need %d bytes, reserved %d/%d",
+                    granted, self.reserved_bytes, self.max_bytes,
+                )
+                if not self._cond.wait_for(lambda: self.reserved_bytes + granted <= self.max_bytes, timeout):
+                    raise TimeoutError(f"memory budget unavailable for {granted} bytes")
+            self.reserved_bytes += granted
+            self.active += 1
+            self.peak_reserved_bytes = max(self.peak_reserved_bytes, self.reserved_bytes)
+        return granted
+
+    def release(self, granted: int) -> None:
+        with self._cond:
+            self.reserved_bytes -= granted
+            self.active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes: int, timeout: Optional[float] = None) -> Iterator[int]:
+        granted = self.acquire(nbytes, timeout)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_bytes": self.max_bytes,
+                "reserved_bytes": self.reserved_bytes,
+                "peak_reserved_bytes": self.peak_reserved_bytes,
+                "active": self.active,
+                "waits": self.waits,
+            }
+
+
+def _shared_counter(index: int) -> property:
+    def getter(self) -> int:
+        return self._counters[index]
+
+    def setter(self, value: int) -> None:
+        self._counters[index] = value
+
+    return property(getter, setter)
+
+
+class SharedMemoryBudget(MemoryBudget):
+    """跨进程共享的字节额度：条件变量与计数器使用 multiprocessing 原语。
+
+    只能在创建子进程时（如 ProcessPoolExecutor 的 initargs）传给子进程。
+    每个子进程使用 with_ledger() 得到的视图，把自己持有的额度记在 ledger 中；
+    子进程崩溃后由父进程调用 reclaim(ledger) 归还，避免额度永久泄漏。
+    """
+
+    reserved_bytes = _shared_counter(0)
+    peak_reserved_bytes = _shared_counter(1)
+    active = _shared_counter(2)
+    waits = _shared_counter(3)
+
+    def __init__(self, max_bytes: int, mp_context):
+        self.max_bytes = max_bytes
+        self.mp_context = mp_context
+        self._cond = mp_context.Condition()
+        # 计数器与 ledger 都由 _cond 的锁保护，本身不需要再加锁
+        self._counters = mp_context.Array("q", 4, lock=False)
+        self._ledger = None
+
+    def new_ledger(self):
+        """[持有字节数, 持有次数]"""
+        return self.mp_context.Array("q", 2, lock=False)
+
+    def with_ledger(self, ledger) -> "SharedMemoryBudget":
+        view = copy.copy(self)
+        view._ledger = ledger
+        return view
+
+    def acquire(self, nbytes: int, timeout: Optional[float] = None) -> int:
+        # _cond 的锁是可重入的，wait 时会完全释放
+        with self._cond:
+            granted = super().acquire(nbytes, timeout)
+            if self._ledger is not None:
+                self._ledger[0] += granted
+                self._ledger[1] += 1
+        return granted
+
+    def release(self, granted: int) -> None:
+        with self._cond:
+            super().release(granted)
+            if self._ledger is not None:
+                self._ledger[0] -= granted
+                self._ledger[1] -= 1
+
+    def reclaim(self, ledger) -> int:
+        """归还已退出进程仍持有的额度，返回归还的字节数。"""
+        with self._cond:
+            nbytes, count = ledger[0], ledger[1]
+            if count:
+                self.reserved_bytes -= nbytes
+                self.active -= count
+                ledger[0] = ledger[1] = 0
+                self._cond.notify_all()
+        return nbytes
+
+
+_memory_budget = MemoryBudget(ImageConstants.PROCESS_MEMORY_BUDGET_BYTES)
+
+
+def get_memory_budget() -> MemoryBudget:
+    return _memory_budget
+
+
+def set_memory_budget(budget: MemoryBudget) -> None:
+    """替换本进程使用的预算（渲染子进程启动时换成渲染池的共享预算）。"""
+    global _memory_budget
+    _memory_budget = budget
@@ -0,0 +1,236 @@
+"""常驻子进程渲染池：把 CPU 密集的 process_image 放到独立进程执行，绕开 GIL。
+
+每个 worker 是一个单进程的 ProcessPoolExecutor（一个"槽位"）：
+- 启动时预加载字体、logo 与样式配置（热启动）；
+- 执行满 max_tasks 个任务或常驻内存超过 max_rss_bytes 后整体替换，抑制 Pillow 堆碎片；
+- 进度通过 multiprocessing.Queue 回传，由监听线程转交给调用方的回调（最终写入 AppState）；
+- 所有子进程共用一份跨进程内存预算（PROCESS_MEMORY_BUDGET_BYTES），大图任务在预留额度时排队，
+  合计的像素缓冲峰值不超过总预算。
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from constants import AppConstants, CommonConstants, ImageConstants
+from logging_utils import get_logger
+from process_result import ProcessResult
+from services.memory_budget import SharedMemoryBudget
+
+logger = get_logger("autowatermark.render_pool")
+
+# 任务结束后等待剩余进度消息的最长时间（秒）
+_PROGRESS_DRAIN_TIMEOUT = 2.0
+
+# 子进程内的进度队列（由 initializer 设置）
+_worker_progress_queue = None
+
+
+def _current_rss_bytes() -> int:
+    """当前进程的常驻内存；优先读 /proc（当前值），否则退回 getrusage（历史峰值）。"""
+    try:
+        with open("/proc/self/statm", "rb") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _init_worker(progress_queue, style_config_path: Optional[str], memory_budget) -> None:
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+
+    from imaging.font_cache import preload_fonts
+    from services.memory_budget import set_memory_budget
+    from services.watermark_styles import load_cached_watermark_styles
+
+    # 子进程重新导入模块会得到一份独立的预算，这里换成所有 worker 共用的那一份
+    set_memory_budget(memory_budget)
+
+    preload_fonts()
+    load_cached_watermark_styles(style_config_path or CommonConstants.WATERMARK_STYLE_CONFIG_PATH)
+    logger.info("Render worker %s ready", os.getpid())
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _worker_memory_budget() -> dict:
+    from services.memory_budget import get_memory_budget
+    return get_memory_budget().stats()
+
+
+def _run_in_worker(job_id: int, image_path: str, kwargs: dict):
+    from process import process_image
+
+    sent = 0
+
+    def report(progress, stage=None):
+        nonlocal sent
+        sent += 1
+        _worker_progress_queue.put((job_id, progress, stage))
+
+    result = process_image(image_path, progress_callback=report, **kwargs)
+    return result, _current_rss_bytes(), sent
+
+
+class _WorkerSlot:
+    """一个常驻 worker 进程及其已执行的任务数。"""
+
+    def __init__(self, pool: "ProcessRenderPool"):
+        # 本 worker 持有的内存额度，进程崩溃后据此归还
+        self.budget_ledger = pool.memory_budget.new_ledger()
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=pool.mp_context,
+            initializer=_init_worker,
+            initargs=(
+                pool.progress_queue, pool.style_config_path, pool.memory_budget.with_ledger(self.budget_ledger),
+            ),
+        )
+        # ProcessPoolExecutor 按需启动进程；先提交一个空任务，让 worker 在第一个真实任务到达前完成预加载
+        self.executor.submit(_worker_pid)
+        self.tasks = 0
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.executor.shutdown(wait=wait)
+
+
+class ProcessRenderPool:
+    """固定数量的常驻渲染进程；run() 在调用线程中阻塞直到结果返回。"""
+
+    def __init__(self, max_workers: int = AppConstants.EXECUTOR_MAX_WORKERS,
+                 max_tasks: int = AppConstants.PROCESS_WORKER_MAX_TASKS,
+                 max_rss_bytes: int = AppConstants.PROCESS_WORKER_MAX_RSS_BYTES,
+                 style_config_path: Optional[str] = None,
+                 start_method: str = AppConstants.PROCESS_WORKER_START_METHOD,
+                 memory_budget_bytes: int = ImageConstants.PROCESS_MEMORY_BUDGET_BYTES):
+        self.max_workers = max_workers
+        self.max_tasks = max_tasks
+        self.max_rss_bytes = max_rss_bytes
+        self.style_config_path = style_config_path
+        self.mp_context = multiprocessing.get_context(start_method)
+        self.progress_queue = self.mp_context.Queue()
+        self.memory_budget = SharedMemoryBudget(memory_budget_bytes, self.mp_context)
+
+        # job_id -> [回调, 已转交的进度条数]
+        self._callbacks: dict[int, list] = {}
+        self._callbacks_cond = threading.Condition()
+        self._job_ids = itertools.count(1)
+        self._stats_lock = threading.Lock()
+        self.recycled_workers = 0
+        self.completed_tasks = 0
+
+        self._idle: "queue.Queue[_WorkerSlot]" = queue.Queue()
+        for _ in range(max_workers):
+            self._idle.put(_WorkerSlot(self))
+
+        self._closed = False
+        self._listener = threading.Thread(target=self._relay_progress, name="render-pool-progress", daemon=True)
+        self._listener.start()
+
+    def _relay_progress(self) -> None:
+        while True:
+            message = self.progress_queue.get()
+            if message is None:
+                return
+            job_id, progress, stage = message
+            # 持锁调用：任务结束注销回调后，迟到的进度消息不会再覆盖最终状态
+            with self._callbacks_cond:
+                entry = self._callbacks.get(job_id)
+                if entry is None:
+                    continue
+                try:
+                    entry[0](progress, stage)
+                except Exception:
+                    logger.exception("Progress callback failed for render job %s", job_id)
+                entry[1] += 1
+                self._callbacks_cond.notify_all()
+
+    def run(self, image_path: str, progress_callback: Optional[Callable] = None, **kwargs) -> ProcessResult:
+        """在 worker 进程中执行 process_image(image_path, **kwargs)；异常（含 WatermarkError）原样抛出。"""
+        if self._closed:
+            raise RuntimeError("render pool is shut down")
+        job_id = next(self._job_ids)
+        if progress_callback is not None:
+            with self._callbacks_cond:
+                self._callbacks[job_id] = [progress_callback, 0]
+
+        slot = self._idle.get()
+        recycle = False
+        try:
+            future = slot.executor.submit(_run_in_worker, job_id, image_path, kwargs)
+            try:
+                result, rss_bytes, sent = future.result()
+            except BrokenProcessPool:
+                # worker 进程崩溃（例如被 OOM killer 杀掉）时替换槽位并归还它持有的额度；普通任务异常不影响 worker
+                recycle = True
+                reclaimed = self.memory_budget.reclaim(slot.budget_ledger)
+                if reclaimed:
+                    logger.warning("Reclaimed %.1f MB of memory budget from a crashed render worker",
+                                   reclaimed / 1024 / 1024)
+                raise
+            slot.tasks += 1
+            recycle = slot.tasks >= self.max_tasks or rss_bytes >= self.max_rss_bytes
+            if recycle:
+                logger.info(
+                    "Recycling render worker after %d tasks (rss=%.1f MB)",
+                    slot.tasks, rss_bytes / 1024 / 1024,
+                )
+            with self._stats_lock:
+                self.completed_tasks += 1
+            self._drain_progress(job_id, sent)
+            return result
+        finally:
+            with self._callbacks_cond:
+                self._callbacks.pop(job_id, None)
+            if self._closed:
+                slot.shutdown(wait=False)
+            else:
+                if recycle:
+                    slot.shutdown(wait=False)
+                    slot = _WorkerSlot(self)
+                    with self._stats_lock:
+                        self.recycled_workers += 1
+                self._idle.put(slot)
+
+    def _drain_progress(self, job_id: int, sent: int) -> None:
+        """等监听线程把该任务的进度全部转交完（结果与进度走不同管道，到达顺序不确定）。"""
+        with self._callbacks_cond:
+            entry = self._callbacks.get(job_id)
+            if entry is None:
+                return
+            if not self._callbacks_cond.wait_for(lambda: entry[1] >= sent, timeout=_PROGRESS_DRAIN_TIMEOUT):
+                logger.warning("Render job %s finished before %d progress updates arrived", job_id, sent - entry[1])
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "workers": self.max_workers,
+                "idle_workers": self._idle.qsize(),
+                "completed_tasks": self.completed_tasks,
+                "recycled_workers": self.recycled_workers,
+                "memory_budget": self.memory_budget.stats(),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        slots = []
+        while True:
+            try:
+                slots.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for slot in slots:
+            slot.shutdown(wait=wait)
+        self.progress_queue.put(None)
+        if wait:
+            self._listener.join(timeout=5)
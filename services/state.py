@@ -4,10 +4,12 @@ import json
 import sqlite3
 import time
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from threading import Event, Lock, Thread, Timer
 from typing import Any, Optional
 
 from constants import AppConstants
+from services.events import TaskEventBus, task_snapshot
+from services.job_queue import JobQueue
 
 
 _TASK_COLUMNS = {
@@ -28,13 +30,20 @@ _TASK_COLUMNS = {
     "preliminary_manufacturer",
     "preserve_motion",
     "preserve_hdr",
+    "probe",
 }
 
+# 只改这些字段的更新延迟写回（内存立即生效），其余更新立即落库
+_DEFERRED_FIELDS = {"progress", "stage"}
+_TERMINAL_STATUSES = {"succeeded", "failed"}
+_TASK_QUEUE_BACKENDS = {"local", "sqlite"}
+
 _OPTION_COLUMNS = {
     "features_json": "TEXT",
     "preliminary_manufacturer": "TEXT",
     "preserve_motion": "INTEGER",
     "preserve_hdr": "INTEGER",
+    "probe_json": "TEXT",
 }
 
 
@@ -42,6 +51,19 @@ def _executor_factory() -> ThreadPoolExecutor:
     return ThreadPoolExecutor(max_workers=AppConstants.EXECUTOR_MAX_WORKERS)
 
 
+def _render_pool_factory(backend: str, style_config_path: Optional[str]):
+    """backend 为 "process" 时创建常驻子进程渲染池；"thread" 时返回 None（在任务线程内直接渲染）。"""
+    if backend == "thread":
+        return None
+    if backend != "process":
+        raise ValueError(f"Unknown executor backend: {backend}")
+    from services.render_pool import ProcessRenderPool
+    return ProcessRenderPool(
+        max_workers=AppConstants.EXECUTOR_MAX_WORKERS,
+        style_config_path=style_config_path,
+    )
+
+
 def _metrics_factory() -> dict:
     return {
         "total_tasks": 0,
@@ -51,8 +73,21 @@ def _metrics_factory() -> dict:
 
 
 class AppState:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, executor_backend: str = AppConstants.EXECUTOR_BACKEND,
+                 style_config_path: Optional[str] = None,
+                 video_profile: str = AppConstants.VIDEO_ENCODING_PROFILE,
+                 task_queue: str = AppConstants.TASK_QUEUE_BACKEND,
+                 max_queue_depth: int = AppConstants.TASK_QUEUE_MAX_DEPTH,
+                 max_inflight_pixels: int = AppConstants.TASK_MAX_INFLIGHT_PIXELS,
+                 max_event_streams: int = AppConstants.SSE_MAX_STREAMS):
+        if task_queue not in _TASK_QUEUE_BACKENDS:
+            raise ValueError(f"Unknown task queue backend: {task_queue}")
         self.db_path = db_path
+        # motion photo 视频的默认编码档位（排队过深时任务会临时改用 fast 档）
+        self.video_profile = video_profile
+        # 准入上限（见 services.admission）
+        self.max_queue_depth = max_queue_depth
+        self.max_inflight_pixels = max_inflight_pixels
         self.burn_queue: dict[str, float] = {}
         self.tasks: dict[str, dict[str, Any]] = {}
 
@@ -60,13 +95,33 @@ class AppState:
         self.metrics_lock = Lock()
         self.tasks_lock = Lock()
         self.db_lock = Lock()
+        # 待写回的进度 / 阶段更新：task_id -> 合并后的字段
+        self.pending_updates: dict[str, dict[str, Any]] = {}
+        self.pending_lock = Lock()
+        self._flush_timer: Optional[Timer] = None
+        # 任务变化推送给 /api/events 的 SSE 连接
+        self.events = TaskEventBus()
+        # 当前打开的 /api/events 连接数
+        self.max_event_streams = max_event_streams
+        self.event_streams = 0
+        self.event_streams_lock = Lock()
+        # sqlite 模式下由 sync_task_updates 把其他进程写入的任务变化同步到内存与事件总线
+        self._synced_at = time.time()
+        self._sync_stop = Event()
+        self._sync_thread: Optional[Thread] = None
 
         self.metrics = _metrics_factory()
         self.executor = _executor_factory()
+        # 任务线程只负责调度与状态更新，渲染本身可交给子进程池
+        self.render_pool = _render_pool_factory(executor_backend, style_config_path)
 
-        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, timeout=AppConstants.JOB_DB_BUSY_TIMEOUT_SECONDS,
+        )
         self._conn.row_factory = sqlite3.Row
         self._init_db()
+        # "sqlite"：任务进入共享队列，由任意 worker 进程执行；"local"：在本进程的 executor 中执行
+        self.job_queue = JobQueue(self.db_path) if task_queue == "sqlite" else None
         self._hydrate_from_db()
 
     def _init_db(self) -> None:
@@ -100,6 +155,9 @@ class AppState:
             self._conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_tasks_submitted_at ON tasks(submitted_at)"
             )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks(updated_at)"
+            )
             existing_columns = {
                 row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)").fetchall()
             }
@@ -137,6 +195,7 @@ class AppState:
             "preliminary_manufacturer": row["preliminary_manufacturer"],
             "preserve_motion": None if row["preserve_motion"] is None else bool(row["preserve_motion"]),
             "preserve_hdr": None if row["preserve_hdr"] is None else bool(row["preserve_hdr"]),
+            "probe": json.loads(row["probe_json"]) if row["probe_json"] else None,
         }
         return task
 
@@ -153,11 +212,13 @@ class AppState:
                 (now,),
             ).fetchall()
 
+        # 共享队列中的任务由 worker 继续执行（崩溃的 worker 由租约过期接手），重启不视为中断
+        fail_unfinished = self.job_queue is None
         interrupted = 0
         with self.tasks_lock:
             for row in rows:
                 task = self._row_to_task(row)
-                if task["status"] in ("queued", "processing", "needs_logo", "needs_options"):
+                if fail_unfinished and task["status"] in ("queued", "processing", "needs_logo", "needs_options"):
                     task["status"] = "failed"
                     task["error"] = "服务重启导致任务中断"
                     task["stage"] = "failed"
@@ -197,6 +258,7 @@ class AppState:
             "preliminary_manufacturer": initial_data.get("preliminary_manufacturer"),
             "preserve_motion": initial_data.get("preserve_motion"),
             "preserve_hdr": initial_data.get("preserve_hdr"),
+            "probe": initial_data.get("probe"),
         }
         with self.tasks_lock:
             self.tasks[task_id] = dict(payload)
@@ -208,8 +270,9 @@ class AppState:
                     task_id, status, submitted_at, updated_at, progress, stage,
                     result_json, error, filepath, lang, watermark_type,
                     image_quality, burn_after_read, logo_preference,
-                    features_json, preliminary_manufacturer, preserve_motion, preserve_hdr
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    features_json, preliminary_manufacturer, preserve_motion, preserve_hdr,
+                    probe_json
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     task_id,
@@ -230,26 +293,91 @@ class AppState:
                     payload["preliminary_manufacturer"],
                     None if payload["preserve_motion"] is None else int(bool(payload["preserve_motion"])),
                     None if payload["preserve_hdr"] is None else int(bool(payload["preserve_hdr"])),
+                    json.dumps(payload["probe"], ensure_ascii=False) if payload["probe"] is not None else None,
                 ),
             )
             self._conn.commit()
 
     def update_task(self, task_id: str, **fields: Any) -> None:
+        """内存中的任务立即更新；进度 / 阶段变化合并后批量写回，其余字段（含终态）立即落库。"""
         allowed_fields = {k: v for k, v in fields.items() if k in _TASK_COLUMNS}
         if not allowed_fields:
             return
 
-        now = time.time()
-        allowed_fields["updated_at"] = now
+        allowed_fields["updated_at"] = time.time()
+
+        with self.tasks_lock:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                task.update(allowed_fields)
+                snapshot = task_snapshot(task)
+        if task is not None:
+            self.events.publish(task_id, snapshot)
+
+        if task is not None and allowed_fields.keys() <= _DEFERRED_FIELDS | {"updated_at"}:
+            with self.pending_lock:
+                self.pending_updates.setdefault(task_id, {}).update(allowed_fields)
+                if self._flush_timer is None:
+                    self._flush_timer = Timer(AppConstants.TASK_PROGRESS_FLUSH_SECONDS, self.flush_pending_updates)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            return
+
+        durable = allowed_fields.get("status") in _TERMINAL_STATUSES
+        with self.db_lock:
+            with self.pending_lock:
+                merged = self.pending_updates.pop(task_id, {})
+            merged.update(allowed_fields)
+            # 终态同步刷盘；普通状态变化沿用 WAL + NORMAL
+            self._write_task_updates({task_id: merged}, synchronous="FULL" if durable else "NORMAL")
+            if task is None:
+                row = self._conn.execute(
+                    "SELECT * FROM tasks WHERE task_id = ?",
+                    (task_id,),
+                ).fetchone()
+            else:
+                row = None
 
+        if row is not None:
+            task = self._row_to_task(row)
+            with self.tasks_lock:
+                self.tasks[task_id] = task
+            self.events.publish(task_id, task_snapshot(task))
+
+    def flush_pending_updates(self) -> int:
+        """把合并后的进度 / 阶段更新在一个事务内写回（不等待 fsync），返回写回的任务数。"""
+        with self.db_lock:
+            with self.pending_lock:
+                batch, self.pending_updates = self.pending_updates, {}
+                self._flush_timer = None
+            if batch:
+                self._write_task_updates(batch, synchronous="OFF")
+        return len(batch)
+
+    def _write_task_updates(self, batch: dict[str, dict[str, Any]], synchronous: str) -> None:
+        """调用方持有 db_lock。"""
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        try:
+            for task_id, task_fields in batch.items():
+                sql_fields, sql_values = self._task_assignments(task_fields)
+                self._conn.execute(
+                    f"UPDATE tasks SET {', '.join(sql_fields)} WHERE task_id = ?",
+                    (*sql_values, task_id),
+                )
+            self._conn.commit()
+        finally:
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    @staticmethod
+    def _task_assignments(task_fields: dict[str, Any]) -> tuple[list[str], list[Any]]:
         sql_fields = []
         sql_values = []
-        for key, value in allowed_fields.items():
+        for key, value in task_fields.items():
             if key == "result":
                 sql_fields.append("result_json = ?")
                 sql_values.append(json.dumps(value, ensure_ascii=False) if value is not None else None)
-            elif key == "features":
-                sql_fields.append("features_json = ?")
+            elif key in {"features", "probe"}:
+                sql_fields.append(f"{key}_json = ?")
                 sql_values.append(json.dumps(value, ensure_ascii=False) if value is not None else None)
             elif key in {"preserve_motion", "preserve_hdr"}:
                 sql_fields.append(f"{key} = ?")
@@ -257,23 +385,7 @@ class AppState:
             else:
                 sql_fields.append(f"{key} = ?")
                 sql_values.append(value)
-        sql_values.append(task_id)
-
-        with self.db_lock:
-            self._conn.execute(
-                f"UPDATE tasks SET {', '.join(sql_fields)} WHERE task_id = ?",
-                tuple(sql_values),
-            )
-            self._conn.commit()
-            row = self._conn.execute(
-                "SELECT * FROM tasks WHERE task_id = ?",
-                (task_id,),
-            ).fetchone()
-
-        if row is not None:
-            task = self._row_to_task(row)
-            with self.tasks_lock:
-                self.tasks[task_id] = task
+        return sql_fields, sql_values
 
     def get_task(self, task_id: str) -> Optional[dict]:
         with self.tasks_lock:
@@ -293,6 +405,61 @@ class AppState:
             self.tasks[task_id] = task
         return dict(task)
 
+    def acquire_event_stream(self) -> bool:
+        """占用一个 SSE 连接名额；已达上限时返回 False。"""
+        with self.event_streams_lock:
+            if self.event_streams >= self.max_event_streams:
+                return False
+            self.event_streams += 1
+            return True
+
+    def release_event_stream(self) -> None:
+        with self.event_streams_lock:
+            self.event_streams = max(0, self.event_streams - 1)
+
+    def evict_task(self, task_id: str) -> None:
+        """从内存中移除任务（数据库记录保留）；worker 处理完任务后调用，避免缓存无限增长。"""
+        with self.tasks_lock:
+            self.tasks.pop(task_id, None)
+
+    def sync_task_updates(self) -> int:
+        """把其他进程（worker）写入数据库的任务变化同步到内存并发布事件，返回变化的任务数。"""
+        with self.db_lock:
+            rows = self._conn.execute(
+                "SELECT * FROM tasks WHERE updated_at > ?",
+                (self._synced_at - AppConstants.TASK_SYNC_LOOKBACK_SECONDS,),
+            ).fetchall()
+
+        changed = 0
+        for row in rows:
+            task_id = row["task_id"]
+            with self.tasks_lock:
+                cached = self.tasks.get(task_id)
+                if cached is not None and cached.get("updated_at", 0) >= row["updated_at"]:
+                    continue
+                task = self._row_to_task(row)
+                self.tasks[task_id] = task
+                snapshot = task_snapshot(task)
+            self._synced_at = max(self._synced_at, row["updated_at"])
+            self.events.publish(task_id, snapshot)
+            changed += 1
+        return changed
+
+    def start_task_sync(self, interval: float = AppConstants.TASK_SYNC_INTERVAL_SECONDS) -> None:
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while not self._sync_stop.wait(interval):
+                try:
+                    self.sync_task_updates()
+                except sqlite3.Error:
+                    # 数据库暂时被锁等错误在下一轮重试
+                    continue
+
+        self._sync_thread = Thread(target=run, name="task-sync", daemon=True)
+        self._sync_thread.start()
+
     def count_tasks_by_status(self, *statuses: str) -> int:
         if not statuses:
             return 0
@@ -304,6 +471,27 @@ class AppState:
             ).fetchone()
         return int(row["cnt"]) if row else 0
 
+    def queue_load(self, window_seconds: float) -> dict[str, int]:
+        """排队 + 处理中的任务数与总像素（来自上传阶段的探测结果），以及最近 window_seconds 内结束的任务数。"""
+        since = time.time() - window_seconds
+        with self.db_lock:
+            active = self._conn.execute(
+                """
+                SELECT COUNT(*) AS cnt,
+                       COALESCE(SUM(json_extract(probe_json, '$.width') * json_extract(probe_json, '$.height')), 0) AS pixels
+                FROM tasks WHERE status IN ('queued', 'processing')
+                """
+            ).fetchone()
+            completed = self._conn.execute(
+                "SELECT COUNT(*) AS cnt FROM tasks WHERE status IN ('succeeded', 'failed') AND updated_at >= ?",
+                (since,),
+            ).fetchone()
+        return {
+            "depth": int(active["cnt"]),
+            "pixels": int(active["pixels"]),
+            "completed": int(completed["cnt"]),
+        }
+
     def cleanup_old_tasks(self, current_time: Optional[float] = None) -> int:
         now = current_time or time.time()
         threshold = now - AppConstants.TASK_RETENTION_SECONDS
@@ -314,6 +502,9 @@ class AppState:
                 if now - info.get("submitted_at", 0) > AppConstants.TASK_RETENTION_SECONDS:
                     removed_ids.append(task_id)
                     self.tasks.pop(task_id, None)
+        with self.pending_lock:
+            for task_id in removed_ids:
+                self.pending_updates.pop(task_id, None)
 
         with self.db_lock:
             cursor = self._conn.execute("DELETE FROM tasks WHERE submitted_at < ?", (threshold,))
@@ -352,6 +543,15 @@ class AppState:
         return expired
 
     def shutdown(self, wait: bool = True) -> None:
+        self._sync_stop.set()
         self.executor.shutdown(wait=wait)
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=wait)
+        with self.pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+        self.flush_pending_updates()
+        if self.job_queue is not None:
+            self.job_queue.close()
         with self.db_lock:
             self._conn.close()
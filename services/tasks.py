@@ -7,11 +7,13 @@ from typing import Optional, Set
 from PIL import Image
 import piexif
 
-from constants import CommonConstants
+from constants import AppConstants, CommonConstants
 from errors import WatermarkError, WatermarkErrorCode
 from exif import get_exif_data_with_exiftool, get_manufacturer
+from probe_result import ProbeResult
 from process import process_image
 from process_result import ProcessResult
+from services.admission import check_admission
 from services.download_token import build_signed_url
 from services.i18n import get_error_message
 
@@ -32,6 +34,28 @@ class TaskPayload:
     preliminary_manufacturer: Optional[str] = None
     preserve_motion: bool = True
     preserve_hdr: bool = True
+    probe: Optional[ProbeResult] = None
+
+    def to_job(self) -> dict:
+        """写入共享队列的可序列化部分；state / style_config / logger 由执行任务的 worker 进程提供。"""
+        return {
+            "filepath": self.filepath,
+            "lang": self.lang,
+            "watermark_type": self.watermark_type,
+            "image_quality": self.image_quality,
+            "burn_after_read": self.burn_after_read,
+            "logo_preference": self.logo_preference,
+            "preliminary_manufacturer": self.preliminary_manufacturer,
+            "preserve_motion": self.preserve_motion,
+            "preserve_hdr": self.preserve_hdr,
+            "probe": self.probe.to_dict() if self.probe is not None else None,
+        }
+
+    @classmethod
+    def from_job(cls, task_id: str, job: dict, state, style_config, logger) -> "TaskPayload":
+        fields = dict(job)
+        fields["probe"] = ProbeResult.from_dict(fields.get("probe"))
+        return cls(task_id=task_id, state=state, style_config=style_config, logger=logger, **fields)
 
 
 def allowed_file(filename: str, allowed_extensions: Set[str]) -> bool:
@@ -44,7 +68,12 @@ def cleanup_old_tasks(state) -> None:
     state.cleanup_old_tasks(current_time=time.time())
 
 
-def detect_manufacturer(filepath: str, logger=None):
+def detect_manufacturer(source, logger=None):
+    """source 可以是文件路径，或上传阶段已得到的 ProbeResult（直接复用，不再解析文件）。"""
+    if isinstance(source, ProbeResult):
+        return source.manufacturer
+
+    filepath = source
     try:
         with Image.open(filepath) as image:
             exif_bytes = image.info.get("exif")
@@ -65,6 +94,17 @@ def normalize_image_quality(image_quality: str) -> int:
     return CommonConstants.IMAGE_QUALITY_MAP.get(image_quality, CommonConstants.IMAGE_QUALITY_MAP["low"])
 
 
+def select_video_profile(state, probe: Optional[ProbeResult] = None) -> Optional[str]:
+    """motion photo 的视频编码档位：排队任务达到阈值时改用 fast 档，缩短每个任务的编码时间。"""
+    configured = getattr(state, "video_profile", None)
+    if probe is not None and not probe.is_motion:
+        return configured
+    threshold = AppConstants.VIDEO_FAST_PROFILE_QUEUE_DEPTH
+    if threshold and state.count_tasks_by_status("queued") >= threshold:
+        return "fast"
+    return configured
+
+
 def _update_queue_metrics(state, task_id: str, logger) -> None:
     with state.metrics_lock:
         state.metrics["total_tasks"] += 1
@@ -110,18 +150,27 @@ def _submit_task_with_id(task_id: str, payload: TaskPayload) -> None:
         preliminary_manufacturer=payload.preliminary_manufacturer,
         preserve_motion=payload.preserve_motion,
         preserve_hdr=payload.preserve_hdr,
+        probe=payload.probe.to_dict() if payload.probe is not None else None,
     )
     _update_queue_metrics(state, task_id, payload.logger)
-    state.executor.submit(background_process, payload)
+    job_queue = getattr(state, "job_queue", None)
+    if job_queue is not None:
+        job_queue.enqueue(task_id, payload.to_job())
+    else:
+        state.executor.submit(background_process, payload)
 
 
 def submit_task(payload: TaskPayload) -> str:
+    """队列饱和时抛出 QueueFullError，不创建任务。"""
+    check_admission(payload.state, payload.probe)
     task_id = create_task(payload.state)
     _submit_task_with_id(task_id, payload)
     return task_id
 
 
 def submit_existing_task(task_id: str, payload: TaskPayload) -> str:
+    """队列饱和时抛出 QueueFullError，任务保持原状态，可稍后重新确认。"""
+    check_admission(payload.state, payload.probe)
     _submit_task_with_id(task_id, payload)
     return task_id
 
@@ -139,6 +188,7 @@ def background_process(payload: TaskPayload) -> None:
     logger = payload.logger
 
     start_time = time.time()
+    peak_bytes = 0
     try:
         state.update_task(task_id, status="processing", stage="processing", progress=0.01)
 
@@ -152,7 +202,11 @@ def background_process(payload: TaskPayload) -> None:
                 updates["stage"] = stage
             state.update_task(task_id, **updates)
 
-        result = process_image(
+        render = process_image
+        render_pool = getattr(state, "render_pool", None)
+        if render_pool is not None:
+            render = render_pool.run
+        result = render(
             filepath,
             lang=lang,
             watermark_type=watermark_type,
@@ -163,10 +217,13 @@ def background_process(payload: TaskPayload) -> None:
             preliminary_manufacturer=payload.preliminary_manufacturer,
             preserve_motion=payload.preserve_motion,
             preserve_hdr=payload.preserve_hdr,
+            probe=payload.probe,
+            video_profile=select_video_profile(state, payload.probe),
         )
 
         is_motion = result.is_motion
         is_hdr = result.is_hdr
+        peak_bytes = result.peak_bytes
 
         filename = os.path.basename(filepath)
         original_name, extension = os.path.splitext(filename)
@@ -258,9 +315,10 @@ def background_process(payload: TaskPayload) -> None:
             failure_rate = (failed / total) if total else 0
         queue_length = state.count_tasks_by_status("queued", "processing")
         logger.info(
-            "Task %s finished in %.2f s | queue=%s | failure_rate=%.2f%%",
+            "Task %s finished in %.2f s | queue=%s | failure_rate=%.2f%% | peak=%.1f MB",
             task_id,
             duration,
             queue_length,
             failure_rate * 100,
+            peak_bytes / 1024 / 1024,
         )
@@ -0,0 +1,179 @@
+"""独立任务 worker：从共享队列（STATE_DB_PATH 数据库中的 jobs 表）领取任务并执行。
+
+Web 进程以 TASK_QUEUE_BACKEND=sqlite 启动时只负责入队，同一主机上可运行任意数量的 worker：
+    python -m services.worker [--db PATH] [--concurrency 4] [--worker-id NAME]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import uuid
+from typing import Optional
+
+from constants import AppConstants, CommonConstants
+from imaging.font_cache import preload_fonts
+from logging_utils import get_logger
+from services.download_token import ensure_secret_configured
+from services.i18n import get_error_message
+from services.state import AppState
+from services.tasks import TaskPayload, background_process
+from services.watermark_styles import load_cached_watermark_styles
+
+
+def default_db_path() -> str:
+    """与 Web 进程一致：优先 STATE_DB_PATH，否则为 UPLOAD_FOLDER 下的默认文件。"""
+    db_path = os.environ.get("STATE_DB_PATH")
+    if db_path:
+        return db_path
+    upload_folder = os.environ.get("UPLOAD_FOLDER", AppConstants.UPLOAD_FOLDER)
+    return os.path.join(upload_folder, AppConstants.STATE_DB_FILENAME)
+
+
+class TaskWorker:
+    """concurrency 个线程各自循环领取并执行任务；另有一个线程为持有的任务续约并清理放弃的任务。"""
+
+    def __init__(self, state: AppState, style_config, logger, worker_id: Optional[str] = None,
+                 concurrency: int = AppConstants.EXECUTOR_MAX_WORKERS,
+                 poll_interval: float = AppConstants.JOB_POLL_INTERVAL_SECONDS,
+                 heartbeat_interval: float = AppConstants.JOB_HEARTBEAT_SECONDS):
+        if state.job_queue is None:
+            raise ValueError("TaskWorker requires an AppState created with task_queue='sqlite'")
+        self.state = state
+        self.queue = state.job_queue
+        self.style_config = style_config
+        self.logger = logger
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def run_once(self) -> bool:
+        """领取并执行一个任务；队列为空时返回 False。"""
+        job = self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+        if job.attempts > 1:
+            self.logger.warning("Retrying task %s after lease expiry (attempt %d)", job.job_id, job.attempts)
+        try:
+            payload = TaskPayload.from_job(job.job_id, job.payload, self.state, self.style_config, self.logger)
+        except Exception:
+            # 载荷缺字段或类型不对（如 Web 与 worker 版本不一致）：重试也不会成功，直接标记失败
+            self.logger.exception("Task %s has an invalid job payload", job.job_id)
+            self._fail_task(job.job_id)
+            self.queue.complete(job.job_id, self.worker_id)
+            self.state.evict_task(job.job_id)
+            return True
+        try:
+            background_process(payload)
+        finally:
+            self.queue.complete(job.job_id, self.worker_id)
+            self.state.evict_task(job.job_id)
+        return True
+
+    def fail_abandoned_jobs(self) -> list[str]:
+        """租约多次过期（执行它的 worker 反复崩溃）的任务不再重试，直接标记为失败。"""
+        abandoned = self.queue.reap_expired()
+        for task_id in abandoned:
+            self._fail_task(task_id)
+            self.state.evict_task(task_id)
+            self.logger.error("Task %s abandoned after %d attempts", task_id, self.queue.max_attempts)
+        return abandoned
+
+    def _fail_task(self, task_id: str) -> None:
+        task = self.state.get_task(task_id) or {}
+        self.state.update_task(
+            task_id,
+            status="failed",
+            error=get_error_message("unexpected_error", task.get("lang") or "zh"),
+            progress=1.0,
+            stage="failed",
+        )
+
+    def _work_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                busy = self.run_once()
+            except sqlite3.Error:
+                self.logger.warning("Job queue unavailable, retrying", exc_info=True)
+                busy = False
+            except Exception:
+                # 单个任务的意外错误不能让线程退出，否则 worker 的并发会逐渐耗尽
+                self.logger.exception("Unexpected error in job worker loop")
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(self.worker_id)
+                self.fail_abandoned_jobs()
+            except sqlite3.Error:
+                self.logger.warning("Job heartbeat failed, retrying", exc_info=True)
+
+    def start(self) -> None:
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f"job-worker-{index}", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """不再领取新任务；正在执行的任务会执行完。"""
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待 stop() 被调用；返回是否已停止。"""
+        return self._stop.wait(timeout)
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=default_db_path(), help="与 Web 进程相同的 STATE_DB_PATH")
+    parser.add_argument("--concurrency", type=int, default=AppConstants.EXECUTOR_MAX_WORKERS)
+    parser.add_argument("--worker-id", default=None, help="默认为 主机名:pid:随机后缀")
+    args = parser.parse_args(argv)
+
+    logger = get_logger("autowatermark.worker")
+    ensure_secret_configured()
+    style_config = load_cached_watermark_styles(CommonConstants.WATERMARK_STYLE_CONFIG_PATH)
+    preload_fonts()
+    state = AppState(
+        args.db,
+        executor_backend=os.environ.get("EXECUTOR_BACKEND", AppConstants.EXECUTOR_BACKEND),
+        style_config_path=CommonConstants.WATERMARK_STYLE_CONFIG_PATH,
+        video_profile=os.environ.get("VIDEO_ENCODING_PROFILE", AppConstants.VIDEO_ENCODING_PROFILE),
+        task_queue="sqlite",
+    )
+    worker = TaskWorker(state, style_config, logger, worker_id=args.worker_id, concurrency=args.concurrency)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+
+    worker.start()
+    logger.info("Worker %s started | db=%s | concurrency=%d", worker.worker_id, args.db, worker.concurrency)
+    # 主线程在可中断的等待中处理信号
+    while not worker.wait(1.0):
+        pass
+    logger.info("Worker %s stopping, waiting for running tasks", worker.worker_id)
+    worker.join()
+    state.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
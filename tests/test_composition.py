@@ -0,0 +1,150 @@
+import threading
+from pathlib import Path
+
+import piexif
+import pytest
+from PIL import Image, ImageChops
+
+import process as process_module
+from constants import CommonConstants
+from imaging import generate_watermark_image
+from imaging.composition import CompositionPlan, oriented_size
+from services.memory_budget import MemoryBudget
+from services.watermark_styles import load_watermark_styles
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOGO_PATH = str(PROJECT_ROOT / "logos" / "canon.png")
+STYLE_CONFIG = load_watermark_styles(str(PROJECT_ROOT / "config" / "watermark_styles.toml"))
+
+
+def _generate(source, watermark_type, **kwargs):
+    return generate_watermark_image(
+        source,
+        logo_path=LOGO_PATH,
+        camera_info=["RF24-70mm F2.8 L IS USM", "EOS R5"],
+        shooting_info=["35mm  ƒ/2.8  1/125s  ISO200", "2026.03.07 12:00:00"],
+        font_path_thin=CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+        font_path_bold=CommonConstants.GLOBAL_FONT_PATH_BOLD,
+        watermark_type=watermark_type,
+        font_path_regular=CommonConstants.GLOBAL_FONT_PATH_MONO,
+        font_path_symbol=CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+        style_config=STYLE_CONFIG,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("watermark_type", [1, 2, 3, 5])
+def test_every_layout_allocates_an_even_canvas_and_keeps_the_photo(watermark_type):
+    source = Image.new("RGB", (401, 301), "#4a7391")
+    source.putpixel((0, 0), (255, 0, 0))
+
+    rendered, metadata = _generate(source, watermark_type, return_metadata=True)
+
+    assert rendered.width % 2 == 0 and rendered.height % 2 == 0
+    assert metadata["final_size"] == rendered.size
+    x0, y0, x1, y1 = metadata["content_box"]
+    assert (x1 - x0, y1 - y0) == source.size
+    assert ImageChops.difference(rendered.crop((x0, y0, x1, y1)), source).getbbox() is None
+    overlay = metadata["overlay"].to_image()
+    assert overlay.getpixel((x0, y0))[3] == 0
+    assert overlay.getpixel((overlay.width - 1, overlay.height - 1))[3] == 255
+
+
+def test_frosted_background_is_allocated_at_even_size():
+    # 布局尺寸为 439x345，补齐的一列/一行填白
+    source = Image.new("RGB", (402, 300), "#4a7391")
+
+    rendered = _generate(source, 4)
+
+    assert rendered.size == (440, 346)
+    assert rendered.getpixel((439, 0)) == (255, 255, 255)
+    assert rendered.getpixel((0, 345)) == (255, 255, 255)
+
+
+def test_release_origin_frees_source_after_composition():
+    kept = Image.new("RGB", (400, 300), "#4a7391")
+    released = Image.new("RGB", (400, 300), "#4a7391")
+
+    _generate(kept, 3)
+    _generate(released, 3, release_origin=True)
+
+    assert kept.getpixel((0, 0)) == (74, 115, 145)
+    with pytest.raises(ValueError):
+        released.getpixel((0, 0))
+
+
+def test_plan_peak_covers_every_phase():
+    plan = CompositionPlan(
+        decode_size=(4000, 3000),
+        bands=3,
+        canvas_size=(3000, 4400),
+        transpose=Image.Transpose.ROTATE_270,
+        needs_overlay=True,
+        content_size=(3000, 4000),
+    )
+
+    assert oriented_size((4000, 3000), plan.transpose) == (3000, 4000)
+    assert plan.peak_bytes == max(2 * plan.source_bytes, plan.source_bytes + plan.canvas_bytes,
+                                  plan.canvas_bytes + plan.overlay_bytes)
+    assert plan.overlay_bytes == 3000 * 400 * 3
+
+
+def test_memory_budget_blocks_until_bytes_are_released():
+    budget = MemoryBudget(100)
+    first = budget.acquire(70)
+    acquired = threading.Event()
+
+    def worker():
+        with budget.reserve(60):
+            acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    budget.release(first)
+    assert acquired.wait(2)
+    thread.join()
+    stats = budget.stats()
+    assert stats["reserved_bytes"] == 0
+    assert stats["peak_reserved_bytes"] == 70
+    assert stats["waits"] == 1
+
+
+def test_memory_budget_runs_oversized_jobs_alone():
+    budget = MemoryBudget(100)
+
+    assert budget.acquire(500) == 100
+    with pytest.raises(TimeoutError):
+        budget.acquire(1, timeout=0.05)
+
+
+def test_process_image_reserves_planned_peak(tmp_path, monkeypatch):
+    image_path = tmp_path / "portrait.jpg"
+    exif_bytes = piexif.dump({
+        "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5", piexif.ImageIFD.Orientation: 6},
+        "Exif": {piexif.ExifIFD.LensModel: b"RF50mm F1.8 STM", piexif.ExifIFD.FNumber: (18, 10)},
+    })
+    Image.new("RGB", (640, 480), "#336699").save(image_path, exif=exif_bytes)
+    budget = MemoryBudget(1 << 30)
+    reserved = []
+    original_acquire = budget.acquire
+
+    def recording_acquire(nbytes, timeout=None):
+        reserved.append(nbytes)
+        return original_acquire(nbytes, timeout)
+
+    monkeypatch.setattr(budget, "acquire", recording_acquire)
+    monkeypatch.setattr(process_module, "get_memory_budget", lambda: budget)
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: LOGO_PATH)
+
+    result = process_module.process_image(
+        str(image_path), watermark_type=1, image_quality=85, style_config=STYLE_CONFIG,
+    )
+
+    assert reserved == [result.peak_bytes]
+    # 640x480 原图 + 转置副本，画布不小于旋转后的原图
+    assert result.peak_bytes >= 640 * 480 * 3 + 480 * 640 * 3
+    assert budget.stats()["reserved_bytes"] == 0
+    with Image.open(tmp_path / "portrait_watermark.jpg") as output:
+        assert output.width < output.height
@@ -0,0 +1,151 @@
+import sys
+import textwrap
+
+import pytest
+
+import exif.exif_data as exif_data_module
+import exif.exiftool_pool as pool_module
+
+# 模拟 `exiftool -stay_open True -@ -` 协议：逐行读参数，遇到 -execute{N} 时输出结果
+FAKE_EXIFTOOL = textwrap.dedent(
+    """
+    import json, os, sys, time
+
+    args = []
+    for raw in sys.stdin:
+        line = raw.rstrip("\\n")
+        if line == "False" and args[-1:] == ["-stay_open"]:
+            break
+        if not line.startswith("-execute"):
+            args.append(line)
+            continue
+        seq = line[len("-execute"):]
+        echo = ""
+        if "-echo4" in args:
+            idx = args.index("-echo4")
+            echo = args[idx + 1].replace("${status}", "0")
+            del args[idx:idx + 2]
+        if any("hang" in arg for arg in args):
+            time.sleep(30)
+        if "-ver" in args:
+            sys.stdout.write("12.76\\n")
+        elif "-j" in args:
+            # 与 exiftool 一致：全局 -n 或标签带 # 后缀时返回数值，否则返回打印转换后的值
+            def value(tag, numeric, printed):
+                return numeric if "-n" in args or "-%s#" % tag in args else printed
+
+            row = {"SourceFile": args[-1], "Pid": os.getpid(), "Make": "NIKON CORPORATION",
+                   "Model": "NIKON Z 6_2", "LensModel": "NIKKOR Z 24-70mm f/4 S",
+                   "FocalLength": value("FocalLength", 35.0, "35.0 mm"),
+                   "FNumber": value("FNumber", 4.0, "4.0"),
+                   "ExposureTime": value("ExposureTime", 0.008, "1/125"),
+                   "ISO": value("ISO", 200, 200),
+                   "DateTimeOriginal": "2024:05:01 10:20:30"}
+            if "lens_type_only" in args[-1]:
+                row.update(Make="Canon", Model="Canon EOS 5D Mark III")
+                del row["LensModel"]
+                row["LensType"] = value("LensType", 61, "Canon EF 24-70mm f/2.8L")
+            sys.stdout.write(json.dumps([row]) + "\\n")
+        sys.stdout.write("{ready%s}\\n" % seq)
+        sys.stdout.flush()
+        sys.stderr.write(echo + "\\n")
+        sys.stderr.flush()
+        args = []
+    """
+)
+
+
+@pytest.fixture
+def fake_exiftool(tmp_path):
+    script = tmp_path / "exiftool"
+    script.write_text(f"#!{sys.executable}\n{FAKE_EXIFTOOL}")
+    script.chmod(0o755)
+    return str(script)
+
+
+@pytest.fixture
+def shared_pool(monkeypatch, fake_exiftool):
+    pool_module.shutdown_exiftool_pool()
+    exif_data_module._query_exiftool_tags_cached.cache_clear()
+    monkeypatch.setattr(pool_module, "find_exiftool", lambda: fake_exiftool)
+    yield
+    pool_module.shutdown_exiftool_pool()
+    exif_data_module._query_exiftool_tags_cached.cache_clear()
+
+
+def test_pool_reuses_process_between_calls(fake_exiftool):
+    pool = pool_module.ExifToolPool(fake_exiftool, size=1)
+    try:
+        first = pool.execute_json("-Make", "/tmp/a.jpg")[0]
+        second = pool.execute_json("-Make", "/tmp/b.jpg")[0]
+        status, stdout, _ = pool.execute("-ver")
+    finally:
+        pool.close()
+
+    assert first["Pid"] == second["Pid"]
+    assert first["SourceFile"] == "/tmp/a.jpg"
+    assert status == 0
+    assert stdout.strip() == b"12.76"
+    assert pool.restarts == 0
+
+
+def test_pool_restarts_process_after_timeout(fake_exiftool):
+    pool = pool_module.ExifToolPool(fake_exiftool, size=1, timeout=1)
+    try:
+        before = pool.execute_json("/tmp/a.jpg")[0]["Pid"]
+        with pytest.raises(TimeoutError):
+            pool.execute("-j", "/tmp/hang.jpg")
+        after = pool.execute_json("/tmp/a.jpg")[0]["Pid"]
+    finally:
+        pool.close()
+
+    assert pool.restarts == 1
+    assert before != after
+
+
+def test_pool_rejects_arguments_with_newlines(fake_exiftool):
+    pool = pool_module.ExifToolPool(fake_exiftool, size=1)
+    try:
+        with pytest.raises(pool_module.ExifToolError):
+            pool.execute("-Make", "bad\nname.jpg")
+    finally:
+        pool.close()
+
+
+def test_exiftool_fallback_queries_each_file_once(shared_pool, monkeypatch, tmp_path):
+    image_path = tmp_path / "photo.jpg"
+    image_path.write_bytes(b"\xff\xd8\xff\xd9")
+
+    calls = []
+    original_read_tags = exif_data_module.read_tags
+
+    def counting_read_tags(*args, **kwargs):
+        calls.append(args)
+        return original_read_tags(*args, **kwargs)
+
+    monkeypatch.setattr(exif_data_module, "read_tags", counting_read_tags)
+    result = exif_data_module.get_exif_data_with_exiftool(str(image_path))
+    lens = exif_data_module._exiftool_lens_info(exif_data_module._query_exiftool_tags(str(image_path)))
+
+    assert result is not None
+    assert result["shooting_info"].startswith("35mm  \u0192/4  1/125s  ISO200")
+    assert lens == "NIKKOR Z 24-70mm f/4 S"
+    assert len(calls) == 1
+
+
+def test_lens_type_is_print_converted_when_it_is_the_only_lens_tag(shared_pool, tmp_path):
+    image_path = tmp_path / "lens_type_only.jpg"
+    image_path.write_bytes(b"\xff\xd8\xff\xd9")
+
+    result = exif_data_module.get_exif_data_with_exiftool(str(image_path))
+
+    assert result["camera_info"].startswith("Canon EF 24-70mm \u0192/2.8L\n")
+    assert result["shooting_info"].startswith("35mm  \u0192/4  1/125s  ISO200")
+
+
+def test_read_tags_returns_none_without_exiftool(monkeypatch):
+    pool_module.shutdown_exiftool_pool()
+    monkeypatch.setattr(pool_module, "find_exiftool", lambda: None)
+
+    assert pool_module.read_tags("/tmp/a.jpg", ["Make"]) is None
+    assert pool_module.copy_all_metadata("/tmp/a.jpg", "/tmp/b.jpg") is False
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from imaging import font_cache
+from imaging.renderer_film_frame import FilmFrameRenderer
+from imaging.text_rendering import (
+    clear_text_image_cache,
+    create_text_block,
+    text_image_cache_stats,
+    text_to_image,
+    text_to_image_with_symbol_font,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MONO_FONT = str(PROJECT_ROOT / "fonts" / "RobotoMono-Regular.ttf")
+SYMBOL_FONT = str(PROJECT_ROOT / "fonts" / "Roboto-Regular.ttf")
+
+
+def test_text_rendering_reuses_cached_fonts():
+    font_cache.clear_font_cache()
+    clear_text_image_cache()
+
+    text_to_image("35mm f/2", MONO_FONT, 40, "black")
+    text_to_image("ISO200", MONO_FONT, 40, "black")
+    text_to_image_with_symbol_font("35mm ƒ/2", MONO_FONT, 40, "black", symbol_font_path=SYMBOL_FONT)
+
+    info = font_cache.font_cache_info()
+    assert info.misses == 2
+    assert info.hits == 2
+    assert font_cache.get_font(MONO_FONT, 40) is font_cache.get_font(MONO_FONT, 40.0)
+
+
+def test_fit_text_font_size_shares_cache_across_calls():
+    font_cache.clear_font_cache()
+
+    first = FilmFrameRenderer._fit_text_font_size(["Summicron 35mm f/2"], MONO_FONT, 200, 8, 300)
+    misses = font_cache.font_cache_info().misses
+    second = FilmFrameRenderer._fit_text_font_size(["Summicron 35mm f/2"], MONO_FONT, 200, 8, 300)
+
+    assert first == second
+    assert font_cache.font_cache_info().misses == misses
+
+
+def test_preload_fonts_skips_missing_files(tmp_path):
+    font_cache.clear_font_cache()
+
+    loaded = font_cache.preload_fonts([MONO_FONT, str(tmp_path / "missing.otf")])
+
+    assert loaded == 1
+    assert font_cache.font_cache_info().currsize == 1
+
+
+def test_text_blocks_are_rasterized_once_per_content():
+    clear_text_image_cache()
+
+    first = create_text_block("RF24-70mm F2.8 L IS USM", "EOS R5", MONO_FONT, SYMBOL_FONT, 48)
+    second = create_text_block("RF24-70mm F2.8 L IS USM", "EOS R5", MONO_FONT, SYMBOL_FONT, 48)
+    white = create_text_block("RF24-70mm F2.8 L IS USM", "EOS R5", MONO_FONT, SYMBOL_FONT, 48, color="white")
+
+    assert first is second
+    assert white is not first
+    assert white.size == first.size
+    stats = text_image_cache_stats()
+    # 两种颜色各 1 个块 + 2 行文字
+    assert stats["misses"] == 6
+    assert stats["hits"] == 1
+    assert 0 < stats["bytes"] <= stats["max_bytes"]
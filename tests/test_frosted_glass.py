@@ -0,0 +1,84 @@
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import imaging.frosted_glass as frosted_module
+from constants import ImageConstants
+from scripts.bench_frosted_glass import legacy_frosted_glass_effect
+
+
+def _source(size=(600, 400)):
+    gradient = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_90).resize(size),
+                               Image.new("L", size, 140)))
+
+
+def test_photo_is_kept_and_corners_show_background():
+    source = _source()
+    geometry = frosted_module._frosted_geometry(source.size)
+
+    rendered = frosted_module.create_frosted_glass_effect(source)
+
+    assert rendered.size == frosted_module.frosted_canvas_size(source.size)
+    x0, y0, x1, y1 = geometry.content_box
+    radius = geometry.corner_radius
+    inner = (x0 + radius, y0, x1 - radius, y1)
+    expected = source.crop((radius, 0, source.width - radius, source.height))
+    assert ImageChops.difference(rendered.crop(inner), expected).getbbox() is None
+    # 圆角外侧露出的是（变暗的）背景而不是原图
+    assert rendered.getpixel((x0, y0)) != source.getpixel((0, 0))
+
+
+def test_shadow_darkens_background_below_photo():
+    source = Image.new("RGB", (600, 400), (200, 200, 200))
+    geometry = frosted_module._frosted_geometry(source.size)
+    x0, _, x1, y1 = geometry.content_box
+    center_x = (x0 + x1) // 2
+
+    rendered = frosted_module.create_frosted_glass_effect(source)
+
+    near = rendered.getpixel((center_x, y1 + 1))
+    far = rendered.getpixel((center_x, rendered.height - 1))
+    assert near[0] < far[0]
+
+
+def test_tiled_render_matches_serial_render(monkeypatch):
+    source = _source((900, 1200))
+    monkeypatch.setattr(ImageConstants, "WATERMARK_GLASS_TILE_WORKERS", 1)
+    monkeypatch.setattr(ImageConstants, "WATERMARK_GLASS_TILE_ROWS", 10_000)
+    serial = frosted_module.create_frosted_glass_effect(source, pad_to_even=True)
+
+    monkeypatch.setattr(ImageConstants, "WATERMARK_GLASS_TILE_WORKERS", 4)
+    monkeypatch.setattr(ImageConstants, "WATERMARK_GLASS_TILE_ROWS", 16)
+    tiled = frosted_module.create_frosted_glass_effect(source, pad_to_even=True)
+
+    assert serial.size == tiled.size
+    # 分块边界只影响双线性采样的舍入
+    assert max(ImageStat.Stat(ImageChops.difference(serial, tiled)).extrema[0]) <= 2
+
+
+@pytest.mark.parametrize("size", [(900, 1200), (1500, 1000)])
+def test_matches_legacy_full_resolution_render_within_tolerance(size):
+    source = _source(size)
+    frosted_module._shadow_sprite.cache_clear()
+
+    legacy = legacy_frosted_glass_effect(source, pad_to_even=True)
+    rendered = frosted_module.create_frosted_glass_effect(source, pad_to_even=True)
+
+    assert rendered.size == legacy.size
+    diff = ImageChops.difference(legacy, rendered)
+    # 双线性放大背景与低分辨率阴影只带来舍入级的差异，集中在阴影边缘的少量像素
+    assert max(ImageStat.Stat(diff).mean) < 0.5
+    histogram = diff.convert("L").histogram()
+    assert sum(histogram[5:]) / sum(histogram) < 0.01
+    assert max(high for _, high in ImageStat.Stat(diff).extrema) <= 16
+
+
+def test_shadow_and_corner_sprites_are_cached():
+    frosted_module._shadow_sprite.cache_clear()
+    frosted_module._corner_masks.cache_clear()
+
+    frosted_module.create_frosted_glass_effect(_source())
+    frosted_module.create_frosted_glass_effect(_source())
+
+    assert frosted_module._shadow_sprite.cache_info().hits == 1
+    assert frosted_module._corner_masks.cache_info().hits == 1
@@ -0,0 +1,127 @@
+import logging
+import time
+
+from probe_result import ProbeResult
+from process_result import ProcessResult
+from services.job_queue import JobQueue
+from services.state import AppState
+from services.tasks import TaskPayload, submit_existing_task
+from services.worker import TaskWorker
+
+
+def test_claim_is_exclusive_and_expired_leases_are_reclaimed_then_abandoned(tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    queue = JobQueue(db_path, lease_seconds=60, max_attempts=2)
+    other = JobQueue(db_path, lease_seconds=60, max_attempts=2)
+    queue.enqueue("job-1", {"filepath": "a.jpg"})
+
+    job = queue.claim("worker-a")
+    assert job.job_id == "job-1" and job.payload == {"filepath": "a.jpg"} and job.attempts == 1
+    # 另一个进程的连接拿不到已被领取且租约有效的任务
+    assert other.claim("worker-b") is None
+    assert other.stats() == {"queued": 0, "running": 1}
+
+    # worker-a 停止心跳，租约过期后由 worker-b 接手
+    with queue.lock:
+        queue._conn.execute("UPDATE jobs SET lease_expires_at = ?", (time.time() - 1,))
+    reclaimed = other.claim("worker-b")
+    assert reclaimed.job_id == "job-1" and reclaimed.attempts == 2
+    assert queue.heartbeat("worker-a") == 0
+    assert queue.complete("job-1", "worker-a") is False
+
+    # 达到最大尝试次数后不再被领取，由 reap_expired 移出队列
+    with queue.lock:
+        queue._conn.execute("UPDATE jobs SET lease_expires_at = ?", (time.time() - 1,))
+    assert queue.claim("worker-c") is None
+    assert queue.reap_expired() == ["job-1"]
+    assert queue.stats() == {"queued": 0, "running": 0}
+
+
+def test_web_enqueues_and_separate_worker_state_runs_the_task(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    web = AppState(db_path, task_queue="sqlite")
+    worker_state = AppState(db_path, task_queue="sqlite")
+    logger = logging.getLogger("tests.job_queue")
+
+    task_id = "shared-task"
+    web.create_task(task_id, {"status": "needs_logo", "submitted_at": time.time(), "stage": "awaiting_logo"})
+
+    def local_submit(*_args):
+        raise AssertionError("web process must only enqueue")
+
+    monkeypatch.setattr(web.executor, "submit", local_submit)
+    submit_existing_task(task_id, TaskPayload(
+        task_id=task_id,
+        state=web,
+        filepath=str(tmp_path / "sample.jpg"),
+        lang="en",
+        watermark_type=1,
+        image_quality=85,
+        burn_after_read="0",
+        logo_preference="xiaomi",
+        style_config={},
+        logger=logger,
+        preserve_hdr=False,
+        probe=ProbeResult(width=4, height=3, is_motion=True),
+    ))
+    assert web.job_queue.stats()["queued"] == 1
+
+    seen_kwargs = {}
+
+    def fake_process_image(filepath, **kwargs):
+        seen_kwargs.update(kwargs, filepath=filepath)
+        kwargs["progress_callback"](0.5, "rendering")
+        return ProcessResult()
+
+    monkeypatch.setattr("services.tasks.process_image", fake_process_image)
+
+    worker = TaskWorker(worker_state, {"styles": {}}, logger, worker_id="worker-test")
+    assert worker.run_once() is True
+    assert worker.run_once() is False
+
+    assert seen_kwargs["filepath"] == str(tmp_path / "sample.jpg")
+    assert seen_kwargs["logo_preference"] == "xiaomi"
+    assert seen_kwargs["preserve_hdr"] is False
+    assert seen_kwargs["probe"] == ProbeResult(width=4, height=3, is_motion=True)
+    assert web.job_queue.stats() == {"queued": 0, "running": 0}
+    assert task_id not in worker_state.tasks
+
+    # Web 进程的内存缓存与事件总线从数据库同步到 worker 写入的结果
+    cursor = web.events.last_id
+    assert web.sync_task_updates() == 1
+    assert web.get_task(task_id)["status"] == "succeeded"
+    events = web.events.wait([task_id], cursor, timeout=0)
+    assert events[-1].data["status"] == "succeeded"
+    assert web.sync_task_updates() == 0
+
+    worker_state.shutdown()
+    web.shutdown()
+
+
+def test_restart_keeps_queued_tasks_when_jobs_are_shared(tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    state = AppState(db_path, task_queue="sqlite")
+    state.create_task("pending", {"status": "queued", "submitted_at": time.time()})
+    state.shutdown()
+
+    reloaded = AppState(db_path, task_queue="sqlite")
+    assert reloaded.get_task("pending")["status"] == "queued"
+    reloaded.shutdown()
+
+
+def test_invalid_job_payload_fails_the_task_without_stopping_the_worker(tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    state = AppState(db_path, task_queue="sqlite")
+    logger = logging.getLogger("tests.job_queue")
+    state.create_task("bad-job", {"status": "queued", "submitted_at": time.time(), "lang": "en"})
+    # 例如较新的 Web 进程写入了本 worker 不认识的字段
+    state.job_queue.enqueue("bad-job", {"filepath": "a.jpg", "unknown_field": 1})
+
+    worker = TaskWorker(state, {"styles": {}}, logger, worker_id="worker-test")
+    assert worker.run_once() is True
+    assert worker.run_once() is False
+
+    assert state.job_queue.stats() == {"queued": 0, "running": 0}
+    task = state.get_task("bad-job")
+    assert task["status"] == "failed" and task["stage"] == "failed"
+    state.shutdown()
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import piexif
+from PIL import Image
+
+from media.jpeg_container import JpegContainer
+from media.ultrahdr import build_primary_xmp_for_gainmap, inject_xmp, split_ultrahdr
+from routes.upload import _read_image_dimensions
+
+MP4 = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2" + b"\x00" * 64
+
+
+def _jpeg(size, mode="RGB", **save_kwargs):
+    buf = BytesIO()
+    Image.new(mode, size, 128 if mode == "L" else "#336699").save(buf, format="JPEG", **save_kwargs)
+    return buf.getvalue()
+
+
+def _ultrahdr_motion_photo():
+    gainmap = _jpeg((4, 3), mode="L")
+    exif = piexif.dump({"0th": {piexif.ImageIFD.Make: b"Google"}})
+    primary = inject_xmp(_jpeg((64, 48), exif=exif), build_primary_xmp_for_gainmap(len(gainmap)))
+    return primary, gainmap, primary + gainmap + MP4
+
+
+def test_container_indexes_headers_eoi_and_appended_items():
+    primary, gainmap, data = _ultrahdr_motion_photo()
+
+    container = JpegContainer(data)
+
+    assert container.size == (64, 48)
+    # inject_xmp 按索引删除 / 插入 XMP 段，其余段原样保留
+    with Image.open(BytesIO(primary)) as image:
+        assert image.size == (64, 48)
+    assert piexif.load(container.exif)["0th"][piexif.ImageIFD.Make] == b"Google"
+    assert container.xmp.startswith(b"<x:xmpmeta") and container.xmp.endswith(b"</x:xmpmeta>")
+    assert container.primary_end == len(primary)
+    [item] = container.items
+    assert (item.semantic, item.offset, item.length) == ("GainMap", len(primary), len(gainmap))
+    assert container.appended_jpegs == [(len(primary), len(primary) + len(gainmap))]
+
+
+def test_split_ultrahdr_from_bounded_container_stops_before_video():
+    primary, gainmap, data = _ultrahdr_motion_photo()
+    container = JpegContainer(data)
+
+    parts = split_ultrahdr(container.bounded(len(primary) + len(gainmap)))
+
+    assert parts.primary_jpeg == primary
+    assert parts.gainmap_jpeg == gainmap
+    # 缺少目录时退回扫描追加的 JPEG，同样不会越过 end 进入视频
+    still = _jpeg((8, 8)) + gainmap
+    bounded = JpegContainer(still + MP4).bounded(len(still))
+    assert bounded.appended_jpegs == [(len(still) - len(gainmap), len(still))]
+
+
+def test_read_image_dimensions_uses_container(tmp_path):
+    _, _, data = _ultrahdr_motion_photo()
+    (tmp_path / "motion.jpg").write_bytes(data)
+    Image.new("RGB", (7, 5)).save(tmp_path / "tiny.png")
+    (tmp_path / "empty.jpg").write_bytes(b"")
+
+    assert _read_image_dimensions(str(tmp_path / "motion.jpg")) == (64, 48)
+    assert _read_image_dimensions(str(tmp_path / "tiny.png")) == (7, 5)
+    assert _read_image_dimensions(str(tmp_path / "empty.jpg")) is None
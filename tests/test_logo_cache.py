@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from PIL import Image
+
+from imaging import logo_cache
+from imaging.logo_cache import LogoCache
+from imaging.text_rendering import create_right_block
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOGO_PATH = str(PROJECT_ROOT / "logos" / "canon.png")
+
+
+def test_logo_variants_are_cached_per_height_as_copies():
+    cache = LogoCache(max_bytes=64 * 1024 * 1024)
+
+    first = cache.get(LOGO_PATH, 120)
+    second = cache.get(LOGO_PATH, 120)
+    other = cache.get(LOGO_PATH, 60)
+
+    assert first.mode == "RGBA"
+    assert first.height == 120 and other.height == 60
+    stats = cache.stats()
+    # 每个高度缩放 1 次；原图不进入缓存
+    assert stats["misses"] == 2
+    assert stats["hits"] == 1
+    assert stats["entries"] == 2
+
+    # 调用方修改拿到的 logo 不影响缓存中的版本
+    assert first is not second
+    first.paste((255, 0, 0, 255), (0, 0, first.width, first.height))
+    assert cache.get(LOGO_PATH, 120).tobytes() == second.tobytes()
+
+
+def test_largest_logos_fit_the_per_entry_cap_once_scaled():
+    cache = LogoCache()
+    for name in ("apple.png", "xmage.png"):
+        logo = cache.get(str(PROJECT_ROOT / "logos" / name), 600)
+        assert logo.height == 600
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= cache.max_bytes // 4
+
+
+def test_logo_cache_evicts_least_recently_used_to_byte_budget(tmp_path):
+    paths = []
+    for index in range(5):
+        path = tmp_path / f"logo{index}.png"
+        Image.new("RGBA", (100, 100), (index, 0, 0, 255)).save(path)
+        paths.append(str(path))
+
+    cache = LogoCache(max_bytes=100 * 100 * 4 * 4)
+    for path in paths[:4]:
+        cache.get(path, 100)
+    cache.get(paths[0], 100)
+    cache.get(paths[4], 100)
+
+    stats = cache.stats()
+    assert stats["bytes"] <= cache.max_bytes
+    assert stats["entries"] == 4
+    assert stats["evictions"] == 1
+    # logo0 刚被访问过，被淘汰的应是 logo1
+    hits = stats["hits"]
+    cache.get(paths[0], 100)
+    assert cache.stats()["hits"] == hits + 1
+
+
+def test_create_right_block_uses_shared_logo_cache():
+    logo_cache.clear_logo_cache()
+    text_block = Image.new("RGBA", (50, 20), (0, 0, 0, 255))
+
+    create_right_block(LOGO_PATH, text_block, 100)
+    create_right_block(LOGO_PATH, text_block, 100)
+
+    assert logo_cache.logo_cache_stats()["hits"] == 1
@@ -0,0 +1,253 @@
+import os
+import shutil
+import sys
+import textwrap
+from io import BytesIO
+from pathlib import Path
+
+import piexif
+import pytest
+from PIL import Image, ImageChops
+
+import media.jpeg_lossless as lossless_module
+import process as process_module
+from constants import CommonConstants
+from imaging.watermark import generate_footer_strip, generate_watermark_image, supports_footer_strip
+from services.watermark_styles import get_style, load_watermark_styles
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOGO_PATH = str(PROJECT_ROOT / "logos" / "canon.png")
+STYLE_CONFIG = load_watermark_styles(str(PROJECT_ROOT / "config" / "watermark_styles.toml"))
+
+# 模拟 IJG jpegtran 的 -crop 画布扩展与 -drop；用 Pillow 实现，仅用于验证调用协议
+FAKE_JPEGTRAN = textwrap.dedent(
+    """
+    import sys
+    from PIL import Image
+
+    args = sys.argv[1:]
+    src = Image.open(args[-1])
+    exif = src.info.get("exif", b"")
+    out = args[args.index("-outfile") + 1]
+    if "-crop" in args:
+        size = args[args.index("-crop") + 1].split("+")[0]
+        width, height = (int(v) for v in size.split("x"))
+        canvas = Image.new(src.mode, (width, height))
+        canvas.paste(src, (0, 0))
+    else:
+        idx = args.index("-drop")
+        _, x, y = args[idx + 1].split("+")
+        canvas = src.copy()
+        canvas.paste(Image.open(args[idx + 2]), (int(x), int(y)))
+    canvas.save(out, format="JPEG", quality=95, exif=exif)
+    """
+)
+
+
+@pytest.fixture
+def fake_jpegtran(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "jpegtran"
+    script.write_text(f"#!{sys.executable}\n{FAKE_JPEGTRAN}")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{Path(sys.executable).parent}")
+    lossless_module.find_jpegtran.cache_clear()
+    yield str(script)
+    lossless_module.find_jpegtran.cache_clear()
+
+
+def _write_sample(path: Path, size=(640, 480), orientation=None) -> None:
+    zeroth = {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"}
+    if orientation is not None:
+        zeroth[piexif.ImageIFD.Orientation] = orientation
+    exif_dict = {
+        "0th": zeroth,
+        "Exif": {
+            piexif.ExifIFD.LensModel: b"RF24-70mm F2.8 L IS USM",
+            piexif.ExifIFD.FocalLengthIn35mmFilm: 35,
+            piexif.ExifIFD.FNumber: (28, 10),
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.ISOSpeedRatings: 200,
+        },
+    }
+    Image.new("RGB", size, "#336699").save(path, exif=piexif.dump(exif_dict), quality=90)
+
+
+def _render_args():
+    return (
+        LOGO_PATH,
+        ["RF24-70mm F2.8 L IS USM", "EOS R5"],
+        ["35mm  f/2.8  1/125s  ISO200", "2026-03-07 12:00"],
+        CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+        CommonConstants.GLOBAL_FONT_PATH_BOLD,
+        2,
+    )
+
+
+def test_footer_strip_matches_full_render():
+    origin = Image.new("RGB", (640, 481), "#336699")
+    kwargs = dict(
+        style_config=STYLE_CONFIG,
+        font_path_regular=CommonConstants.GLOBAL_FONT_PATH_MONO,
+        font_path_symbol=CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+    )
+
+    full = generate_watermark_image(origin, *_render_args(), **kwargs)
+    strip = generate_footer_strip(origin.size, *_render_args(), **kwargs)
+
+    assert strip.width == full.width
+    assert origin.height + strip.height == full.height
+    footer = full.crop((0, origin.height, full.width, full.height))
+    assert ImageChops.difference(footer, strip).getbbox() is None
+
+
+def test_only_bottom_footer_styles_support_strips():
+    assert supports_footer_strip(get_style(STYLE_CONFIG, 2)) is True
+    assert supports_footer_strip(get_style(STYLE_CONFIG, 1)) is False
+    assert supports_footer_strip(get_style(STYLE_CONFIG, 4)) is False
+    with pytest.raises(ValueError):
+        generate_footer_strip((640, 480), *_render_args()[:5], watermark_type=1, style_config=STYLE_CONFIG)
+
+
+def test_can_append_losslessly_requires_mcu_aligned_height(tmp_path):
+    aligned = tmp_path / "aligned.jpg"
+    unaligned = tmp_path / "unaligned.jpg"
+    _write_sample(aligned, size=(640, 480))
+    _write_sample(unaligned, size=(640, 470))
+
+    with Image.open(aligned) as image:
+        assert lossless_module.mcu_size(image) == (16, 16)
+        assert lossless_module.can_append_losslessly(image) is True
+    with Image.open(unaligned) as image:
+        assert lossless_module.can_append_losslessly(image) is False
+
+
+def test_find_jpegtran_requires_crop_extension(tmp_path, monkeypatch):
+    # usage 中列出了 -drop，但拒绝大于原图的 -crop（如 libjpeg-turbo 的 jpegtran）
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "jpegtran"
+    script.write_text(
+        f"#!{sys.executable}\nimport sys\n"
+        "sys.stderr.write('usage: jpegtran -drop +X+Y filename\\n')\n"
+        "sys.exit(1 if '-crop' in sys.argv or '-help' in sys.argv else 0)\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    lossless_module.find_jpegtran.cache_clear()
+
+    try:
+        assert lossless_module.find_jpegtran() is None
+    finally:
+        lossless_module.find_jpegtran.cache_clear()
+
+
+def test_find_jpegtran_accepts_tool_that_extends_and_drops(fake_jpegtran):
+    assert lossless_module.find_jpegtran() == fake_jpegtran
+
+
+@pytest.mark.skipif(shutil.which("jpegtran") is None, reason="jpegtran not installed")
+def test_real_jpegtran_keeps_photo_area_bit_exact():
+    lossless_module.find_jpegtran.cache_clear()
+    if lossless_module.find_jpegtran() is None:
+        pytest.skip("installed jpegtran lacks crop extension / -drop (IJG 9+ required)")
+    # 随机噪声在任何重新编码后都会改变；4:4:4 采样避免色度上采样跨越页脚边界
+    source = Image.frombytes("RGB", (64, 48), os.urandom(64 * 48 * 3))
+    buf = BytesIO()
+    source.save(buf, format="JPEG", quality=90, subsampling=0)
+    strip = Image.new("RGB", (64, 32), "white")
+
+    result = lossless_module.append_strip_lossless(buf.getvalue(), strip)
+
+    with Image.open(BytesIO(buf.getvalue())) as original, Image.open(BytesIO(result)) as output:
+        assert output.size == (64, 80)
+        assert output.quantization == original.quantization
+        assert ImageChops.difference(output.crop((0, 0, 64, 48)), original.convert("RGB")).getbbox() is None
+        assert min(output.getpixel((32, 70))) >= 250
+
+
+def test_strip_mpf_keeps_other_segments():
+    exif_bytes = piexif.dump({"0th": {piexif.ImageIFD.Make: b"Canon"}})
+    buf = BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="JPEG", exif=exif_bytes)
+    data = buf.getvalue()
+    mpf_payload = b"MPF\x00" + b"\x00" * 8
+    mpf = b"\xFF\xE2" + (len(mpf_payload) + 2).to_bytes(2, "big") + mpf_payload
+    with_mpf = data[:2] + mpf + data[2:]
+
+    stripped = lossless_module.strip_mpf(with_mpf)
+
+    assert stripped == data
+    with Image.open(BytesIO(stripped)) as image:
+        assert image.info["exif"] == exif_bytes
+
+
+def test_process_image_appends_footer_without_reencoding(tmp_path, monkeypatch, fake_jpegtran):
+    image_path = tmp_path / "source.jpg"
+    _write_sample(image_path)
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: LOGO_PATH)
+
+    def fail(*_args, **_kwargs):
+        raise AssertionError("full render should be skipped")
+
+    monkeypatch.setattr(process_module, "generate_watermark_image", fail)
+
+    result = process_module.process_image(
+        str(image_path), watermark_type=2, image_quality=100, style_config=STYLE_CONFIG,
+    )
+
+    assert result.success is True
+    with Image.open(tmp_path / "source_watermark.jpg") as output:
+        assert output.width == 640
+        assert output.height > 480
+        assert output.height % 2 == 0
+        assert piexif.load(output.info["exif"])["0th"][piexif.ImageIFD.Model] == b"EOS R5"
+        # 页脚为白底
+        assert output.getpixel((2, output.height - 2)) == (255, 255, 255)
+
+
+@pytest.mark.parametrize(
+    "size, orientation, quality, watermark_type",
+    [
+        ((640, 470), None, 100, 2),   # 高度未按 MCU 对齐
+        ((640, 480), 6, 100, 2),      # 需要旋转
+        ((640, 480), None, 85, 2),    # 用户选择了压缩档位
+        ((640, 480), None, 100, 1),   # 带上/左边框的样式
+    ],
+)
+def test_ineligible_inputs_use_full_render(tmp_path, monkeypatch, fake_jpegtran,
+                                           size, orientation, quality, watermark_type):
+    image_path = tmp_path / "source.jpg"
+    _write_sample(image_path, size=size, orientation=orientation)
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: LOGO_PATH)
+    monkeypatch.setattr(process_module, "append_strip_lossless", lambda *_args, **_kwargs: pytest.fail("unexpected"))
+
+    result = process_module.process_image(
+        str(image_path), watermark_type=watermark_type, image_quality=quality, style_config=STYLE_CONFIG,
+    )
+
+    assert result.success is True
+    assert (tmp_path / "source_watermark.jpg").exists()
+
+
+def test_jpegtran_failure_falls_back_to_full_render(tmp_path, monkeypatch, fake_jpegtran):
+    image_path = tmp_path / "source.jpg"
+    _write_sample(image_path)
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: LOGO_PATH)
+
+    def broken(*_args, **_kwargs):
+        raise lossless_module.LosslessAppendError("jpegtran failed: boom")
+
+    monkeypatch.setattr(process_module, "append_strip_lossless", broken)
+    progress = []
+
+    result = process_module.process_image(
+        str(image_path), watermark_type=2, image_quality=100, style_config=STYLE_CONFIG,
+        progress_callback=lambda value, stage: progress.append(stage),
+    )
+
+    assert result.success is True
+    assert progress == ["loaded", "metadata", "rendered", "saving", "saved"]
+    with Image.open(tmp_path / "source_watermark.jpg") as output:
+        assert output.width == 640 and output.height > 480
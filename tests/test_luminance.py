@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageStat
+
+import imaging.luminance as luminance_module
+from constants import CommonConstants
+from imaging import generate_watermark_image, is_image_bright
+from services.watermark_styles import load_watermark_styles
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+STYLE_CONFIG = load_watermark_styles(str(PROJECT_ROOT / "config" / "watermark_styles.toml"))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    luminance_module.clear_luminance_cache()
+    yield
+    luminance_module.clear_luminance_cache()
+
+
+def _split_image(top, bottom, size=(3000, 2000)):
+    image = Image.new("RGB", size, top)
+    image.paste(bottom, (0, size[1] // 2, size[0], size[1]))
+    return image
+
+
+def test_stats_from_reduced_sample_match_full_resolution():
+    image = Image.linear_gradient("L").resize((3000, 2000)).convert("RGB")
+
+    stats = luminance_module.compute_luminance_stats(image)
+
+    assert max(stats.sample_size) <= 512
+    full = image.convert("L")
+    assert stats.mean == pytest.approx(ImageStat.Stat(full).mean[0], abs=1.0)
+    bottom = full.crop((0, 1000, 3000, 2000))
+    assert stats.region_mean("bottom_half") == pytest.approx(ImageStat.Stat(bottom).mean[0], abs=1.0)
+    assert sum(stats.histogram) == stats.sample_size[0] * stats.sample_size[1]
+    assert stats.percentile(0.5) == pytest.approx(128, abs=4)
+
+
+def test_bright_requires_bright_bottom_half():
+    assert is_image_bright(Image.new("RGB", (800, 600), (230, 230, 230))) is True
+    # 整体偏亮但下半部分（文字所在区域）是暗的
+    assert is_image_bright(_split_image((255, 255, 255), (100, 100, 100))) is False
+    assert is_image_bright(Image.new("P", (64, 64), 0)) is False
+
+
+def test_stats_are_cached_per_source_key():
+    image = Image.new("RGB", (400, 300), (230, 230, 230))
+
+    first = luminance_module.get_luminance_stats(image, key=("photo.jpg", 1, 100))
+    second = luminance_module.get_luminance_stats(image, key=("photo.jpg", 1, 100))
+    luminance_module.get_luminance_stats(image)
+
+    assert first is second
+    assert luminance_module.luminance_cache_stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_auto_contrast_style_reuses_cached_stats(monkeypatch):
+    calls = []
+    original = luminance_module.compute_luminance_stats
+
+    def counting(image):
+        calls.append(image.size)
+        return original(image)
+
+    monkeypatch.setattr(luminance_module, "compute_luminance_stats", counting)
+    source = Image.new("RGB", (400, 300), (30, 30, 30))
+
+    for _ in range(2):
+        generate_watermark_image(
+            source,
+            logo_path=str(PROJECT_ROOT / "logos" / "canon.png"),
+            camera_info=["RF24-70mm F2.8 L IS USM", "EOS R5"],
+            shooting_info=["35mm  f/2.8  1/125s  ISO200", "2026.03.07 12:00:00"],
+            font_path_thin=CommonConstants.GLOBAL_FONT_PATH_LIGHT,
+            font_path_bold=CommonConstants.GLOBAL_FONT_PATH_BOLD,
+            watermark_type=4,
+            font_path_regular=CommonConstants.GLOBAL_FONT_PATH_MONO,
+            font_path_symbol=CommonConstants.GLOBAL_FONT_PATH_REGULAR,
+            style_config=STYLE_CONFIG,
+            luminance_key=("photo.jpg", 1, 100),
+        )
+
+    assert calls == [(400, 300)]
@@ -1,59 +1,132 @@
 from pathlib import Path
 from types import SimpleNamespace
+import errno
 import json
+import os
+import struct
+
+import pytest
+
+from PIL import Image
 
 import media.motion_photo as motion_module
 import media.video as video_module
+import media.video_probe as video_probe
+import process_io
+from imaging.overlay import BorderOverlay
 
 
-def test_get_video_wh_accepts_trailing_separator(monkeypatch):
-    monkeypatch.setattr(video_module.shutil, "which", lambda _: "/usr/local/bin/ffprobe")
+@pytest.fixture(autouse=True)
+def clear_video_info_cache():
+    video_probe.clear_video_info_cache()
+    yield
+    video_probe.clear_video_info_cache()
 
-    def fake_run(*args, **kwargs):
-        return SimpleNamespace(stdout="1008x1344x\n", stderr="")
 
-    monkeypatch.setattr(video_module.subprocess, "run", fake_run)
+def _fake_ffprobe(monkeypatch, payload):
+    calls = []
+    monkeypatch.setattr(video_probe.shutil, "which", lambda _: "/usr/local/bin/ffprobe")
+
+    def fake_run(command, *args, **kwargs):
+        calls.append(command)
+        return SimpleNamespace(stdout=json.dumps(payload), stderr="")
+
+    monkeypatch.setattr(video_probe.subprocess, "run", fake_run)
+    return calls
 
-    assert video_module._get_video_wh(Path("/tmp/fake.mp4")) == (1008, 1344)
 
+def _not_mp4(tmp_path, name="fake.mp4"):
+    path = tmp_path / name
+    path.write_bytes(b"not an mp4 " + name.encode())
+    return path
 
-def test_get_video_rotation_prefers_side_data(monkeypatch):
-    monkeypatch.setattr(video_module.shutil, "which", lambda _: "/usr/local/bin/ffprobe")
 
-    payload = {
+def test_video_info_comes_from_one_cached_ffprobe_call(tmp_path, monkeypatch):
+    calls = _fake_ffprobe(monkeypatch, {
+        "streams": [
+            {"codec_type": "video", "codec_name": "hevc", "width": 1008, "height": 1344,
+             "avg_frame_rate": "30000/1001", "side_data_list": [{"rotation": -90}]},
+            {"codec_type": "audio", "codec_name": "aac"},
+        ],
+        "format": {"duration": "2.5"},
+    })
+    video_path = _not_mp4(tmp_path)
+
+    assert video_module._get_video_wh(video_path) == (1008, 1344)
+    assert video_module._get_video_rotation(video_path) == 270
+    # 内容相同的另一份拷贝命中摘要缓存
+    copy_path = tmp_path / "copy.mp4"
+    copy_path.write_bytes(video_path.read_bytes())
+    info = video_probe.probe_video(copy_path)
+
+    assert len(calls) == 1 and "json" in calls[0]
+    assert (info.codec, info.duration, info.has_audio, info.source) == ("hevc", 2.5, True, "ffprobe")
+    assert info.frame_rate == pytest.approx(29.97, abs=0.01)
+    assert video_probe.video_info_cache_stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+
+def test_get_video_rotation_prefers_side_data(tmp_path, monkeypatch):
+    _fake_ffprobe(monkeypatch, {
         "streams": [
             {
+                "width": 1920,
+                "height": 1080,
                 "tags": {"rotate": "270"},
                 "side_data_list": [{"rotation": 90}],
             }
         ]
-    }
+    })
 
-    def fake_run(*args, **kwargs):
-        return SimpleNamespace(stdout=json.dumps(payload), stderr="")
-
-    monkeypatch.setattr(video_module.subprocess, "run", fake_run)
-
-    assert video_module._get_video_rotation(Path("/tmp/fake.mp4")) == 90
+    assert video_module._get_video_rotation(_not_mp4(tmp_path)) == 90
 
 
-def test_get_video_rotation_converts_legacy_rotate_tag(monkeypatch):
-    monkeypatch.setattr(video_module.shutil, "which", lambda _: "/usr/local/bin/ffprobe")
-
-    payload = {
+def test_get_video_rotation_converts_legacy_rotate_tag(tmp_path, monkeypatch):
+    _fake_ffprobe(monkeypatch, {
         "streams": [
             {
+                "width": 1920,
+                "height": 1080,
                 "tags": {"rotate": "90"},
             }
         ]
-    }
+    })
 
-    def fake_run(*args, **kwargs):
-        return SimpleNamespace(stdout=json.dumps(payload), stderr="")
+    assert video_module._get_video_rotation(_not_mp4(tmp_path)) == 270
 
-    monkeypatch.setattr(video_module.subprocess, "run", fake_run)
 
-    assert video_module._get_video_rotation(Path("/tmp/fake.mp4")) == 270
+def _box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def _full_box(kind, payload, version=0):
+    return _box(kind, bytes([version, 0, 0, 0]) + payload)
+
+
+def _trak(handler, matrix=(0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000), sample_entry=b""):
+    tkhd = _full_box(b"tkhd", b"\x00" * 20 + b"\x00" * 16 + struct.pack(">9i", *matrix) + struct.pack(">II", 0, 0))
+    mdhd = _full_box(b"mdhd", struct.pack(">IIII", 0, 0, 600, 1200) + b"\x00" * 4)
+    hdlr = _full_box(b"hdlr", b"\x00" * 4 + handler + b"\x00" * 12)
+    stsd = _full_box(b"stsd", struct.pack(">I", 1) + sample_entry)
+    stts = _full_box(b"stts", struct.pack(">III", 1, 60, 20))
+    stbl = _box(b"stbl", stsd + stts)
+    return _box(b"trak", tkhd + _box(b"mdia", mdhd + hdlr + _box(b"minf", stbl)))
+
+
+def test_mp4_box_parser_reads_stream_info_without_ffprobe(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_probe.subprocess, "run", lambda *_a, **_k: pytest.fail("ffprobe was called"))
+    avc1 = struct.pack(">I4s", 86, b"avc1") + b"\x00" * 6 + struct.pack(">H", 1) + b"\x00" * 16
+    avc1 += struct.pack(">HH", 1920, 1080) + b"\x00" * 50
+    rotated = (0, 0x10000, 0, -0x10000, 0, 0, 0, 0, 0x40000000)
+    moov = _box(b"moov", _trak(b"vide", rotated, avc1) + _trak(b"soun"))
+    video_path = tmp_path / "video.mp4"
+    # moov 在 mdat 之后（手机录制的常见布局）
+    video_path.write_bytes(_box(b"ftyp", b"isom\x00\x00\x02\x00") + _box(b"mdat", b"\x00" * 4096) + moov)
+
+    info = video_probe.probe_video(video_path)
+
+    assert (info.width, info.height, info.rotation, info.codec) == (1920, 1080, 270, "h264")
+    assert (info.duration, info.frame_rate, info.has_audio, info.source) == (2.0, 30.0, True, "mp4")
+    assert video_probe.parse_mp4_info(_not_mp4(tmp_path)) is None
 
 
 def test_find_motion_video_start_with_offset_attr(tmp_path):
@@ -79,3 +152,230 @@ def test_find_motion_video_start_returns_none_for_non_motion(tmp_path):
     non_motion.write_bytes(b"\xff\xd8hello\xff\xd9")
 
     assert motion_module.find_motion_video_start(non_motion) is None
+
+
+def test_border_overlay_keeps_only_strips_outside_content():
+    canvas = Image.new("RGB", (100, 80), "white")
+    canvas.paste((10, 20, 30), (10, 5, 90, 60))
+    content_box = (10, 5, 90, 60)
+
+    overlay = BorderOverlay.from_canvas(canvas, content_box)
+
+    assert [strip.name for strip in overlay.strips] == ["top", "bottom", "left", "right"]
+    assert overlay.nbytes == (100 * 80 - 80 * 55) * 3
+    full = overlay.to_image()
+    expected = canvas.convert("RGBA")
+    expected.paste((0, 0, 0, 0), content_box)
+    assert full.tobytes() == expected.tobytes()
+
+
+def test_border_overlay_skips_empty_strips():
+    canvas = Image.new("RGB", (100, 90), "white")
+
+    overlay = BorderOverlay.from_canvas(canvas, (0, 0, 100, 80))
+
+    assert [(strip.name, strip.box) for strip in overlay.strips] == [("bottom", (0, 80, 100, 90))]
+
+
+def test_overlay_filter_scales_each_strip_to_video_canvas():
+    filter_complex = video_module._build_overlay_filter(
+        (1000, 500),
+        None,
+        [(0, 1000, 2000, 1100)],
+        (0, 0, 2000, 1000),
+        (2000, 1100),
+    )
+
+    assert "[vid]pad=1000:550:0:0:black[base0]" in filter_complex
+    # 条带已在 Python 中缩放到最终尺寸，滤镜里不再逐帧缩放
+    assert "[1:v]scale" not in filter_complex
+    assert "[base0][1:v]overlay=0:500:eof_action=repeat[base1]" in filter_complex
+    assert filter_complex.endswith("[base1]null[out]")
+
+
+def test_finalize_passes_border_strips_to_ffmpeg(tmp_path, monkeypatch):
+    captured = {}
+
+    def fake_apply(video_path, overlay_strips, output_path, content_box, overlay_size, profile=None):
+        captured["strips"] = [(box, image.size) for image, box in overlay_strips]
+        captured["overlay_size"] = overlay_size
+        output_path.write_bytes(b"video")
+
+    monkeypatch.setattr(motion_module, "_apply_watermark_to_video", fake_apply)
+    monkeypatch.setattr(motion_module, "_copy_all_metadata_with_exiftool", lambda *_args: None)
+    still_path = tmp_path / "still.jpg"
+    Image.new("RGB", (20, 10)).save(still_path)
+    watermarked = tmp_path / "watermarked.jpg"
+    canvas = Image.new("RGB", (20, 12), "white")
+    canvas.save(watermarked)
+    video_source = tmp_path / "source.mp4"
+    video_source.write_bytes(b"mp4")
+    session = motion_module.MotionPhotoSession(
+        still_path=still_path,
+        video_source=video_source,
+        video_offset=0,
+        video_length=3,
+        xmp_bytes=b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:Description GCamera:MicroVideoOffset="0" /></x:xmpmeta>',
+        _workspace=motion_module.tempfile.TemporaryDirectory(),
+    )
+
+    try:
+        session.finalize(watermarked, tmp_path / "out.jpg", {
+            "overlay": BorderOverlay.from_canvas(canvas, (0, 0, 20, 10)),
+            "content_box": (0, 0, 20, 10),
+        })
+    finally:
+        session.cleanup()
+
+    assert captured["strips"] == [((0, 10, 20, 12), (20, 2))]
+    assert captured["overlay_size"] == (20, 12)
+    assert (tmp_path / "out.jpg").read_bytes().endswith(b"video")
+
+
+WATERMARKED_MP4 = b"\x00\x00\x00\x10ftypisomwatermarked"
+
+
+def _write_motion_photo(path, video=b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2" + b"\x00" * 4096):
+    xmp = (
+        b'<x:xmpmeta xmlns:x="adobe:ns:meta/">'
+        b'<rdf:Description GCamera:MotionPhotoOffset="%d" />'
+        b"</x:xmpmeta>" % len(video)
+    )
+    photo = b"\xff\xd8" + xmp + b"\xff\xd9"
+    path.write_bytes(photo + video)
+    return photo, video
+
+
+def test_prepare_motion_photo_records_offsets_and_streams_output(tmp_path, monkeypatch):
+    photo, video = _write_motion_photo(tmp_path / "motion.jpg")
+
+    def fake_apply(video_path, overlay_strips, output_path, content_box, overlay_size, profile=None):
+        # ffmpeg 读取的是从源文件复制出的视频片段
+        assert video_path.read_bytes() == video
+        output_path.write_bytes(WATERMARKED_MP4)
+
+    monkeypatch.setattr(motion_module, "_apply_watermark_to_video", fake_apply)
+    monkeypatch.setattr(motion_module, "_copy_all_metadata_with_exiftool", lambda *_args: None)
+    session = motion_module.prepare_motion_photo(tmp_path / "motion.jpg")
+    try:
+        assert (session.video_source, session.video_offset, session.video_length) == (
+            tmp_path / "motion.jpg", len(photo), len(video),
+        )
+        assert session.still_path.read_bytes() == photo
+
+        watermarked = tmp_path / "watermarked.jpg"
+        canvas = Image.new("RGB", (20, 12), "white")
+        canvas.save(watermarked)
+        session.finalize(watermarked, tmp_path / "out.jpg", {
+            "overlay": BorderOverlay.from_canvas(canvas, (0, 0, 20, 10)),
+            "content_box": (0, 0, 20, 10),
+        })
+    finally:
+        session.cleanup()
+
+    output = (tmp_path / "out.jpg").read_bytes()
+    assert output.endswith(WATERMARKED_MP4)
+    assert motion_module.find_motion_video_start(tmp_path / "out.jpg") == len(output) - len(WATERMARKED_MP4)
+
+
+def test_prepare_motion_photo_from_bytes_matches_path(tmp_path):
+    photo, video = _write_motion_photo(tmp_path / "motion.jpg")
+
+    session = motion_module.prepare_motion_photo(photo + video)
+    try:
+        assert session.video_offset == 0 and session.video_length == len(video)
+        assert session.video_source.read_bytes() == video
+        assert session.still_path.read_bytes() == photo
+    finally:
+        session.cleanup()
+    assert motion_module.prepare_motion_photo(b"\xff\xd8hello\xff\xd9" * 4) is None
+
+
+def test_copy_range_falls_back_when_kernel_copy_is_unsupported(tmp_path, monkeypatch):
+    source = tmp_path / "source.bin"
+    source.write_bytes(bytes(range(256)) * 64)
+
+    def unsupported(*_args, **_kwargs):
+        raise OSError(errno.ENOSYS, "not supported")
+
+    for disabled in ((), ("copy_file_range",), ("copy_file_range", "sendfile")):
+        for name in disabled:
+            monkeypatch.setattr(os, name, unsupported, raising=False)
+        target = tmp_path / f"target_{len(disabled)}.bin"
+        with source.open("rb") as src, target.open("wb") as out:
+            out.write(b"head")
+            out.flush()
+            process_io.copy_range(src.fileno(), out.fileno(), 100, 5000)
+        assert target.read_bytes() == b"head" + source.read_bytes()[100:5100]
+
+
+def test_path_sink_write_parts_mixes_buffers_and_file_ranges(tmp_path):
+    source = tmp_path / "video.bin"
+    source.write_bytes(b"0123456789")
+    chunks = []
+
+    process_io.PathSink(tmp_path / "out.bin").write_parts((b"a", b"bc", process_io.FilePart(str(source), 2, 3), b"z"))
+    process_io.CallbackSink(chunks.append).write_parts((b"a", process_io.FilePart(str(source), 7)))
+
+    assert (tmp_path / "out.bin").read_bytes() == b"abc234z"
+    assert b"".join(chunks) == b"a789"
+
+
+def test_overlay_filter_caps_output_canvas():
+    filter_complex = video_module._build_overlay_filter(
+        (1920, 1080),
+        None,
+        [(0, 1000, 2000, 1100)],
+        (0, 0, 2000, 1000),
+        (2000, 1100),
+        max_dimension=1280,
+    )
+
+    assert "scale=1280:720," in filter_complex
+    assert "[vid]pad=1280:792:0:0:black[base0]" in filter_complex
+
+
+def test_apply_watermark_uses_encoding_profile(tmp_path, monkeypatch):
+    captured = {}
+
+    def fake_run(command, **kwargs):
+        captured["command"] = command
+        captured["timeout"] = kwargs["timeout"]
+
+    monkeypatch.setattr(video_module.shutil, "which", lambda _: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(video_module.subprocess, "run", fake_run)
+    monkeypatch.setattr(video_module, "probe_video", lambda _path: video_probe.VideoInfo(width=1920, height=1080))
+
+    video_module._apply_watermark_to_video(
+        tmp_path / "in.mp4", [], tmp_path / "out.mp4", (0, 0, 2000, 1000), (2000, 1100),
+        profile=video_module.get_encoding_profile("fast"),
+    )
+
+    command = " ".join(captured["command"])
+    assert "-preset veryfast -crf 26 -tune zerolatency -threads 2" in command
+    assert "pad=1280:" in command
+    assert captured["timeout"] == 60
+    assert video_module.get_encoding_profile("nonexistent").name == "balanced"
+
+
+def test_apply_watermark_feeds_strips_prescaled_to_video_canvas(tmp_path, monkeypatch):
+    captured = {}
+
+    def fake_run(command, **kwargs):
+        inputs = [command[i + 1] for i, arg in enumerate(command) if arg == "-i"][1:]
+        captured["sizes"] = [Image.open(path).size for path in inputs]
+        captured["command"] = command
+
+    monkeypatch.setattr(video_module.shutil, "which", lambda _: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(video_module.subprocess, "run", fake_run)
+    monkeypatch.setattr(video_module, "probe_video", lambda _path: video_probe.VideoInfo(width=1000, height=500))
+
+    strip = Image.new("RGB", (2000, 100), "white")
+    video_module._apply_watermark_to_video(
+        tmp_path / "in.mp4", [(strip, (0, 1000, 2000, 1100))], tmp_path / "out.mp4", (0, 0, 2000, 1000), (2000, 1100),
+    )
+
+    # 单帧输入（无 -loop），尺寸已是视频画布上的最终尺寸；临时 PNG 用后删除
+    assert captured["sizes"] == [(1000, 50)]
+    assert "-loop" not in captured["command"]
+    assert not list(tmp_path.glob("*.png"))
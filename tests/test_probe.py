@@ -0,0 +1,199 @@
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import piexif
+import pytest
+from PIL import Image, JpegImagePlugin
+
+import process as process_module
+from media import jpeg_container
+from media.ultrahdr import build_primary_xmp_for_gainmap, inject_xmp
+from constants import ImageConstants
+from errors import WatermarkError, WatermarkErrorCode
+from probe_result import ProbeResult
+from services.state import AppState
+from services.watermark_styles import load_watermark_styles
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOGO_PATH = PROJECT_ROOT / "logos" / "canon.png"
+
+
+def _write_sample(path: Path) -> None:
+    exif_dict = {
+        "0th": {
+            piexif.ImageIFD.Make: b"Canon",
+            piexif.ImageIFD.Model: b"EOS R5",
+            piexif.ImageIFD.Orientation: 6,
+        },
+        "Exif": {
+            piexif.ExifIFD.LensModel: b"RF24-70mm F2.8 L IS USM",
+            piexif.ExifIFD.FocalLengthIn35mmFilm: 35,
+            piexif.ExifIFD.FNumber: (28, 10),
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.ISOSpeedRatings: 200,
+            piexif.ExifIFD.DateTimeOriginal: b"2026:03:07 12:00:00",
+        },
+    }
+    Image.new("RGB", (64, 48), "#ffffff").save(path, exif=piexif.dump(exif_dict))
+
+
+def test_probe_image_collects_header_metadata(tmp_path):
+    image_path = tmp_path / "source.jpg"
+    _write_sample(image_path)
+
+    probe = process_module.probe_image(str(image_path))
+
+    assert (probe.width, probe.height) == (64, 48)
+    assert probe.orientation == 6
+    assert probe.file_size == image_path.stat().st_size
+    assert probe.features == {"is_hdr": False, "is_motion": False}
+    assert probe.manufacturer == "Canon"
+    assert probe.camera_model == "EOS R5"
+    assert probe.camera_info == "RF24-70mm F2.8 L IS USM\nEOS R5"
+    assert probe.shooting_info.startswith("35mm  ƒ/2.8  1/125s  ISO200")
+    assert probe.exif_readable is True
+    assert ProbeResult.from_dict(probe.to_dict()) == probe
+
+
+def test_probe_image_tolerates_non_image_files(tmp_path):
+    image_path = tmp_path / "broken.jpg"
+    image_path.write_bytes(b"fake")
+
+    probe = process_module.probe_image(str(image_path))
+
+    assert probe.file_size == 4
+    assert probe.manufacturer is None
+    assert probe.has_metadata is False
+
+
+def _write_ultrahdr_motion_photo(path: Path) -> tuple[int, int]:
+    _write_sample(path)
+    buffer = BytesIO()
+    Image.new("L", (4, 3), 128).save(buffer, format="JPEG")
+    gainmap = buffer.getvalue()
+    video = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2" + b"\x00" * 1024
+    xmp = build_primary_xmp_for_gainmap(len(gainmap)).replace(
+        b'hdrgm:Version="1.0">',
+        b'xmlns:GCamera="http://ns.google.com/photos/1.0/camera/" '
+        b'GCamera:MotionPhoto="1" GCamera:MotionPhotoOffset="%d" hdrgm:Version="1.0">' % len(video),
+    )
+    primary = inject_xmp(path.read_bytes(), xmp)
+    path.write_bytes(primary + gainmap + video)
+    return len(primary), len(primary) + len(gainmap)
+
+
+def test_probe_image_locates_motion_and_gainmap_from_headers(tmp_path, monkeypatch):
+    image_path = tmp_path / "motion_hdr.jpg"
+    gainmap_offset, video_offset = _write_ultrahdr_motion_photo(image_path)
+
+    def fail(*_args, **_kwargs):
+        raise AssertionError("probe must not scan entropy data or create temp files")
+
+    monkeypatch.setattr(jpeg_container, "find_end_of_jpeg", fail)
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", fail)
+    monkeypatch.setattr(process_module, "prepare_motion_photo", fail)
+
+    probe = process_module.probe_image(str(image_path))
+
+    assert probe.features == {"is_hdr": True, "is_motion": True}
+    assert (probe.video_offset, probe.gainmap_offset) == (video_offset, gainmap_offset)
+    assert (probe.width, probe.height) == (64, 48)
+
+
+def test_process_image_with_probe_skips_redetection(tmp_path, monkeypatch):
+    image_path = tmp_path / "source.jpg"
+    _write_sample(image_path)
+    probe = process_module.probe_image(str(image_path))
+    style_config = load_watermark_styles(str(PROJECT_ROOT / "config" / "watermark_styles.toml"))
+
+    def fail(*_args, **_kwargs):
+        raise AssertionError("probe result should be reused")
+
+    captured = {}
+
+    def fake_generate(image, logo_path, camera_info, shooting_info, *args, **kwargs):
+        captured["camera_info"] = camera_info
+        captured["shooting_info"] = shooting_info
+        return image.copy()
+
+    monkeypatch.setattr(process_module, "prepare_motion_photo", fail)
+    monkeypatch.setattr(process_module, "get_manufacturer", fail)
+    monkeypatch.setattr(process_module, "get_exif_data", fail)
+    monkeypatch.setattr(process_module, "get_exif_data_with_exiftool", fail)
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: str(LOGO_PATH))
+    monkeypatch.setattr(process_module, "generate_watermark_image", fake_generate)
+
+    result = process_module.process_image(
+        str(image_path),
+        watermark_type=1,
+        image_quality=85,
+        style_config=style_config,
+        probe=probe,
+    )
+
+    assert result.success is True
+    assert captured["camera_info"] == ["RF24-70mm F2.8 L IS USM", "EOS R5"]
+    assert (tmp_path / "source_watermark.jpg").exists()
+
+
+def test_probe_is_persisted_with_task(tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    state = AppState(db_path)
+    probe = ProbeResult(file_size=10, width=4, height=3, is_motion=True, video_offset=6, manufacturer="Google")
+    state.create_task("task-probe", {"status": "needs_options", "probe": probe.to_dict()})
+    state.update_task("task-probe", probe=probe.to_dict())
+
+    reloaded = AppState(db_path)
+    task = reloaded.get_task("task-probe")
+
+    assert ProbeResult.from_dict(task["probe"]) == probe
+    state.shutdown()
+    reloaded.shutdown()
+
+
+def _patch_pipeline(monkeypatch, captured):
+    def fake_generate(image, *args, **kwargs):
+        captured["size"] = image.size
+        return image.copy()
+
+    monkeypatch.setattr(process_module, "find_logo", lambda *_args, **_kwargs: str(LOGO_PATH))
+    monkeypatch.setattr(process_module, "generate_watermark_image", fake_generate)
+
+
+def test_preview_decodes_large_jpeg_at_reduced_scale(tmp_path, monkeypatch):
+    image_path = tmp_path / "large.jpg"
+    exif_bytes = piexif.dump({"0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"}})
+    Image.new("RGB", (4000, 3000), "#336699").save(image_path, exif=exif_bytes)
+    captured = {}
+    _patch_pipeline(monkeypatch, captured)
+    drafts = []
+    original_draft = JpegImagePlugin.JpegImageFile.draft
+
+    def spy_draft(self, mode, size):
+        result = original_draft(self, mode, size)
+        if result is not None:
+            drafts.append(self.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", spy_draft)
+
+    result = process_module.process_image(str(image_path), watermark_type=1, preview=True, max_dimension=500)
+
+    # libjpeg 在 DCT 阶段按 1/4 解码，之后只在 1000x750 上做剩余的缩小
+    assert drafts == [(1000, 750)]
+    assert max(captured["size"]) <= 500
+    assert captured["size"][0] / captured["size"][1] == 4000 / 3000
+    assert result.preview_image.size == captured["size"]
+
+
+def test_reduced_decode_still_enforces_original_pixel_limit(tmp_path, monkeypatch):
+    image_path = tmp_path / "large.jpg"
+    Image.new("RGB", (400, 300), "#336699").save(image_path)
+    monkeypatch.setattr(ImageConstants, "MAX_IMAGE_PIXELS", 400 * 300 - 1)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS)
+
+    with pytest.raises(WatermarkError) as excinfo:
+        process_module.process_image(str(image_path), watermark_type=1, preview=True, max_dimension=100)
+
+    assert excinfo.value.error_code == WatermarkErrorCode.IMAGE_TOO_LARGE
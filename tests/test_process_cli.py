@@ -23,3 +23,84 @@ def test_process_cli_reports_watermark_error(monkeypatch):
 
     assert exc_info.value.code == 1
     assert messages == ["This image does not contain valid exif data!"]
+
+
+def _write_canon_sample(path, size=(640, 480)):
+    import piexif
+    from PIL import Image
+
+    exif_bytes = piexif.dump({
+        "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"},
+        "Exif": {
+            piexif.ExifIFD.LensModel: b"RF50mm F1.8 STM",
+            piexif.ExifIFD.FNumber: (18, 10),
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.ISOSpeedRatings: 100,
+            piexif.ExifIFD.FocalLengthIn35mmFilm: 50,
+        },
+    })
+    Image.new("RGB", size, "#336699").save(path, exif=exif_bytes)
+
+
+def test_process_image_styles_decodes_once_and_matches_single_style(tmp_path, monkeypatch):
+    from PIL import Image, ImageChops
+
+    source = tmp_path / "photo.jpg"
+    _write_canon_sample(source)
+    single = {}
+    for style_id in (1, 4):
+        result = process_module.process_image(str(source), watermark_type=style_id, image_quality=85)
+        single[style_id] = Image.open(result.output_path)
+        single[style_id].load()
+
+    calls = {"decode": 0, "metadata": 0}
+    original_decode = process_module._decode_image
+    original_metadata = process_module._extract_metadata
+
+    def counting_decode(state):
+        calls["decode"] += 1
+        original_decode(state)
+
+    def counting_metadata(state):
+        calls["metadata"] += 1
+        original_metadata(state)
+
+    monkeypatch.setattr(process_module, "_decode_image", counting_decode)
+    monkeypatch.setattr(process_module, "_extract_metadata", counting_metadata)
+
+    results = process_module.process_image_styles(str(source), [1, 4, 99], image_quality=85)
+
+    assert calls == {"decode": 1, "metadata": 1}
+    assert list(results) == [1, 4, 99]
+    assert results[99].success is False
+    assert results[99].error.error_code == WatermarkErrorCode.UNEXPECTED_ERROR
+    for style_id in (1, 4):
+        assert results[style_id].output_path == str(tmp_path / f"photo_watermark_s{style_id}.jpg")
+        with Image.open(results[style_id].output_path) as output:
+            assert output.size == single[style_id].size
+            diff = ImageChops.difference(output.convert("RGB"), single[style_id].convert("RGB"))
+            assert max(high for _low, high in diff.getextrema()) <= 8
+
+
+def test_watermark_cli_runs_jobs_in_parallel(tmp_path, monkeypatch, capsys):
+    import watermark_cli
+
+    for name in ("a.jpg", "b.jpg"):
+        _write_canon_sample(tmp_path / name, size=(320, 240))
+    (tmp_path / "broken.jpg").write_bytes(b"not a jpeg")
+    out_dir = tmp_path / "out"
+    monkeypatch.setattr(watermark_cli.sys, "argv", [
+        "watermark_cli.py", "--jobs", "2", "-o", str(out_dir), "-s", "1", "3", "--",
+        str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg"), str(tmp_path / "broken.jpg"),
+    ])
+
+    with pytest.raises(SystemExit) as exc_info:
+        watermark_cli.main()
+
+    assert exc_info.value.code == 1
+    assert sorted(p.name for p in out_dir.iterdir()) == [
+        "a_watermark_s1.jpg", "a_watermark_s3.jpg", "b_watermark_s1.jpg", "b_watermark_s3.jpg",
+    ]
+    output = capsys.readouterr().out
+    assert "完成: 4 成功, 2 失败" in output
+    assert "MB" in output
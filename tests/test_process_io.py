@@ -0,0 +1,120 @@
+from io import BytesIO
+from types import SimpleNamespace
+
+import piexif
+import pytest
+from PIL import Image
+
+from media.ultrahdr import build_primary_xmp_for_gainmap
+from process import _write_ultrahdr_output, process_image, process_image_styles
+from process_io import CallbackSink, FileSink, PathSink, make_sink, read_source
+
+
+def _canon_jpeg_bytes(size=(320, 240)):
+    exif_bytes = piexif.dump({
+        "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"},
+        "Exif": {
+            piexif.ExifIFD.LensModel: b"RF50mm F1.8 STM",
+            piexif.ExifIFD.FNumber: (18, 10),
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.ISOSpeedRatings: 100,
+            piexif.ExifIFD.FocalLengthIn35mmFilm: 50,
+        },
+    })
+    buf = BytesIO()
+    Image.new("RGB", size, "#336699").save(buf, format="JPEG", exif=exif_bytes)
+    return buf.getvalue()
+
+
+def test_read_source_and_make_sink_dispatch(tmp_path):
+    assert read_source(tmp_path / "a.jpg") == (str(tmp_path / "a.jpg"), None)
+    assert read_source(memoryview(b"abc")) == (None, b"abc")
+    assert read_source(BytesIO(b"abc")) == (None, b"abc")
+    with pytest.raises(TypeError):
+        read_source(123)
+
+    assert isinstance(make_sink(tmp_path / "out.jpg"), PathSink)
+    assert isinstance(make_sink(BytesIO()), FileSink)
+    assert isinstance(make_sink(lambda chunk: None), CallbackSink)
+
+
+def test_bytes_in_bytes_out_matches_path_output(tmp_path):
+    data = _canon_jpeg_bytes()
+    source = tmp_path / "sample.jpg"
+    source.write_bytes(data)
+    process_image(str(source), watermark_type=3, image_quality=85)
+
+    out = BytesIO()
+    result = process_image(data, watermark_type=3, image_quality=85, output=out)
+
+    assert result.success is True
+    assert result.output_path is None
+    assert out.getvalue() == (tmp_path / "sample_watermark.jpg").read_bytes()
+    # 内存输入输出不在磁盘上留下任何文件
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["sample.jpg", "sample_watermark.jpg"]
+
+
+def test_png_bytes_in_bytes_out_keeps_png_and_matches_path_output(tmp_path):
+    with Image.open(BytesIO(_canon_jpeg_bytes())) as image:
+        buf = BytesIO()
+        image.save(buf, format="PNG", exif=image.info["exif"])
+    data = buf.getvalue()
+    source = tmp_path / "sample.png"
+    source.write_bytes(data)
+    process_image(str(source), watermark_type=3, image_quality=85)
+
+    out = BytesIO()
+    result = process_image(data, watermark_type=3, image_quality=85, output=out)
+
+    assert result.success is True
+    assert out.getvalue().startswith(b"\x89PNG\r\n\x1a\n")
+    assert out.getvalue() == (tmp_path / "sample_watermark.png").read_bytes()
+
+
+def test_file_object_in_callback_out_streams_chunks():
+    chunks = []
+
+    result = process_image(BytesIO(_canon_jpeg_bytes()), watermark_type=1, image_quality=85, output=chunks.append)
+
+    assert result.success is True
+    with Image.open(BytesIO(b"".join(chunks))) as rendered:
+        assert rendered.format == "JPEG"
+        assert rendered.width > 320 and rendered.height > 240
+
+
+def test_memory_source_requires_output():
+    with pytest.raises(ValueError):
+        process_image(_canon_jpeg_bytes(), watermark_type=1)
+    with pytest.raises(ValueError):
+        process_image_styles(_canon_jpeg_bytes(), [1, 3])
+
+    result = process_image(_canon_jpeg_bytes(), watermark_type=1, preview=True)
+    assert result.preview_image is not None
+
+
+def test_process_image_styles_writes_each_style_to_its_sink():
+    outputs = {1: BytesIO(), 3: BytesIO()}
+
+    results = process_image_styles(_canon_jpeg_bytes(), [1, 3], image_quality=85, output_path_for=outputs.get)
+
+    assert all(result.success for result in results.values())
+    for output in outputs.values():
+        with Image.open(BytesIO(output.getvalue())) as rendered:
+            assert rendered.format == "JPEG"
+
+
+def test_ultrahdr_output_writes_primary_and_gainmap_as_separate_chunks():
+    primary = BytesIO()
+    Image.new("RGB", (16, 16), "white").save(primary, format="JPEG")
+    gainmap = b"\xff\xd8gainmap\xff\xd9"
+    chunks = []
+    state = SimpleNamespace(
+        ultrahdr_parts=SimpleNamespace(primary_xmp=build_primary_xmp_for_gainmap(len(gainmap))),
+        sink=CallbackSink(chunks.append),
+    )
+
+    _write_ultrahdr_output(state, primary.getvalue(), gainmap)
+
+    assert len(chunks) == 2
+    assert chunks[1] is gainmap
+    assert chunks[0].startswith(b"\xff\xd8") and b'Item:Semantic="GainMap"' in chunks[0]
@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+
+import piexif
+import pytest
+from PIL import Image
+
+from errors import WatermarkError, WatermarkErrorCode
+from process_result import ProcessResult
+from services.memory_budget import SharedMemoryBudget
+from services.render_pool import ProcessRenderPool, _worker_memory_budget
+from services.state import AppState
+from services.tasks import TaskPayload, background_process
+
+
+def _write_sample(path):
+    exif_bytes = piexif.dump({
+        "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"},
+        "Exif": {
+            piexif.ExifIFD.LensModel: b"RF50mm F1.8 STM",
+            piexif.ExifIFD.FNumber: (18, 10),
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.ISOSpeedRatings: 100,
+            piexif.ExifIFD.FocalLengthIn35mmFilm: 50,
+        },
+    })
+    Image.new("RGB", (320, 240), "#336699").save(path, exif=exif_bytes)
+
+
+@pytest.fixture
+def pool():
+    render_pool = ProcessRenderPool(max_workers=1, max_tasks=2)
+    yield render_pool
+    render_pool.shutdown()
+
+
+def test_process_pool_renders_relays_progress_and_recycles(tmp_path, pool):
+    sources = []
+    for name in ("a.jpg", "b.jpg"):
+        _write_sample(tmp_path / name)
+        sources.append(str(tmp_path / name))
+    progress = []
+
+    for source in sources:
+        result = pool.run(
+            source, watermark_type=1, image_quality=85,
+            progress_callback=lambda value, stage: progress.append(stage),
+        )
+        assert result.success is True
+
+    assert (tmp_path / "a_watermark.jpg").exists() and (tmp_path / "b_watermark.jpg").exists()
+    assert progress == ["loaded", "metadata", "rendered", "saving", "saved"] * 2
+    # max_tasks=2：第二个任务后替换 worker
+    assert pool.stats()["completed_tasks"] == 2
+    assert pool.stats()["recycled_workers"] == 1
+    assert pool.stats()["idle_workers"] == 1
+    # worker 在共享预算中预留并归还了额度
+    budget = pool.stats()["memory_budget"]
+    assert budget["peak_reserved_bytes"] > 0 and budget["reserved_bytes"] == 0
+
+
+def test_process_pool_reraises_watermark_errors(tmp_path, pool):
+    source = tmp_path / "no_exif.jpg"
+    Image.new("RGB", (64, 64)).save(source)
+
+    with pytest.raises(WatermarkError) as excinfo:
+        pool.run(str(source), watermark_type=1, image_quality=85)
+
+    assert excinfo.value.error_code == WatermarkErrorCode.MISSING_EXIF_DATA
+    assert pool.stats()["recycled_workers"] == 0
+
+
+def test_process_pool_workers_share_one_memory_budget():
+    render_pool = ProcessRenderPool(max_workers=2, memory_budget_bytes=4 * 1024 ** 3)
+    try:
+        # 父进程占用的额度在每个子进程中都可见：所有 worker 从同一份预算中预留
+        granted = render_pool.memory_budget.acquire(3 * 1024 ** 3)
+        slots = list(render_pool._idle.queue)
+        budgets = [slot.executor.submit(_worker_memory_budget).result(timeout=60) for slot in slots]
+        render_pool.memory_budget.release(granted)
+    finally:
+        render_pool.shutdown()
+
+    assert [budget["max_bytes"] for budget in budgets] == [4 * 1024 ** 3] * 2
+    assert [budget["reserved_bytes"] for budget in budgets] == [3 * 1024 ** 3] * 2
+
+
+def test_shared_memory_budget_reclaims_bytes_held_by_a_dead_worker():
+    budget = SharedMemoryBudget(100, multiprocessing.get_context("spawn"))
+    ledger = budget.new_ledger()
+    worker_view = budget.with_ledger(ledger)
+
+    worker_view.acquire(60)
+    with pytest.raises(TimeoutError):
+        budget.acquire(60, timeout=0.01)
+
+    # worker 未释放就退出：父进程按 ledger 归还
+    assert budget.reclaim(ledger) == 60
+    assert budget.stats()["reserved_bytes"] == 0 and budget.stats()["active"] == 0
+    budget.release(budget.acquire(60, timeout=0.01))
+
+
+def test_background_process_uses_render_pool(monkeypatch, tmp_path):
+    state = AppState(str(tmp_path / "state.sqlite3"))
+    state.create_task("task-pool", {"status": "queued", "submitted_at": 0, "progress": 0.0, "stage": "queued"})
+    calls = []
+
+    class FakePool:
+        def run(self, image_path, progress_callback=None, **kwargs):
+            calls.append((image_path, kwargs["watermark_type"]))
+            progress_callback(0.4, "metadata")
+            assert state.get_task("task-pool")["stage"] == "metadata"
+            return ProcessResult()
+
+        def shutdown(self, wait=True):
+            pass
+
+    monkeypatch.setattr("services.tasks.process_image", lambda *_a, **_k: pytest.fail("rendered in-thread"))
+    state.render_pool = FakePool()
+
+    background_process(TaskPayload(
+        task_id="task-pool",
+        state=state,
+        filepath=str(tmp_path / "sample.jpg"),
+        lang="en",
+        watermark_type=3,
+        image_quality=85,
+        burn_after_read="0",
+        logo_preference="xiaomi",
+        style_config={},
+        logger=logging.getLogger("tests.render_pool"),
+    ))
+
+    assert calls == [(str(tmp_path / "sample.jpg"), 3)]
+    assert state.get_task("task-pool")["status"] == "succeeded"
+    state.shutdown()
@@ -1,7 +1,10 @@
 import io
+import json
 import os
 import pathlib
 import shutil
+import threading
+import time
 
 import pytest
 from PIL import Image
@@ -671,3 +674,111 @@ def test_process_image_too_large(monkeypatch, tmp_path):
             logo_preference="xiaomi",
         )
     assert exc_info.value.error_code == WatermarkErrorCode.IMAGE_TOO_LARGE
+
+
+def test_batched_status_reports_each_task(client, app):
+    state = app.extensions["state"]
+    state.create_task("task-a", {"status": "processing", "progress": 0.5, "stage": "rendered"})
+
+    response = client.get("/api/status?ids=task-a,missing")
+
+    assert response.status_code == 200
+    tasks = response.get_json()["tasks"]
+    assert (tasks["task-a"]["status"], tasks["task-a"]["stage"]) == ("processing", "rendered")
+    assert tasks["missing"] == {"status": "unknown"}
+    assert client.get("/api/status").status_code == 400
+
+
+def _sse_events(response):
+    events = []
+    for block in b"".join(response.response).decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if fields.get("event") == "task":
+            events.append((int(fields["id"]), json.loads(fields["data"])))
+        elif fields.get("event") == "end":
+            events.append((None, "end"))
+    return events
+
+
+def test_events_stream_pushes_updates_until_tasks_finish(client, app):
+    state = app.extensions["state"]
+    state.create_task("task-a", {"status": "processing", "progress": 0.1, "stage": "processing"})
+    state.create_task("task-b", {"status": "succeeded", "progress": 1.0, "stage": "done", "result": {"ok": 1}})
+
+    def finish():
+        time.sleep(0.2)
+        state.update_task("task-a", progress=0.6, stage="rendered")
+        time.sleep(0.2)
+        state.update_task("task-a", status="succeeded", progress=1.0, result={"ok": 2})
+
+    worker = threading.Thread(target=finish)
+    worker.start()
+    response = client.get("/api/events?ids=task-a,task-b", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = _sse_events(response)
+    worker.join()
+
+    snapshots = [data for _, data in events[:2]]
+    assert [(d["task_id"], d["status"]) for d in snapshots] == [("task-a", "processing"), ("task-b", "succeeded")]
+    assert events[-1] == (None, "end")
+    assert events[-2][1]["status"] == "succeeded" and events[-2][1]["result"] == {"ok": 2}
+    last_id = events[-2][0]
+
+    # 断线重连：Last-Event-ID 之后没有新事件、任务都已结束，流立即结束
+    resumed = _sse_events(client.get("/api/events?ids=task-a", headers={"Last-Event-ID": str(last_id)}, buffered=False))
+    assert resumed == [(None, "end")]
+    replayed = _sse_events(client.get("/api/events?ids=task-a", headers={"Last-Event-ID": str(last_id - 1)}, buffered=False))
+    assert replayed[0] == (last_id, events[-2][1])
+
+
+def test_events_stream_limit_returns_503_until_a_stream_closes(client, app):
+    state = app.extensions["state"]
+    state.max_event_streams = 1
+    state.create_task("task-a", {"status": "processing", "progress": 0.1, "stage": "processing"})
+
+    first = client.get("/api/events?ids=task-a", buffered=False)
+    assert first.status_code == 200
+    assert state.event_streams == 1
+
+    rejected = client.get("/api/events?ids=task-a&lang=en", buffered=False)
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "2"
+    # 批量状态查询不受流名额限制，前端据此回退为轮询
+    assert client.get("/api/status?ids=task-a").status_code == 200
+
+    first.close()
+    assert state.event_streams == 0
+    second = client.get("/api/events?ids=task-a", buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+def test_upload_rejected_with_retry_after_when_queue_full(client, app):
+    state = app.extensions["state"]
+    state.max_queue_depth = 2
+    for index in range(2):
+        state.create_task(f"queued-{index}", {"status": "queued", "submitted_at": time.time()})
+    for index in range(3):
+        state.create_task(f"done-{index}", {"status": "queued", "submitted_at": time.time()})
+        state.update_task(f"done-{index}", status="succeeded", progress=1.0, stage="done")
+
+    ready = client.get("/api/ready")
+    assert ready.status_code == 503
+    assert ready.get_json()["saturation"] == 1.0
+
+    data = {
+        "file": (io.BytesIO(b"fake"), "sample.jpg"),
+        "watermark_type": "1",
+    }
+    response = client.post("/api/upload?lang=en", data=data, content_type="multipart/form-data")
+    assert response.status_code == 503
+    # 3 个任务 / 120 秒窗口 → 每秒 0.025 个，消化 1 个排队任务约需 40 秒
+    assert response.headers["Retry-After"] == "40"
+    assert "40 seconds" in response.get_json()["error"]
+    assert not [name for name in os.listdir(app.config["UPLOAD_FOLDER"]) if name.startswith("sample")]
+
+    state.update_task("queued-0", status="succeeded", progress=1.0, stage="done")
+    ready = client.get("/api/ready")
+    assert ready.status_code == 200
+    assert ready.get_json()["ready"] is True
+    assert ready.get_json()["depth"] == 1
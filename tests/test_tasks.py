@@ -2,13 +2,17 @@ import logging
 from types import SimpleNamespace
 from urllib.parse import parse_qs, urlparse
 
+import pytest
 from PIL import Image
 
 from errors import WatermarkError, WatermarkErrorCode
 from process import _save_output
+from process_io import PathSink
 from process_result import ProcessResult
+from services.admission import QueueFullError, check_admission
 from services.state import AppState
-from services.tasks import TaskPayload, background_process, submit_existing_task
+from probe_result import ProbeResult
+from services.tasks import TaskPayload, background_process, select_video_profile, submit_existing_task
 
 
 def test_background_process_logs_unexpected_watermark_detail(monkeypatch, caplog, tmp_path):
@@ -182,7 +186,9 @@ def test_save_output_reports_hdr_only_when_preserved(tmp_path):
         style={"supports_ultrahdr": True},
         watermark_type=1,
         new_image=Image.new("RGB", (2, 2), "white"),
-        output_path=str(output_path),
+        sink=PathSink(output_path),
+        source_format="JPEG",
+        video_profile=None,
         exif_bytes=b"",
         image_quality=85,
     )
@@ -208,8 +214,8 @@ def test_save_output_can_strip_hdr_from_motion_photo(tmp_path):
         ultrahdr_primary_size = (2, 2)
         still_path = tmp_path / "still.jpg"
 
-        def finalize(self, _watermarked_path, final_path, _metadata):
-            final_path.write_bytes(b"motion")
+        def finalize(self, _watermarked_path, final_path, _metadata, encoding_profile=None):
+            final_path.write_chunks((b"motion",))
 
     state = SimpleNamespace(
         motion_session=FakeMotionSession(),
@@ -218,7 +224,9 @@ def test_save_output_can_strip_hdr_from_motion_photo(tmp_path):
         style={"supports_motion": True, "supports_ultrahdr": True},
         watermark_type=1,
         new_image=Image.new("RGB", (2, 2), "white"),
-        output_path=str(output_path),
+        sink=PathSink(output_path),
+        source_format="JPEG",
+        video_profile=None,
         exif_bytes=b"",
         image_quality=85,
     )
@@ -235,3 +243,60 @@ def test_save_output_can_strip_hdr_from_motion_photo(tmp_path):
     assert result.is_hdr is False
     assert state.motion_session.ultrahdr_gainmap_jpeg is None
     assert output_path.read_bytes() == b"motion"
+
+
+def test_select_video_profile_switches_to_fast_when_queue_is_deep(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.tasks.AppConstants.VIDEO_FAST_PROFILE_QUEUE_DEPTH", 2)
+    state = AppState(str(tmp_path / "state.sqlite3"), video_profile="archival")
+    state.create_task("a", {"status": "queued", "submitted_at": 0, "progress": 0.0, "stage": "queued"})
+
+    assert select_video_profile(state) == "archival"
+
+    state.create_task("b", {"status": "queued", "submitted_at": 0, "progress": 0.0, "stage": "queued"})
+    assert select_video_profile(state) == "fast"
+    # 已确认不是 motion photo 的任务不受影响
+    assert select_video_profile(state, ProbeResult(is_motion=False)) == "archival"
+    state.shutdown()
+
+
+def test_progress_updates_are_coalesced_and_terminal_state_is_written_through(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.state.AppConstants.TASK_PROGRESS_FLUSH_SECONDS", 60)
+    db_path = str(tmp_path / "state.sqlite3")
+    state = AppState(db_path)
+    state.create_task("t", {"status": "processing", "submitted_at": 0, "progress": 0.0, "stage": "processing"})
+    statements = []
+    state._conn.set_trace_callback(statements.append)
+
+    for value, stage in ((0.2, "loaded"), (0.4, "metadata"), (0.7, "rendered")):
+        state.update_task("t", progress=value, stage=stage)
+
+    # 进度立即可见，但尚未写库
+    assert state.get_task("t")["stage"] == "rendered"
+    assert not [sql for sql in statements if sql.startswith("UPDATE")]
+    assert state.flush_pending_updates() == 1
+    assert len([sql for sql in statements if sql.startswith("UPDATE")]) == 1
+
+    state.update_task("t", stage="saving", progress=0.9)
+    state.update_task("t", status="succeeded", result={"ok": True}, progress=1.0)
+    assert "PRAGMA synchronous=FULL" in statements
+    assert state.pending_updates == {}
+
+    reloaded = AppState(db_path)
+    task = reloaded.get_task("t")
+    assert (task["status"], task["stage"], task["progress"], task["result"]) == ("succeeded", "saving", 1.0, {"ok": True})
+    state.shutdown()
+    reloaded.shutdown()
+
+
+def test_admission_caps_inflight_pixels_but_admits_into_empty_queue(tmp_path):
+    state = AppState(str(tmp_path / "state.sqlite3"), max_inflight_pixels=100)
+    large = ProbeResult(width=20, height=20)
+    assert check_admission(state, large).accepting is True
+
+    state.create_task("running", {"status": "processing", "probe": ProbeResult(width=10, height=8).to_dict()})
+    with pytest.raises(QueueFullError) as excinfo:
+        check_admission(state, ProbeResult(width=5, height=5))
+    assert excinfo.value.reason == "inflight_pixels"
+    # 最近没有任务完成，无法估算消化速度时给出上限
+    assert excinfo.value.retry_after == 120
+    assert check_admission(state, ProbeResult(width=4, height=5)).saturation == 0.8
@@ -0,0 +1,28 @@
+import os
+
+from media import jpeg_container
+from scripts.bench_jpeg_marker_scan import _find_next_marker_bytewise, _synthetic_jpeg
+
+
+def test_find_next_marker_matches_bytewise_scan():
+    samples = [
+        b"",
+        b"\xff",
+        b"\xff\xff",
+        b"\xff\x00\xff\xd9",
+        b"\xff\xff\x00\xff\xff\xd9",
+        b"ab\xff\xff\xff\xd0cd",
+        b"\x12\xff\x00\x34\xff\xe1",
+        b"\xff\xff\xff",
+        os.urandom(4096).replace(b"\xff", b"\xff\x00") + b"\xff\xff\xd9",
+    ]
+    for data in samples:
+        for off in range(min(len(data), 8)):
+            assert jpeg_container._find_next_marker(data, off) == _find_next_marker_bytewise(data, off), (data, off)
+
+
+def test_find_end_of_jpeg_skips_stuffed_bytes_and_restart_markers():
+    data = _synthetic_jpeg(1)
+
+    assert jpeg_container.find_end_of_jpeg(data + b"trailer") == len(data)
+    assert jpeg_container._scan_appended_jpegs(b"junk" + data, 0) == [(4, 4 + len(data))]
@@ -14,6 +14,9 @@
     # 所有样式都生成一份，输出到指定目录
     python watermark_cli.py --style all -o ./output *.jpg
 
+    # 4 个进程并行处理（每张图片只解码一次，依次渲染所有样式）
+    python watermark_cli.py --style all --jobs 4 -o ./output *.jpg
+
     # 列出可用样式
     python watermark_cli.py --list
 """
@@ -21,9 +24,9 @@
 import argparse
 import glob
 import os
-import shutil
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 # 确保项目根目录在 sys.path 中
@@ -33,7 +36,7 @@ if str(_PROJECT_ROOT) not in sys.path:
 
 from constants import CommonConstants
 from errors import WatermarkError
-from process import process_image
+from process import process_image_styles
 from services.i18n import get_error_message
 from services.watermark_styles import (
     get_style,
@@ -86,6 +89,13 @@ def _build_parser() -> argparse.ArgumentParser:
         default="zh",
         help="错误消息语言。默认: zh",
     )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="并行处理的图片数（多进程）。默认: 1",
+    )
     parser.add_argument(
         "-l", "--list",
         action="store_true",
@@ -146,60 +156,70 @@ def _print_styles(config: dict) -> None:
     print()
 
 
-def _process_single(
+def _output_name(image_path: str, style_id: int, multi_style: bool) -> str:
+    name, ext = os.path.splitext(os.path.basename(image_path))
+    if multi_style:
+        return f"{name}_watermark_s{style_id}{ext}"
+    return f"{name}_watermark{ext}"
+
+
+def _error_message(err: Exception, lang: str) -> str:
+    if isinstance(err, WatermarkError):
+        return get_error_message(err.message_key, lang, **err.get_message_kwargs(lang)) or str(err)
+    return str(err)
+
+
+def _process_image_job(
     image_path: str,
-    style_id: int,
+    style_ids: list[int],
     output_dir: str,
     quality: str,
     logo: str,
     lang: str,
     style_config: dict,
     multi_style: bool = False,
-) -> tuple[bool, str]:
-    """处理单张图片的单个样式，返回 (成功, 输出路径)。"""
+) -> tuple[str, list[tuple[int, bool, str]], float, int]:
+    """处理一张图片的全部样式（只解码一次），返回 (图片路径, [(样式, 成功, 输出路径或错误)], 耗时, 峰值字节)。"""
     quality_map = CommonConstants.IMAGE_QUALITY_MAP
     image_quality = quality_map.get(quality, quality_map["high"])
 
+    start = time.time()
     try:
-        result = process_image(
+        results = process_image_styles(
             image_path,
+            style_ids,
             lang=lang,
-            watermark_type=style_id,
             image_quality=image_quality,
             logo_preference=logo,
             style_config=style_config,
+            output_path_for=lambda sid: os.path.join(output_dir, _output_name(image_path, sid, multi_style)),
         )
-    except WatermarkError as err:
-        msg = get_error_message(err.message_key, lang, **err.get_message_kwargs(lang)) or str(err)
-        return False, msg
     except Exception as exc:
-        return False, str(exc)
-
-    if not result.success:
-        return False, "处理失败"
-
-    # process_image 在输入文件同目录生成 {name}_watermark.{ext}
-    src_dir = os.path.dirname(image_path)
-    name, ext = os.path.splitext(os.path.basename(image_path))
-    generated = os.path.join(src_dir, f"{name}_watermark{ext}")
-
-    if not os.path.exists(generated):
-        return False, "输出文件未生成"
-
-    # 确定最终文件名
-    if multi_style:
-        out_name = f"{name}_watermark_s{style_id}{ext}"
-    else:
-        out_name = f"{name}_watermark{ext}"
-
-    dest = os.path.join(output_dir, out_name)
+        message = _error_message(exc, lang)
+        return image_path, [(sid, False, message) for sid in style_ids], time.time() - start, 0
+
+    outcomes = []
+    for sid, result in results.items():
+        if not result.success:
+            outcomes.append((sid, False, _error_message(result.error, lang) if result.error else "处理失败"))
+        elif not result.output_path or not os.path.exists(result.output_path):
+            outcomes.append((sid, False, "输出文件未生成"))
+        else:
+            outcomes.append((sid, True, result.output_path))
+    peak_bytes = max((result.peak_bytes for result in results.values()), default=0)
+    return image_path, outcomes, time.time() - start, peak_bytes
 
-    # 如果源和目标在同一目录且同名，不需要移动
-    if os.path.abspath(generated) == os.path.abspath(dest):
-        return True, dest
 
-    shutil.move(generated, dest)
-    return True, dest
+def _run_jobs(images: list[str], jobs: int, job_args: tuple):
+    """按完成顺序产出各图片的处理结果；jobs > 1 时用多进程并行。"""
+    if jobs <= 1 or len(images) <= 1:
+        for image_path in images:
+            yield _process_image_job(image_path, *job_args)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_process_image_job, image_path, *job_args) for image_path in images]
+        for future in as_completed(futures):
+            yield future.result()
 
 
 def main() -> None:
@@ -235,37 +255,36 @@ def main() -> None:
     os.makedirs(output_dir, exist_ok=True)
 
     total_tasks = len(images) * len(style_ids)
-    print(f"\n处理 {len(images)} 张图片 × {len(style_ids)} 种样式，共 {total_tasks} 个任务")
+    jobs = max(1, args.jobs)
+    print(f"\n处理 {len(images)} 张图片 × {len(style_ids)} 种样式，共 {total_tasks} 个任务（并行 {jobs}）")
     print(f"输出目录: {output_dir}\n")
 
     succeeded = 0
     failed = 0
+    task_no = 0
+    summary = []
     start_all = time.time()
 
-    for img_idx, image_path in enumerate(images, 1):
+    job_args = (style_ids, output_dir, args.quality, args.logo, args.lang, style_config, multi_style)
+    for image_path, outcomes, elapsed, peak_bytes in _run_jobs(images, jobs, job_args):
         img_name = os.path.basename(image_path)
-        for sid in style_ids:
+        for sid, ok, info in outcomes:
+            task_no += 1
             style = get_style(style_config, sid)
             style_label = style["label_zh"] if style else str(sid)
-            task_no = (img_idx - 1) * len(style_ids) + style_ids.index(sid) + 1
-            print(f"  [{task_no}/{total_tasks}] {img_name} → 样式 {sid} ({style_label}) ... ", end="", flush=True)
-
-            start = time.time()
-            ok, info = _process_single(
-                image_path, sid, output_dir, args.quality, args.logo, args.lang, style_config,
-                multi_style=multi_style,
-            )
-            elapsed = time.time() - start
-
+            prefix = f"  [{task_no}/{total_tasks}] {img_name} → 样式 {sid} ({style_label}) ... "
             if ok:
                 succeeded += 1
-                out_name = os.path.basename(info)
-                print(f"完成 ({elapsed:.1f}s) → {out_name}")
+                print(f"{prefix}完成 → {os.path.basename(info)}")
             else:
                 failed += 1
-                print(f"失败 — {info}")
+                print(f"{prefix}失败 — {info}")
+        summary.append((img_name, elapsed, peak_bytes))
 
     elapsed_all = time.time() - start_all
+    print(f"\n{'图片':<32} {'耗时':>8} {'峰值内存':>10}")
+    for img_name, elapsed, peak_bytes in summary:
+        print(f"{img_name:<32} {elapsed:>7.1f}s {peak_bytes / 1024 / 1024:>8.1f}MB")
     print(f"\n完成: {succeeded} 成功, {failed} 失败, 耗时 {elapsed_all:.1f}s")
 
     if failed: